@@ -0,0 +1,27 @@
+# path: benchmarks/fake_tex.py
+"""
+コンパイル計測用の代替エンジン（TeX 環境が無くても build() の流れを計測できる）。
+lualatex と同じ引数を受け取り、.tex を読み込んで最小の .pdf と .log を書き出す。
+"""
+from __future__ import annotations
+import sys
+from pathlib import Path
+
+_PDF = b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n"
+
+
+def main(argv: list[str]) -> int:
+    args = [a for a in argv if not a.startswith("-")]
+    tex = Path(args[-1])
+    source = tex.read_text(encoding="utf-8")
+    pages = source.count("\\clearpage") + 1
+    tex.with_suffix(".pdf").write_bytes(_PDF)
+    tex.with_suffix(".log").write_text(
+        f"This is FakeTeX\nOutput written on {tex.stem}.pdf ({pages} pages, {len(_PDF)} bytes).\n",
+        encoding="utf-8",
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,285 @@
+# path: benchmarks/run.py
+"""
+描画・エスケープ・コンパイルのベンチマーク。結果は JSON に書き出し、コミット間で比較できる。
+
+    python -m benchmarks.run                       # 10^2〜10^5 ノード、bench.json に出力
+    python -m benchmarks.run --max-exp 6           # 10^6 ノードまで
+    python -m benchmarks.run --compare old.json    # 前回の結果との比（>1 なら遅くなった）
+    python -m benchmarks.run --only escape         # 高速化前の1文字ずつの latex_escape との比較
+    python -m benchmarks.run --only memory         # ノード1つあたりのバイト数（__dict__ のノード / list / compact）
+"""
+from __future__ import annotations
+import argparse
+import dataclasses
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from lectgen.build import build
+from lectgen.document import Document
+from lectgen.renderers.latex import LatexRenderer
+from lectgen.utils.text import _LATEX_SPECIALS, latex_escape, latex_escape_cached, latex_escape_many
+
+from .synthetic import ASCII_WORDS, JAPANESE_WORDS, make_document, sentence
+
+FAKE_TEX = [sys.executable, str(Path(__file__).with_name("fake_tex.py"))]
+
+
+class _NullWriter(io.TextIOBase):
+    """書き出した量だけ数える（render_to の計測用）"""
+
+    def __init__(self) -> None:
+        self.size = 0
+
+    def write(self, s: str) -> int:
+        self.size += len(s)
+        return len(s)
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_render(sizes: List[int], repeat: int) -> List[Dict]:
+    results = []
+    renderer = LatexRenderer()
+    for n in sizes:
+        doc = make_document(n)
+        reps = repeat if n <= 100_000 else 1
+        seconds = best_of(lambda: renderer.render(doc), reps)
+        stream_seconds = best_of(lambda: renderer.render_to(doc, _NullWriter()), reps)
+        results.append({
+            "bench": "render",
+            "nodes": n,
+            "seconds": seconds,
+            "nodes_per_sec": n / seconds,
+            "stream_seconds": stream_seconds,
+            "peak_bytes": peak_memory(lambda: renderer.render(doc)),
+            "stream_peak_bytes": peak_memory(lambda: renderer.render_to(doc, _NullWriter())),
+        })
+        _report(results[-1])
+    return results
+
+
+def latex_escape_per_char(s: str) -> str:
+    """高速化する前の latex_escape（1文字ずつ表を引くジェネレータ）。比較の基準として残す"""
+    return "".join(_LATEX_SPECIALS.get(ch, ch) for ch in s)
+
+
+def bench_escape(repeat: int, count: int = 20_000) -> List[Dict]:
+    """
+    同じ入力で、高速化前の1文字ずつの版と latex_escape / latex_escape_cached / latex_escape_many を比べる。
+    speedup は 1文字ずつの版の時間 ÷ latex_escape の時間。
+    """
+    rng = random.Random(0)
+    corpora = {
+        "ascii": [sentence(rng, 10, japanese=False, specials=0.0) for _ in range(count)],
+        "ascii_specials": [sentence(rng, 10, japanese=False, specials=0.2) for _ in range(count)],
+        "japanese": [sentence(rng, 10, specials=0.0) for _ in range(count)],
+        "japanese_specials": [sentence(rng, 10, specials=0.2) for _ in range(count)],
+        "short": [rng.choice(ASCII_WORDS + JAPANESE_WORDS) for _ in range(count)],
+    }
+    results = []
+    for name, texts in corpora.items():
+        chars = sum(map(len, texts))
+        if [latex_escape(t) for t in texts] != [latex_escape_per_char(t) for t in texts]:
+            raise AssertionError(f"latex_escape differs from the per-character version on {name}")
+        per_char = best_of(lambda: [latex_escape_per_char(t) for t in texts], repeat)
+        seconds = best_of(lambda: [latex_escape(t) for t in texts], repeat)
+        latex_escape_cached.cache_clear()  # type: ignore[attr-defined]
+        cached = best_of(lambda: [latex_escape_cached(t) for t in texts], repeat)
+        many = best_of(lambda: latex_escape_many(texts), repeat)
+        results.append({
+            "bench": "escape",
+            "corpus": name,
+            "calls": count,
+            "seconds": seconds,
+            "calls_per_sec": count / seconds,
+            "chars_per_sec": chars / seconds,
+            "per_char_seconds": per_char,
+            "cached_seconds": cached,
+            "many_seconds": many,
+            "speedup": per_char / seconds,
+        })
+        _report(results[-1])
+    return results
+
+
+def _fresh(value: Any) -> Any:
+    """読み込み直したときのように、毎回別オブジェクトの文字列を作る"""
+    if isinstance(value, str):
+        return "".join(list(value))
+    if isinstance(value, tuple):
+        return tuple(map(_fresh, value))
+    return value
+
+
+def _dict_backed(cls: type) -> type:
+    """__slots__ も文字列の共有も無い、省メモリ化する前と同じ形のノード型"""
+    return dataclasses.make_dataclass(
+        cls.__name__,
+        [
+            (f.name, f.type) if f.default is dataclasses.MISSING else (f.name, f.type, f.default)
+            for f in dataclasses.fields(cls)
+        ],
+        frozen=True,
+    )
+
+
+def _compact(nodes: List[Any]) -> Document:
+    doc = Document.compact()
+    doc.extend(nodes)
+    return doc
+
+
+def bench_memory(sizes: List[int]) -> List[Dict]:
+    """
+    同じ文書を読み込み直して保持したときの、ノード1つあたりのバイト数（tracemalloc の使用中の量）。
+    - dict_list: __dict__ を持つノード（省メモリ化前）を list に入れる
+    - list: 今のノード（__slots__・長さ文字列の共有）を list に入れる
+    - compact: 今のノードを Document.compact()（NodeArray）に入れる
+    """
+    results = []
+    for n in sizes:
+        source = list(make_document(n).nodes)
+        dict_types = {cls: _dict_backed(cls) for cls in {type(node) for node in source}}
+
+        def reload(cls_of: Callable[[Any], type]) -> List[Any]:
+            return [
+                cls_of(node)(**{f.name: _fresh(getattr(node, f.name)) for f in dataclasses.fields(node)})
+                for node in source
+            ]
+
+        storages = {
+            "dict_list": lambda: reload(lambda node: dict_types[type(node)]),
+            "list": lambda: Document(nodes=reload(type)),
+            "compact": lambda: _compact(reload(type)),
+        }
+        for name, load in storages.items():
+            tracemalloc.start()
+            try:
+                kept = load()
+                used = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            del kept
+            results.append({"bench": "memory", "nodes": n, "storage": name, "bytes_per_node": used / n})
+            _report(results[-1])
+    return results
+
+
+def bench_compile(sizes: List[int]) -> List[Dict]:
+    """代替エンジンで build() を通し、レンダリング＋書き出し＋起動の時間と、変更なし時の時間を測る"""
+    results = []
+    renderer = LatexRenderer()
+    with tempfile.TemporaryDirectory(prefix="lectgen-bench-") as tmp:
+        for n in sizes:
+            doc = make_document(n)
+            out = Path(tmp) / f"doc{n}.pdf"
+            full = best_of(lambda: build(doc, renderer, out, engine=FAKE_TEX, force=True), 1)
+            skipped = best_of(lambda: build(doc, renderer, out, engine=FAKE_TEX), 1)
+            results.append({
+                "bench": "compile",
+                "nodes": n,
+                "seconds": full,
+                "up_to_date_seconds": skipped,
+                "tex_bytes": os.path.getsize(Path(tmp) / ".lectgen-build" / f"doc{n}" / f"doc{n}.tex"),
+            })
+            _report(results[-1])
+    return results
+
+
+def _report(result: Dict) -> None:
+    print("  ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+
+
+def _key(result: Dict) -> tuple:
+    return (result["bench"], result.get("nodes"), result.get("corpus"), result.get("storage"))
+
+
+def compare(current: List[Dict], baseline_path: Path) -> None:
+    with baseline_path.open(encoding="utf-8") as f:
+        baseline = {_key(r): r for r in json.load(f)["results"]}
+    print(f"\n--- seconds ratio vs {baseline_path} (>1 は遅くなった) ---")
+    for r in current:
+        old = baseline.get(_key(r))
+        if old and old.get("seconds"):
+            label = " ".join(str(k) for k in _key(r) if k is not None)
+            print(f"{label:30s} {r['seconds'] / old['seconds']:.2f}x")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="lectgen benchmarks")
+    parser.add_argument("--min-exp", type=int, default=2, help="最小ノード数 10^k")
+    parser.add_argument("--max-exp", type=int, default=5, help="最大ノード数 10^k（6 で 100 万ノード）")
+    parser.add_argument("--compile-max-exp", type=int, default=4, help="コンパイル計測の最大ノード数 10^k")
+    parser.add_argument("--repeat", type=int, default=3, help="各計測の繰り返し回数（最良値を採用）")
+    parser.add_argument("--only", choices=("render", "escape", "memory", "compile"), action="append", help="実行する計測")
+    parser.add_argument("-o", "--output", type=Path, default=Path("bench.json"))
+    parser.add_argument("--compare", type=Path, default=None, help="比較する前回の JSON")
+    args = parser.parse_args(argv)
+
+    only = set(args.only or ("render", "escape", "memory", "compile"))
+    sizes = [10 ** k for k in range(args.min_exp, args.max_exp + 1)]
+    results: List[Dict] = []
+    if "escape" in only:
+        results += bench_escape(args.repeat)
+    if "render" in only:
+        results += bench_render(sizes, args.repeat)
+    if "memory" in only:
+        results += bench_memory(sizes)
+    if "compile" in only:
+        results += bench_compile([n for n in sizes if n <= 10 ** args.compile_max_exp])
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with args.output.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
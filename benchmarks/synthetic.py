@@ -0,0 +1,52 @@
+# path: benchmarks/synthetic.py
+"""
+ベンチマーク用の合成文書。すべてのノード型を混ぜ、実際の教材に近い割合で並べる。
+同じ seed なら同じ文書になる。
+"""
+from __future__ import annotations
+import random
+
+from lectgen.document import Document
+
+ASCII_WORDS = (
+    "cluster", "centroid", "distance", "variance", "gradient", "matrix", "vector",
+    "sample", "feature", "kernel", "entropy", "likelihood", "prior", "posterior",
+)
+JAPANESE_WORDS = (
+    "教師なし学習", "クラスタリング", "重心", "距離", "分散", "勾配", "行列", "ベクトル",
+    "標本", "特徴量", "カーネル", "エントロピー", "尤度", "事前分布", "事後分布",
+)
+SPECIALS = ("50%", "a_b", "$x$", "#1", "{k}", "x^2", "~", "&", "\\")
+
+
+def sentence(rng: random.Random, words: int = 12, *, japanese: bool = True, specials: float = 0.1) -> str:
+    pool = JAPANESE_WORDS if japanese else ASCII_WORDS
+    parts = []
+    for _ in range(words):
+        parts.append(rng.choice(SPECIALS) if rng.random() < specials else rng.choice(pool))
+    return ("" if japanese else " ").join(parts)
+
+
+def make_document(n: int, *, seed: int = 0, compact: bool = False) -> Document:
+    """ノード数がおよそ n の文書を作る（講義1回分のまとまりを繰り返す）"""
+    rng = random.Random(seed)
+    doc = Document.compact() if compact else Document()
+    while len(doc.nodes) < n:
+        lecture = rng.randint(1, 30)
+        doc.add_title("教師なし学習", f"第{lecture}回")
+        doc.add_section(rng.choice(JAPANESE_WORDS))
+        doc.add_terms(sentence(rng, 8), title=rng.choice(JAPANESE_WORDS), boxed=True)
+        doc.add_paragraph(sentence(rng, 20))
+        doc.add_paragraph(sentence(rng, 16, japanese=False))
+        doc.add_paragraph("区間 $[a,b]$ を縮めると $f'(x)$ が得られる。", raw=True)
+        doc.add_figure_space(height="100pt", count=rng.randint(1, 3), margin_bottom="10pt")
+        doc.add_list(
+            [sentence(rng, 4) for _ in range(rng.randint(2, 5))],
+            title="メリット",
+            title_marker="▶",
+            style=rng.choice(("itemize", "enumerate")),
+            boxed=rng.random() < 0.3,
+        )
+        doc.add_pagebreak()
+    del doc.nodes[n:]
+    return doc
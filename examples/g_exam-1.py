@@ -1,9 +1,9 @@
 # path: examples/make_sample.py
 from lectgen.document import Document
 from lectgen.renderers.latex import LatexRenderer
-import subprocess
+from lectgen.build import build
 
-filename = "教師なし学習.tex"
+filename = "教師なし学習.pdf"
 
 doc = Document()
 
@@ -91,11 +91,7 @@ renderer = LatexRenderer(
 """,
 )
 
-latex = renderer.render(doc)
-
-with open(filename, "w", encoding="utf-8") as f:
-    f.write(latex)
-
-print(f"Wrote {filename}")
-
-subprocess.run(["lualatex", filename])
\ No newline at end of file
+if __name__ == "__main__":
+    # 内容が前回と同じならコンパイルを省略。.aux/.log は .lectgen-build/ 以下に置く
+    result = build(doc, renderer, filename)
+    print(f"Wrote {result.pdf}" if result.compiled else f"{result.pdf} is up to date")
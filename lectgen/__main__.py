@@ -0,0 +1,6 @@
+from __future__ import annotations
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+asyncio 版のビルド（Web サービス等、イベントループの中からコンパイルする用）。
+
+    compiler = AsyncCompiler(max_concurrency=4, timeout=60)
+    pdf_bytes = await compiler.compile(doc, renderer)            # 一時ディレクトリでビルドしてバイト列を返す
+    result = await compiler.compile(doc, renderer, "out.pdf")    # build() と同じく BuildResult を返す
+
+エンジンは asyncio のサブプロセスで動かすのでループを塞がない。描画とファイル操作はスレッドに逃がす。
+タイムアウトやタスクのキャンセル時には、エンジンが起動した子プロセスも含めてプロセスグループごと止める。
+同じ out_pdf を同時にビルドしないこと（作業ディレクトリを共有するため）。
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, List, Optional, Union
+
+from .build import (
+    DEFAULT_ENGINE,
+    DEFAULT_MAX_PASSES,
+    BlockingStep,
+    BuildError,
+    BuildResult,
+    BuildSteps,
+    Engine,
+    EngineStep,
+    build_steps,
+    ensure_format,
+    validated,
+)
+from .document import Document
+from .metrics import CompilePass
+from .renderers.latex import LatexRenderer
+
+# レンダラ（断片キャッシュや計測）はスレッドセーフではないので描画は1本ずつ。
+# 描画は GIL の下の CPU 処理なので、並べても速くはならない。
+# 同じレンダラを別のスレッドから描画するとき（lectgen.serve など）もこのロックを取ること
+render_lock = threading.Lock()
+
+if os.name == "posix":
+    _SUBPROCESS_OPTIONS: dict = {"start_new_session": True}   # プロセスグループごと止めるため
+else:
+    _SUBPROCESS_OPTIONS = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+
+class CompileTimeout(BuildError):
+    """timeout 秒以内にビルドが終わらなかった（エンジンは停止済み）"""
+
+
+class AsyncCompiler:
+    """
+    同時に動かすビルドの数を max_concurrency に抑える非同期コンパイラ。
+    timeout と options（engine, precompile, max_passes など）は compile() の既定値になる。
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, *, timeout: Optional[float] = None, **options: Any) -> None:
+        self.semaphore = asyncio.Semaphore(max_concurrency or os.cpu_count() or 1)
+        self.timeout = timeout
+        self.options = options
+
+    async def compile(
+        self,
+        doc: Document,
+        renderer: LatexRenderer,
+        out_pdf: Union[str, Path, None] = None,
+        **overrides: Any,
+    ) -> Union[bytes, BuildResult]:
+        options = {"timeout": self.timeout, **self.options, **overrides}
+        return await compile_async(doc, renderer, out_pdf, semaphore=self.semaphore, **options)
+
+    async def warm(self, renderer: LatexRenderer) -> None:
+        """precompile=True なら、最初の依頼を待たせないよう renderer のフォーマットを先に作っておく"""
+        if self.options.get("precompile"):
+            await asyncio.to_thread(
+                ensure_format, renderer,
+                engine=self.options.get("engine", DEFAULT_ENGINE), format_dir=self.options.get("format_dir"),
+            )
+
+
+async def compile_async(
+    doc: Document,
+    renderer: LatexRenderer,
+    out_pdf: Union[str, Path, None] = None,
+    *,
+    engine: Engine = DEFAULT_ENGINE,
+    timeout: Optional[float] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    build_dir: Union[str, Path, None] = None,
+    force: bool = False,
+    precompile: bool = False,
+    format_dir: Union[str, Path, None] = None,
+    max_passes: int = DEFAULT_MAX_PASSES,
+    validate: bool = False,
+    metrics: bool = False,
+    tmp_root: Union[str, Path, None] = None,
+) -> Union[bytes, BuildResult]:
+    """
+    build() の非同期版。
+    out_pdf を省略すると一時ディレクトリ（tmp_root の下。/dev/shm などの tmpfs を渡せる）でビルドし、
+    PDF のバイト列を返す。
+    semaphore を渡すと、その枠が空くまで待ってから始める（timeout は待ち時間を含まない）。
+    timeout を過ぎたら CompileTimeout を投げる。
+    validate=True なら枠を待つ前に raw 部分を調べ、壊れた文書は枠を使わずに RawLatexError で返す。
+    metrics=True なら build() と同じく result.report に計測結果を入れる。
+    """
+    if validate:
+        # 全ノードを調べるのは CPU 処理なのでループの外で（streaming の文書は描画しながら調べる）
+        doc = await asyncio.to_thread(validated, doc, source=None if out_pdf is None else Path(out_pdf).name)
+    if out_pdf is None:
+        work = await asyncio.to_thread(tempfile.mkdtemp, prefix="lectgen-", dir=tmp_root)
+        try:
+            result = await compile_async(
+                doc, renderer, Path(work) / "document.pdf",
+                engine=engine, timeout=timeout, semaphore=semaphore, build_dir=work, force=True,
+                precompile=precompile, format_dir=format_dir, max_passes=max_passes, metrics=metrics,
+            )
+            return await asyncio.to_thread(result.pdf.read_bytes)  # type: ignore[union-attr]
+        finally:
+            await asyncio.to_thread(shutil.rmtree, work, ignore_errors=True)
+
+    async with semaphore or contextlib.nullcontext():
+        job = run_build_steps_async(build_steps(
+            doc, renderer, Path(out_pdf),
+            engine=engine, build_dir=build_dir, force=force,
+            precompile=precompile, format_dir=format_dir, metrics=metrics, max_passes=max_passes,
+        ))
+        if timeout is None:
+            return await job
+        try:
+            return await asyncio.wait_for(job, timeout)
+        except asyncio.TimeoutError:
+            raise CompileTimeout(f"build of {out_pdf} timed out after {timeout}s") from None
+
+
+async def run_build_steps_async(steps: BuildSteps) -> BuildResult:
+    """
+    build_steps を非同期に動かす（build.run_build_steps の非同期版）。
+    エンジンは asyncio のサブプロセスで、描画とファイル操作はスレッドで動かしてループを塞がない。
+    """
+    value: Any = None
+    while True:
+        try:
+            step = steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        if isinstance(step, EngineStep):
+            value = await run_engine_async(step)
+        elif step.renders:
+            value = await asyncio.to_thread(_call_locked, step)
+        else:
+            value = await asyncio.to_thread(step)
+
+
+def _call_locked(step: BlockingStep) -> Any:
+    with render_lock:
+        return step()
+
+
+async def run_engine_async(step: EngineStep) -> CompilePass:
+    """build.run_engine_sync の非同期版。キャンセルされたらプロセスグループごと止めてから伝える"""
+    t0 = time.perf_counter()
+    parser = step.parser()
+    output: List[str] = []
+    proc = await asyncio.create_subprocess_exec(
+        *step.argv(),
+        cwd=step.tex.parent,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        **_SUBPROCESS_OPTIONS,
+    )
+    try:
+        assert proc.stdout is not None
+        async for raw in proc.stdout:
+            line = raw.decode("utf-8", errors="replace")
+            output.append(line)
+            parser.feed(line)
+            if parser.fatal is not None:
+                break   # 最初のエラーで止める
+        parser.close()
+        if parser.fatal is not None:
+            _kill_tree(proc)
+        returncode = await proc.wait()
+    except BaseException:   # キャンセル・タイムアウトを含む
+        _kill_tree(proc)
+        await proc.wait()
+        raise
+    step.check(returncode, parser.fatal, output)
+    return CompilePass(seconds=time.perf_counter() - t0, returncode=returncode)
+
+
+def _kill_tree(proc: asyncio.subprocess.Process) -> None:
+    """エンジンと、それが起動した子プロセス（外部コマンド等）をまとめて止める"""
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except ProcessLookupError:
+        pass
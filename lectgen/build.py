@@ -0,0 +1,593 @@
+from __future__ import annotations
+import contextlib
+import hashlib
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None  # type: ignore[assignment]
+
+from .document import Document
+from .metrics import BuildReport, CompilePass, parse_log_stats
+from .renderers.latex import LatexRenderer
+from .storage import NodeStream
+from .texlog import LogAnalysis, LogMessage, LogParser, SourceMap, parse_log_file
+from .validate import ensure_valid, iter_validated
+
+# エンジンはコマンド名か、引数付きのコマンド列（スタブのコンパイラ等）で指定する
+Engine = Union[str, Sequence[str]]
+
+DEFAULT_ENGINE = "lualatex"
+BUILD_DIR_NAME = ".lectgen-build"   # 出力 PDF と同じ場所に作る作業ディレクトリ
+_STATE_FILE = "build.json"           # 最後に成功したビルドのハッシュ
+_ENGINE_FLAGS = ("-interaction=nonstopmode", "-halt-on-error", "-file-line-error")
+_FORMAT_FAILED = ".failed"           # ダンプに失敗したプリアンブルの印（毎回試さない）
+_FORMAT_RETRY_SECONDS = 3600         # 失敗の印の有効期間（一時的な失敗で無効のままにしない）
+DEFAULT_MAX_PASSES = 5               # ログが再実行を求め続けても、これ以上は回さない
+
+
+class BuildError(RuntimeError):
+    """LaTeX のコンパイルに失敗した"""
+
+    def __init__(
+        self,
+        message: str,
+        *,
+        log_path: Optional[Path] = None,
+        output: str = "",
+        messages: Sequence[LogMessage] = (),
+    ) -> None:
+        super().__init__(message)
+        self.log_path = log_path
+        self.output = output
+        self.messages = list(messages)   # ログから拾ったエラー（ノードの位置つき）
+
+
+@dataclass(frozen=True)
+class BuildResult:
+    pdf: Path          # 出力先の PDF
+    tex: Path          # ビルドディレクトリ内の .tex
+    build_dir: Path    # .aux/.log などを置く作業ディレクトリ
+    digest: str        # ソース・プリアンブル・エンジンのハッシュ
+    compiled: bool     # False なら変更なしでコンパイルを省略した
+    report: Optional[BuildReport] = None  # build(..., metrics=True) のときの計測結果
+    log: Optional[LogAnalysis] = None     # 最後のコンパイルのログの解析結果
+    passes: int = 0                       # コンパイルした回数
+
+
+def default_build_dir(out_pdf: Union[str, Path]) -> Path:
+    """文書ごとの作業ディレクトリ（例: out/.lectgen-build/lecture/）"""
+    out_pdf = Path(out_pdf)
+    return out_pdf.parent / BUILD_DIR_NAME / out_pdf.stem
+
+
+def engine_command(engine: Engine) -> List[str]:
+    return [engine] if isinstance(engine, str) else list(engine)
+
+
+def build(
+    doc: Document,
+    renderer: LatexRenderer,
+    out_pdf: Union[str, Path],
+    *,
+    engine: Engine = DEFAULT_ENGINE,
+    build_dir: Union[str, Path, None] = None,
+    force: bool = False,
+    precompile: bool = False,
+    format_dir: Union[str, Path, None] = None,
+    metrics: bool = False,
+    max_passes: int = DEFAULT_MAX_PASSES,
+    validate: bool = False,
+) -> BuildResult:
+    """
+    ドキュメントを PDF までビルドする。
+    前回成功したビルドとハッシュが同じなら .tex に触れずコンパイルも省略する。
+    .aux/.log は build_dir（既定は default_build_dir）にまとめ、カレントを汚さない。
+    precompile=True ならプリアンブルを事前にフォーマットへダンプし、そこから起動する
+    （ensure_format を参照）。
+    metrics=True なら描画・コンパイルの時間と .log の統計を result.report に入れる。
+    コンパイルは .log が再実行を求める間だけ（最大 max_passes 回）繰り返す。
+    エラーが出たらその時点でエンジンを止め、原因のノードの位置を添えて BuildError を投げる。
+    validate=True なら .tex を書く前に raw 部分を調べ、壊れていれば RawLatexError を投げる
+    （lectgen.validate を参照）。
+    """
+    out_pdf = Path(out_pdf)
+    if validate:
+        doc = validated(doc, source=out_pdf.name)
+    return run_build_steps(build_steps(
+        doc, renderer, out_pdf,
+        engine=engine, build_dir=build_dir, force=force, precompile=precompile,
+        format_dir=format_dir, metrics=metrics, max_passes=max_passes,
+    ))
+
+
+@dataclass(frozen=True)
+class BlockingStep:
+    """ビルドの手順のうち、ファイル操作や描画など待ちの発生する処理（非同期版はスレッドで動かす）"""
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+    renders: bool = False   # レンダラを使う（スレッドセーフでないので非同期版は1本ずつ動かす）
+
+    def __call__(self) -> Any:
+        return self.fn(*self.args)
+
+
+@dataclass(frozen=True)
+class EngineStep:
+    """エンジンの1回の実行（結果は CompilePass。エラーなら BuildError を投げる）"""
+    command: Sequence[str]
+    tex: Path
+    extra_args: Sequence[str]
+    source_map: Optional[SourceMap]
+
+    def argv(self) -> List[str]:
+        return [*self.command, *self.extra_args, *_ENGINE_FLAGS, self.tex.name]
+
+    def parser(self) -> LogParser:
+        """端末出力を逐次解析するパーサ（最初のエラーで止めるため）"""
+        return LogParser(self.source_map, jobname=self.tex.stem)
+
+    def check(self, returncode: int, fatal: Optional[LogMessage], output: List[str]) -> None:
+        """エラーが出たか終了コードが 0 でなければ BuildError を投げる"""
+        _check_engine_result(self.command, self.tex, returncode, fatal, output, self.source_map)
+
+
+BuildSteps = Generator[Union[BlockingStep, EngineStep], Any, BuildResult]
+
+
+def build_steps(
+    doc: Document,
+    renderer: LatexRenderer,
+    out_pdf: Path,
+    *,
+    engine: Engine = DEFAULT_ENGINE,
+    build_dir: Union[str, Path, None] = None,
+    force: bool = False,
+    precompile: bool = False,
+    format_dir: Union[str, Path, None] = None,
+    metrics: bool = False,
+    max_passes: int = DEFAULT_MAX_PASSES,
+) -> BuildSteps:
+    """
+    build() の手順を、実行する処理（BlockingStep / EngineStep）を順に yield するジェネレータとして書いたもの。
+    処理の結果を send で返すと次の処理に進み、最後に BuildResult を返す。
+    同期版は run_build_steps、非同期版は lectgen.aio が同じ手順を動かす（手順を二重に持たない）。
+    """
+    work = Path(build_dir) if build_dir is not None else default_build_dir(out_pdf)
+    command = engine_command(engine)
+    tex = work / f"{out_pdf.stem}.tex"
+
+    report = BuildReport(document=out_pdf.stem) if metrics else None
+    t0 = time.perf_counter()
+    source_digest, source_map = yield BlockingStep(_write_source, (doc, renderer, tex), renders=True)
+    if report is not None:
+        report.render_seconds = time.perf_counter() - t0
+    digest = _build_digest(source_digest, renderer, command)
+
+    if not force and (yield BlockingStep(_is_up_to_date, (out_pdf, work, digest))):
+        if report is not None:
+            report.skipped = True
+        return BuildResult(pdf=out_pdf, tex=tex, build_dir=work, digest=digest, compiled=False, report=report)
+
+    fmt = (yield BlockingStep(partial(ensure_format, renderer, engine=command, format_dir=format_dir))) if precompile else None
+    extra_args = () if fmt is None else (f"-fmt={fmt.with_suffix('')}",)
+    passes = 0
+    while True:
+        compile_pass = yield EngineStep(command, tex, extra_args, source_map)
+        passes += 1
+        if report is not None:
+            report.passes.append(compile_pass)
+        log = yield BlockingStep(parse_log_file, (tex.with_suffix(".log"), source_map))
+        if not log.needs_rerun or passes >= max_passes:
+            break
+    yield BlockingStep(_finish_build, (work, tex, out_pdf, {"digest": digest, "source": source_digest}, report))
+    return BuildResult(
+        pdf=out_pdf, tex=tex, build_dir=work, digest=digest, compiled=True,
+        report=report, log=log, passes=passes,
+    )
+
+
+def run_build_steps(
+    steps: BuildSteps, *, run_engine: Optional[Callable[[EngineStep], CompilePass]] = None,
+) -> BuildResult:
+    """build_steps をこのスレッドで最後まで動かす（run_engine でエンジンの実行を差し替えられる）"""
+    run_engine = run_engine or run_engine_sync
+    value: Any = None
+    while True:
+        try:
+            step = steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value = run_engine(step) if isinstance(step, EngineStep) else step()
+
+
+def _is_up_to_date(out_pdf: Path, work: Path, digest: str) -> bool:
+    return out_pdf.exists() and _read_state(work).get("digest") == digest
+
+
+def _finish_build(work: Path, tex: Path, out_pdf: Path, state: dict, report: Optional[BuildReport]) -> None:
+    _install_pdf(work / f"{out_pdf.stem}.pdf", out_pdf)
+    _write_state(work, state)
+    if report is not None:
+        report.log = parse_log_stats(_read_log(tex))
+
+
+def validated(doc: Document, *, source: Optional[str] = None) -> Document:
+    """
+    raw 部分を調べた doc を返す。問題があれば RawLatexError。
+    Document.streaming は先読みできないので、描画しながら調べる Document に包み直す。
+    """
+    if isinstance(doc.nodes, NodeStream):
+        return Document.streaming(iter_validated(doc.nodes, source=source))
+    ensure_valid(doc, source=source)
+    return doc
+
+
+def _write_source(doc: Document, renderer: LatexRenderer, tex: Path) -> Tuple[str, SourceMap]:
+    """
+    ソースを一時ファイルへ逐次書き出しつつハッシュと行→ノードの対応を取る。
+    内容が変わったときだけ .tex を置き換えるので、変更がなければ mtime も変わらない。
+    """
+    tex.parent.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256()
+    source_map = SourceMap()
+    tmp = tex.with_name(tex.name + ".tmp")
+    try:
+        with tmp.open("w", encoding="utf-8", newline="") as f:
+            for index, chunk in renderer.iter_render_indexed(doc):
+                f.write(chunk)
+                h.update(chunk.encode("utf-8"))
+                source_map.add(index, chunk)
+    except BaseException:
+        tmp.unlink(missing_ok=True)  # 描画の途中で失敗したら書きかけを残さない
+        raise
+    digest = h.hexdigest()
+    if tex.exists() and _file_digest(tex) == digest:
+        tmp.unlink()
+    else:
+        os.replace(tmp, tex)
+    return digest, source_map
+
+
+def _build_digest(source_digest: str, renderer: LatexRenderer, command: Sequence[str]) -> str:
+    h = hashlib.sha256()
+    for part in (
+        source_digest,
+        renderer.docclass,
+        renderer.docclass_options,
+        renderer.preamble,
+        "\0".join(command),
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def default_format_dir() -> Path:
+    """フォーマットの共有キャッシュ（文書をまたいで使い回す）"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "lectgen" / "formats"
+
+
+def format_key(renderer: LatexRenderer, command: Sequence[str]) -> str:
+    """
+    ダンプされる部分（出力される \\documentclass から \\begin{document} の前まで）とエンジンから作るフォーマットのキー。
+    レンダラの設定ではなく出力された文字列で決めるので、出力に現れない設定を変えても作り直さない。
+    エンジン本体の更新（TeX Live の入れ替え等）でも作り直すよう、実行ファイルの mtime も含める。
+    """
+    h = hashlib.sha256()
+    exe = shutil.which(command[0])
+    dumped, _, _ = renderer._document_head().partition("\\begin{document}")
+    for part in (
+        dumped,
+        "\0".join(command),
+        str(os.stat(exe).st_mtime_ns) if exe else "",
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:20]
+
+
+def ensure_format(
+    renderer: LatexRenderer,
+    *,
+    engine: Engine = DEFAULT_ENGINE,
+    format_dir: Union[str, Path, None] = None,
+) -> Optional[Path]:
+    """
+    プリアンブルを mylatexformat でフォーマットファイルにダンプし、そのパスを返す。
+    キーが同じなら既存のものを使うので、プリアンブルが変われば自動で作り直される。
+    ダンプできないプリアンブル（Lua 側の状態に依存するパッケージ等）は None を返し、
+    呼び出し側は通常の起動にフォールバックする。
+
+    並列ビルド（build_many・AsyncCompiler）から同時に呼ばれてよい。ダンプはキーごとのロックの中で
+    プロセス固有の名前に書き、終わってから {key}.fmt へ os.replace するので、書きかけの
+    フォーマットを読むことはない。失敗の印は _FORMAT_RETRY_SECONDS だけ有効で、その後は試し直す。
+    """
+    command = engine_command(engine)
+    # エンジンはビルドディレクトリで動くので絶対パスにしておく
+    fdir = (Path(format_dir) if format_dir is not None else default_format_dir()).resolve()
+    fdir.mkdir(parents=True, exist_ok=True)
+    key = format_key(renderer, command)
+    fmt = fdir / f"{key}.fmt"
+    failed = fdir / f"{key}{_FORMAT_FAILED}"
+    if fmt.exists():
+        return fmt
+    if _recently_failed(failed):
+        return None
+
+    with _file_lock(fdir / f"{key}.lock"):
+        # 待っている間に別のプロセスが作り終えているかもしれない
+        if fmt.exists():
+            return fmt
+        if _recently_failed(failed):
+            return None
+        # \begin{document} までがダンプされる。本文の .tex はそのままで、
+        # フォーマットから起動するとプリアンブル部分は読み飛ばされる
+        job = f"{key}-{os.getpid()}-{os.urandom(4).hex()}"
+        src = fdir / f"{job}.tex"
+        src.write_text(
+            renderer._document_head() + renderer._document_tail(),
+            encoding="utf-8",
+            newline="",
+        )
+        base = Path(command[0]).stem  # 例: lualatex → &lualatex
+        try:
+            proc = subprocess.run(
+                [*command, "-ini", f"-jobname={job}", "-interaction=nonstopmode",
+                 f"&{base}", "mylatexformat.ltx", src.name],
+                cwd=fdir,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            built = fdir / f"{job}.fmt"
+            if proc.returncode != 0 or not built.exists():
+                failed.touch()
+                return None
+            os.replace(built, fmt)
+        finally:
+            for leftover in fdir.glob(f"{job}.*"):
+                leftover.unlink(missing_ok=True)
+        failed.unlink(missing_ok=True)
+    return fmt
+
+
+def _recently_failed(marker: Path) -> bool:
+    try:
+        return time.time() - marker.stat().st_mtime < _FORMAT_RETRY_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+@contextlib.contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """プロセス間の排他（fcntl が無い環境では排他しない。os.replace で置くので壊れはしない）"""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@dataclass(frozen=True)
+class BuildJob:
+    """build_many に渡す1文書分のジョブ"""
+    doc: Document
+    renderer: LatexRenderer
+    out_pdf: Union[str, Path]
+
+    def load(self) -> Tuple[Document, LatexRenderer]:
+        return self.doc, self.renderer
+
+
+@dataclass(frozen=True)
+class ScriptJob:
+    """
+    教材スクリプト（モジュール変数 doc と renderer を定義する .py）を
+    ワーカー側で実行して得た文書をビルドするジョブ。
+    """
+    script: Union[str, Path]
+    out_pdf: Union[str, Path]
+
+    def load(self) -> Tuple[Document, LatexRenderer]:
+        return load_script(self.script)
+
+
+Job = Union[BuildJob, ScriptJob]
+
+
+@dataclass(frozen=True)
+class JobResult:
+    """build_many の1ジョブ分の結果。失敗したときは error に例外が入る"""
+    index: int
+    out_pdf: Path
+    result: Optional[BuildResult] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def load_script(path: Union[str, Path]) -> Tuple[Document, LatexRenderer]:
+    """
+    スクリプトを実行し、そのモジュール変数 doc と renderer を返す。
+    __name__ は "__main__" にならないので、if __name__ == "__main__": 以下は実行されない。
+    """
+    namespace = runpy.run_path(str(path), run_name="__lectgen__")
+    try:
+        return namespace["doc"], namespace["renderer"]
+    except KeyError as e:
+        raise ValueError(f"{path} does not define {e.args[0]!r}") from None
+
+
+def build_many(
+    jobs: Iterable[Job],
+    *,
+    workers: Optional[int] = None,
+    temporary: bool = False,
+    **options: Any,
+) -> List[JobResult]:
+    """
+    複数の文書をプロセスプールで並列にビルドする。
+    - workers: 同時に動かすプロセス数（既定は CPU 数）
+    - temporary: True なら各ジョブを使い捨ての一時ディレクトリでビルドする
+      （False なら文書ごとの build_dir を使い、変更のない文書は省略される）
+    - options: build() にそのまま渡す（engine, force, precompile など）
+    ジョブごとに別のビルドディレクトリを使うので .aux/.log が衝突することはない。
+    失敗したジョブも例外を投げずに JobResult.error に集め、結果は jobs の順に返す。
+    """
+    jobs = list(jobs)
+    _check_distinct_outputs(jobs)
+    workers = workers or os.cpu_count() or 1
+    results: List[Optional[JobResult]] = [None] * len(jobs)
+    pending: Dict[Future, int] = {}
+    # 投入するジョブ数を抑え、巨大なバッチでも一度に全部を pickle しない
+    window = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = iter(enumerate(jobs))
+        for index, job in queue:
+            pending[pool.submit(_run_job, job, temporary, options)] = index
+            if len(pending) >= window:
+                _collect(pending, results, jobs)
+        while pending:
+            _collect(pending, results, jobs)
+    return results  # type: ignore[return-value]
+
+
+def _collect(pending: Dict[Future, int], results: list, jobs: list) -> None:
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        index = pending.pop(future)
+        out_pdf = Path(jobs[index].out_pdf)
+        try:
+            results[index] = JobResult(index, out_pdf, result=future.result())
+        except Exception as e:  # ワーカー内の例外もプロセス異常もジョブの失敗として返す
+            results[index] = JobResult(index, out_pdf, error=e)
+
+
+def _run_job(job: Job, temporary: bool, options: Dict[str, Any]) -> BuildResult:
+    doc, renderer = job.load()
+    if not temporary:
+        return build(doc, renderer, job.out_pdf, **options)
+    # 一時ディレクトリは終わったら消えるので、結果の build_dir は参照用にとどまる
+    with tempfile.TemporaryDirectory(prefix="lectgen-") as work:
+        return build(doc, renderer, job.out_pdf, **{**options, "build_dir": work, "force": True})
+
+
+def _check_distinct_outputs(jobs: Sequence[Job]) -> None:
+    seen = set()
+    for job in jobs:
+        out = Path(job.out_pdf).resolve()
+        if out in seen:
+            raise ValueError(f"duplicate output in batch: {job.out_pdf}")
+        seen.add(out)
+
+
+def run_engine_sync(step: EngineStep) -> CompilePass:
+    """
+    エンジンを1回実行する。端末出力を逐次 LogParser に通し、
+    最初のエラーが出た時点でプロセスを止めて BuildError を投げる（最後まで走らせない）。
+    """
+    t0 = time.perf_counter()
+    parser = step.parser()
+    output: List[str] = []
+    with subprocess.Popen(
+        step.argv(),
+        cwd=step.tex.parent,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    ) as proc:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            output.append(line)
+            parser.feed(line)
+            if parser.fatal is not None:
+                proc.kill()
+                break
+        parser.close()
+        returncode = proc.wait()
+
+    step.check(returncode, parser.fatal, output)
+    return CompilePass(seconds=time.perf_counter() - t0, returncode=returncode)
+
+
+def _check_engine_result(
+    command: Sequence[str],
+    tex: Path,
+    returncode: int,
+    fatal: Optional[LogMessage],
+    output: List[str],
+    source_map: Optional[SourceMap],
+) -> None:
+    """エラーが出たか終了コードが 0 でなければ BuildError を投げる"""
+    log_path = tex.with_suffix(".log")
+    if fatal is None and returncode != 0:
+        # 端末出力から拾えなかったときは .log から探す
+        errors = parse_log_file(log_path, source_map).errors
+        fatal = errors[0] if errors else None
+    if fatal is not None or returncode != 0:
+        detail = f": {fatal}" if fatal is not None else ""
+        raise BuildError(
+            f"{command[0]} failed with exit code {returncode} (see {log_path}){detail}",
+            log_path=log_path,
+            output="".join(output),
+            messages=[fatal] if fatal is not None else [],
+        )
+
+
+def _read_log(tex: Path) -> str:
+    try:
+        return tex.with_suffix(".log").read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
+def _install_pdf(built: Path, out_pdf: Path) -> None:
+    if not built.exists():
+        raise BuildError(f"engine did not produce {built}")
+    out_pdf.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_pdf.with_name(out_pdf.name + ".tmp")
+    shutil.copyfile(built, tmp)
+    os.replace(tmp, out_pdf)
+
+
+def _read_state(work: Path) -> dict:
+    try:
+        with (work / _STATE_FILE).open(encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(work: Path, state: dict) -> None:
+    with (work / _STATE_FILE).open("w", encoding="utf-8") as f:
+        json.dump(state, f)
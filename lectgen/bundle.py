@@ -0,0 +1,99 @@
+"""
+小さな文書をまとめて1回のエンジン実行でコンパイルし、文書ごとの PDF に分け直す。
+
+1〜2ページの配布資料では、コンパイル時間の大半が同じプリアンブル（luatexja, tcolorbox, フォント）の
+読み込みに使われる。同じ LatexRenderer を使う文書を \\clearpage で区切って1つのソースにつなぎ、
+各文書の先頭で \\typeout により開始ページ（それまでに出力したページ数）をログに書かせる。
+コンパイル後、その記録からページ範囲を求めて PDF を分割する。
+"""
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from itertools import chain
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Sequence, Tuple, Union
+
+from .build import BuildError, BuildResult, _read_log, build, validated
+from .document import Document
+from .metrics import parse_log_stats
+from .nodes import Node, PageBreak, Paragraph
+from .pdf import page_count, split_pdf
+from .renderers.latex import LatexRenderer
+
+_MARKER = "lectgen-bundle"
+_MARKER_LINE = re.compile(rf"^{_MARKER}:(\d+):(\d+)$", re.M)
+
+
+@dataclass(frozen=True)
+class BundleResult:
+    pdf: Path                       # まとめた PDF
+    outputs: List[Path]             # 文書ごとの PDF（入力の順）
+    ranges: List[Tuple[int, int]]   # 各文書のページ範囲（1 始まり・両端を含む。空の文書は (n+1, n)）
+    build: BuildResult              # まとめた PDF のビルド結果
+    split: bool                     # False なら変更がなく、分割も省略した
+
+    def pages(self, index: int) -> int:
+        first, last = self.ranges[index]
+        return last - first + 1
+
+
+def build_bundle(
+    jobs: Iterable[Tuple[Document, Union[str, Path]]],
+    renderer: LatexRenderer,
+    bundle_pdf: Union[str, Path],
+    *,
+    restart_page: bool = True,
+    **options: Any,
+) -> BundleResult:
+    """
+    (文書, 出力先の PDF) の組をまとめてビルドする。options は build() に渡す。
+    restart_page=True なら各文書のページ番号を 1 から振り直す。
+    validate=True なら文書ごとに raw 部分を調べる（エラーには出力先の名前が付く）。
+    ページを1枚も出力しなかった文書の PDF は作らない（ranges で分かる）。
+    """
+    jobs = list(jobs)
+    if not jobs:
+        raise ValueError("no documents to bundle")
+    outputs = [Path(out) for _, out in jobs]
+    if options.pop("validate", False):
+        jobs = [(validated(doc, source=out.name), out) for (doc, _), out in zip(jobs, outputs)]
+    bundle = Document.streaming(_bundle_nodes([doc for doc, _ in jobs], restart_page))
+    result = build(bundle, renderer, bundle_pdf, **options)
+
+    ranges = _page_ranges(result, len(jobs))
+    if not result.compiled and all(out.exists() for out in outputs):
+        return BundleResult(result.pdf, outputs, ranges, result, split=False)
+    keep = [i for i, (first, last) in enumerate(ranges) if first <= last]
+    split_pdf(result.pdf, [ranges[i] for i in keep], [outputs[i] for i in keep])
+    return BundleResult(result.pdf, outputs, ranges, result, split=True)
+
+
+def _bundle_nodes(docs: Sequence[Document], restart_page: bool) -> Iterator[Node]:
+    for i, doc in enumerate(docs):
+        if i:
+            yield PageBreak()
+        yield _marker(i, restart_page)
+        yield from doc.nodes
+
+
+def _marker(index: int, restart_page: bool) -> Paragraph:
+    # \clearpage の直後なので、この時点の \ReadonlyShipoutCounter は前の文書までのページ数
+    reset = "\\setcounter{page}{1}" if restart_page else ""
+    return Paragraph(f"{reset}\\typeout{{{_MARKER}:{index}:\\the\\ReadonlyShipoutCounter}}%", raw=True)
+
+
+def _page_ranges(result: BuildResult, count: int) -> List[Tuple[int, int]]:
+    log = _read_log(result.tex)
+    shipped = {int(m.group(1)): int(m.group(2)) for m in _MARKER_LINE.finditer(log)}
+    missing = [i for i in range(count) if i not in shipped]
+    if missing:
+        raise BuildError(
+            f"page markers missing from the log for document(s) {missing[:10]}",
+            log_path=result.tex.with_suffix(".log"),
+        )
+    total = parse_log_stats(log).pages
+    if total is None:
+        total = page_count(result.pdf)
+    starts = [shipped[i] + 1 for i in range(count)]
+    ends = [s - 1 for s in chain(starts[1:], [total + 1])]
+    return list(zip(starts, ends))
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import argparse
+import shlex
+import sys
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from .build import DEFAULT_ENGINE, BuildError, ScriptJob, build_many, load_script
+from .bundle import build_bundle
+from .layout import OVERFLOW, LayoutEstimator
+from .renderers.html import HtmlRenderer
+from .validate import RawLatexError
+from .watch import Watcher
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """python -m lectgen のエントリポイント"""
+    parser = argparse.ArgumentParser(prog="lectgen", description="授業資料のビルドツール")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="教材スクリプトを並列にビルドする")
+    p_build.add_argument("scripts", nargs="+", type=Path, help="doc と renderer を定義する .py")
+    p_build.add_argument("-o", "--out-dir", type=Path, default=Path("."), help="PDF の出力先")
+    p_build.add_argument("-j", "--jobs", type=int, default=None, help="同時に動かすプロセス数")
+    _add_engine_options(p_build)
+    p_build.add_argument("--temporary", action="store_true", help="ジョブごとに一時ディレクトリでビルド")
+    p_build.add_argument("--bundle", metavar="NAME", default=None,
+                         help="同じプリアンブルの文書を1回のコンパイルにまとめ、NAME.pdf から分割する")
+    p_build.set_defaults(func=_cmd_build)
+
+    p_watch = sub.add_parser("watch", help="スクリプトの変更を監視して再ビルドする")
+    p_watch.add_argument("script", type=Path, help="doc と renderer を定義する .py")
+    p_watch.add_argument("-o", "--output", type=Path, default=None, help="PDF の出力先（既定: <script>.pdf）")
+    p_watch.add_argument("--watch", dest="inputs", action="append", type=Path, default=[],
+                         help="追加で監視する入力ファイル（複数指定可）")
+    p_watch.add_argument("--interval", type=float, default=0.5, help="ポーリング間隔（秒）")
+    p_watch.add_argument("--debounce", type=float, default=0.3, help="連続保存をまとめる待ち時間（秒）")
+    _add_engine_options(p_watch)
+    p_watch.set_defaults(func=_cmd_watch)
+
+    p_preview = sub.add_parser("preview", help="教材スクリプトを HTML で書き出す（TeX 不要）")
+    p_preview.add_argument("script", type=Path, help="doc と renderer を定義する .py")
+    p_preview.add_argument("-o", "--output", type=Path, default=None, help="HTML の出力先（既定: <script>.html）")
+    p_preview.set_defaults(func=_cmd_preview)
+
+    p_layout = sub.add_parser("layout", help="コンパイルせずにページの埋まり具合とはみ出しを見積もる")
+    p_layout.add_argument("script", type=Path, help="doc と renderer を定義する .py")
+    p_layout.add_argument("--breaks", action="store_true", help="PageBreak を入れるとよい位置も表示する")
+    p_layout.set_defaults(func=_cmd_layout)
+
+    p_serve = sub.add_parser("serve", help="レンダラを常駐させ、HTTP で文書を受け取って PDF を返す")
+    p_serve.add_argument("renderers", type=Path, help="renderers（名前 → LatexRenderer）か renderer を定義する .py")
+    p_serve.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    p_serve.add_argument("--port", type=int, default=8765, help="待ち受けるポート")
+    p_serve.add_argument("--unix", type=Path, default=None, help="TCP の代わりに Unix ソケットで待ち受ける")
+    p_serve.add_argument("-j", "--jobs", type=int, default=None, help="同時に動かすコンパイル数")
+    p_serve.add_argument("--timeout", type=float, default=None, help="1件のコンパイルの制限時間（秒）")
+    p_serve.add_argument("--cache-dir", type=Path, default=None, help="PDF キャッシュの置き場所（省略時はキャッシュしない）")
+    p_serve.add_argument("--cache-size", type=int, default=512, help="PDF キャッシュの上限（MB）")
+    p_serve.add_argument("--engine", default=DEFAULT_ENGINE, help="エンジンのコマンド（引数付き可）")
+    p_serve.add_argument("--precompile", action="store_true", help="プリアンブルのフォーマットを使う")
+    p_serve.add_argument("--no-validate", dest="validate", action="store_false",
+                         help="raw LaTeX の事前チェックをしない")
+    p_serve.add_argument("--stub", action="store_true", help="TeX を使わず、ダミーの PDF を返す（動作確認用）")
+    p_serve.set_defaults(func=_cmd_serve)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+def _add_engine_options(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--engine", default=DEFAULT_ENGINE, help="エンジンのコマンド（引数付き可）")
+    p.add_argument("--force", action="store_true", help="変更がなくてもコンパイルする")
+    p.add_argument("--precompile", action="store_true", help="プリアンブルのフォーマットを使う")
+    p.add_argument("--validate", action="store_true", help="コンパイル前に raw LaTeX の括弧・数式・環境の対応を調べる")
+
+
+def _engine_options(args: argparse.Namespace) -> dict:
+    return {
+        "engine": shlex.split(args.engine), "force": args.force, "precompile": args.precompile,
+        "validate": args.validate,
+    }
+
+
+def _cmd_build(args: argparse.Namespace) -> int:
+    if args.bundle:
+        return _cmd_build_bundle(args)
+    jobs: List[ScriptJob] = [
+        ScriptJob(script=script, out_pdf=args.out_dir / f"{script.stem}.pdf") for script in args.scripts
+    ]
+    results = build_many(jobs, workers=args.jobs, temporary=args.temporary, **_engine_options(args))
+    failed = 0
+    for job, r in zip(jobs, results):
+        if r.ok:
+            state = "built" if r.result.compiled else "up to date"
+            print(f"{r.out_pdf}: {state}")
+        else:
+            failed += 1
+            print(f"{r.out_pdf}: FAILED ({job.script}): {r.error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def _cmd_build_bundle(args: argparse.Namespace) -> int:
+    loaded = [load_script(script) for script in args.scripts]
+    renderer = loaded[0][1]
+    for script, (_, r) in zip(args.scripts, loaded):
+        if r != renderer:
+            print(f"{script}: renderer differs from {args.scripts[0]}; cannot bundle", file=sys.stderr)
+            return 1
+    jobs = [(doc, args.out_dir / f"{script.stem}.pdf") for script, (doc, _) in zip(args.scripts, loaded)]
+    try:
+        result = build_bundle(jobs, renderer, args.out_dir / f"{args.bundle}.pdf", **_engine_options(args))
+    except (BuildError, RawLatexError) as e:
+        print(f"{args.bundle}.pdf: FAILED: {e}", file=sys.stderr)
+        return 1
+    for i, out in enumerate(result.outputs):
+        state = "built" if result.split else "up to date"
+        print(f"{out}: {state} ({result.pages(i)} pages)")
+    return 0
+
+
+def _cmd_watch(args: argparse.Namespace) -> int:
+    out_pdf = args.output or args.script.with_suffix(".pdf")
+    Watcher(
+        args.script,
+        out_pdf,
+        inputs=args.inputs,
+        interval=args.interval,
+        debounce=args.debounce,
+        **_engine_options(args),
+    ).run()
+    return 0
+
+
+def _cmd_preview(args: argparse.Namespace) -> int:
+    out = args.output or args.script.with_suffix(".html")
+    doc, _ = load_script(args.script)
+    with out.open("w", encoding="utf-8", newline="") as f:
+        HtmlRenderer(title=args.script.stem).render_to(doc, f)
+    print(f"{out}: written")
+    return 0
+
+
+def _cmd_layout(args: argparse.Namespace) -> int:
+    doc, renderer = load_script(args.script)
+    estimator = LayoutEstimator.for_renderer(renderer)
+    if args.breaks:
+        _, estimate = estimator.paginate(doc)
+    else:
+        estimate = estimator.estimate(doc)
+    print(estimate.summary())
+    if args.breaks:
+        for index in estimate.breaks:
+            print(f"break: before node {index} ({type(doc.nodes[index]).__name__})")
+    print(f"{args.script}: about {estimate.page_count} page(s)")
+    return 1 if any(w.kind == OVERFLOW for w in estimate.warnings) else 0
+
+
+def _cmd_serve(args: argparse.Namespace) -> int:
+    # サーバ用のモジュール（asyncio など）は serve のときだけ読み込む
+    import asyncio
+    from .aio import AsyncCompiler
+    from .serve import PdfCache, RenderServer, StubCompiler, default_tmp_root, load_renderers, run_server
+
+    if args.stub:
+        compiler = StubCompiler()
+    else:
+        compiler = AsyncCompiler(
+            args.jobs, timeout=args.timeout,
+            engine=shlex.split(args.engine), precompile=args.precompile, tmp_root=default_tmp_root(),
+        )
+    cache = PdfCache(args.cache_dir, args.cache_size << 20) if args.cache_dir else None
+    server = RenderServer(load_renderers(args.renderers), compiler=compiler, cache=cache, validate=args.validate)
+    try:
+        asyncio.run(run_server(server, host=args.host, port=args.port, unix=args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -1,16 +1,59 @@
 # path: lectgen/document.py
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import List, Sequence, Optional
+from pathlib import Path
+from typing import Iterable, MutableSequence, Sequence, Optional, Union
 
 from .nodes import (
     Node, Title, Paragraph, Terms, Section, TermItem, FigureSpace, ListBlock, PageBreak
 )
+from .storage import NodeArray, NodeStream
+from . import serialize
 
 @dataclass
 class Document:
     """授業資料（ノードのコンテナ）"""
-    nodes: List[Node] = field(default_factory=list)
+    nodes: MutableSequence[Node] = field(default_factory=list)
+
+    @classmethod
+    def compact(cls) -> "Document":
+        """同じ値のノードを共有する省メモリな Document（数十万ノード規模の問題集向け）"""
+        return cls(nodes=NodeArray())
+
+    @classmethod
+    def streaming(cls, nodes: Iterable[Node]) -> "Document":
+        """
+        ノードを保持せず、レンダラが一度だけ読み流す Document。
+        ローダー（lectgen.ingest）と render_to を組み合わせ、巨大な入力を一定メモリで変換する用。
+        add_* は使えない。
+        """
+        return cls(nodes=NodeStream(nodes))  # type: ignore[arg-type]
+
+    def extend(self, nodes: Iterable[Node]) -> None:
+        """ノードをまとめて追加（ローダーのジェネレータもそのまま渡せる）"""
+        self.nodes.extend(nodes)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """バイナリ形式（lectgen.serialize）で保存。生成処理をやり直さずに再レンダリングできる"""
+        serialize.save(self.nodes, path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], *, lazy: bool = False) -> "Document":
+        """
+        save() したファイルを読み込む。
+        lazy=True ならファイルを mmap し、ノードはアクセスされたときに復元する
+        （nodes は読み取り専用の LazyNodes。巨大な問題集をそのままレンダラに流す用）。
+        """
+        if lazy:
+            return cls(nodes=serialize.LazyNodes(path))  # type: ignore[arg-type]
+        return cls(nodes=serialize.load(path))
+
+    def to_bytes(self) -> bytes:
+        return serialize.dumps(self.nodes)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Document":
+        return cls(nodes=serialize.loads(data))
 
     def add_pagebreak(self) -> None:
         """次のページに移行（LaTeXの改ページ）"""
@@ -92,7 +135,7 @@ class Document:
     
     def add_list(
         self,
-        items: list[str],
+        items: Sequence[str],
         *,
         title: str | None = None,
         title_marker: str = "●",
@@ -100,6 +143,7 @@ class Document:
         boxed: bool = False,
         margin_before: str = "6pt",  # タイトルの上余白
         margin_after: str = "6pt",   # 箇条書き全体の下余白
+        raw: bool = False,
     ) -> None:
         """
         箇条書き（itemize/enumerate）を追加。
@@ -107,5 +151,6 @@ class Document:
         - title: リストの見出し（任意）
         - style: 'itemize'（黒丸）または 'enumerate'（番号付き）
         - boxed: True なら枠で囲む
+        - raw: True なら項目をそのまま LaTeX に流す
         """
-        self.nodes.append(ListBlock(items=items, title=title,title_marker=title_marker, style=style, boxed=boxed, margin_before=margin_before, margin_after=margin_after))
\ No newline at end of file
+        self.nodes.append(ListBlock(items=items, title=title,title_marker=title_marker, style=style, boxed=boxed, margin_before=margin_before, margin_after=margin_after, raw=raw))
\ No newline at end of file
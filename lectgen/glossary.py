@@ -0,0 +1,401 @@
+"""
+用語集による本文の自動リンク（各用語の最初の出現を強調し、逆引きの索引を作る）。
+
+    glossary = Glossary.from_nodes(glossary_doc.nodes)      # Terms / TermItem から用語を集める
+    result = glossary.annotate(doc)                          # 強調と \\label を入れた新しい Document
+    result.document.nodes.append(result.index_node())        # 用語 → ページの索引
+
+用語ごとに str.find や正規表現で全段落を探すと（用語数 × 本文量）になる。Glossary は全用語から
+Aho-Corasick のオートマトンを一度だけ作り、本文を1回なめるだけで全用語の出現を見つける。
+重なった出現は左から、同じ位置なら長い用語を優先する（「機械学習」と「学習」なら「機械学習」）。
+
+照合は日本語を前提にしている。
+- NFKC と casefold で正規化して比べる（全角英数字・半角カナ・大文字小文字の違いを無視。半角の濁点も合成する）
+- 英数字やカタカナで始まる（終わる）用語は、前（後）が同じ字種なら一致としない
+  （「AI」は「RAID」に、「データ」は「データベース」に一致しない）。漢字・ひらがなは区切らない
+
+対象は raw でない Paragraph と ListBlock の項目。見出しと raw=True の文字列（LaTeX のソース）は触らない。
+作ったオートマトンは save()/load()（Glossary.cached）でディスクに置いて使い回せる。
+"""
+from __future__ import annotations
+import hashlib
+import pickle
+import re
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .document import Document
+from .nodes import ListBlock, Node, Paragraph, Section, TermItem, Terms
+from .utils.text import latex_escape
+
+_FORMAT = 1   # save() の形式（変えたら上げる）
+
+# 強調の既定（surface はエスケープ済みの出現箇所の文字列）
+Marker = Callable[[str, "GlossaryEntry"], str]
+
+
+def bold(surface: str, entry: "GlossaryEntry") -> str:
+    return f"\\textbf{{{surface}}}"
+
+
+@dataclass(frozen=True)
+class GlossaryEntry:
+    term: str                          # 見出し語（索引に出す表記）
+    aliases: Tuple[str, ...] = ()      # 別表記（略語・送り仮名の揺れなど）
+
+    @property
+    def surfaces(self) -> Tuple[str, ...]:
+        return (self.term, *self.aliases)
+
+
+@dataclass(frozen=True)
+class Occurrence:
+    node: int             # doc.nodes での位置
+    item: Optional[int]   # ListBlock の項目の位置（Paragraph なら None）
+    start: int            # 文字列内の位置（元の文字列での添字）
+    end: int
+    entry: int            # Glossary.entries での位置
+    label: Optional[str]  # 索引用に付けた \\label（付けていなければ None）
+
+
+class _Fold(dict):
+    """str.translate 用の正規化表（1文字 → 1文字。初めて見た文字だけ計算して覚える）"""
+
+    def __missing__(self, code: int) -> int:
+        folded = unicodedata.normalize("NFKC", chr(code)).casefold()
+        # 文字数が変わる正規化（㍿ → 株式会社 など）は位置がずれるので行わない
+        self[code] = value = ord(folded) if len(folded) == 1 else code
+        return value
+
+
+_fold_table = _Fold()
+
+
+def fold(text: str) -> str:
+    """照合用の正規化（長さは変わらない。濁点の合成は _fold_with_offsets）"""
+    return text.translate(_fold_table)
+
+
+# 半角カナの濁点・半濁点は NFKC で結合文字になるので、前の文字と合成する（ﾃﾞ → デ）
+_VOICING = re.compile("[\uff9e\uff9f\u3099\u309a]").search
+
+
+def _fold_with_offsets(text: str) -> Tuple[str, List[int]]:
+    """濁点を合成しながら正規化し、(正規化した文字列, 各文字の元の位置 + 末尾) を返す"""
+    chars: List[str] = []
+    starts: List[int] = []
+    for i, ch in enumerate(text):
+        c = chr(_fold_table[ord(ch)])
+        if c in "\u3099\u309a" and chars:
+            composed = unicodedata.normalize("NFC", chars[-1] + c)
+            if len(composed) == 1:
+                chars[-1] = composed
+                continue
+        chars.append(c)
+        starts.append(i)
+    starts.append(len(text))
+    return "".join(chars), starts
+
+
+# 境界を見る字種：0 = なし、1 = 英数字、2 = カタカナ（正規化後。半角カナは全角になっている）
+def _char_class(ch: str) -> int:
+    if ch.isascii():
+        return 1 if ch.isalnum() else 0
+    return 2 if "\u30a1" <= ch <= "\u30fa" or ch == "\u30fc" else 0
+
+
+class Glossary:
+    """
+    用語集の Aho-Corasick オートマトン。作るのは一度で、何文書にでも使える（中身は変えない）。
+    entries は GlossaryEntry か用語の文字列。同じ表記が複数の用語にあれば先のものを使う。
+    """
+
+    def __init__(self, entries: Iterable[Union[GlossaryEntry, str]]) -> None:
+        self.entries: List[GlossaryEntry] = [
+            e if isinstance(e, GlossaryEntry) else GlossaryEntry(e) for e in entries
+        ]
+        self._build()
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[Node]) -> "Glossary":
+        """
+        用語集のノードから作る。TermItem は term、Terms は title（ingest で1行1用語にした形）と
+        本文の description 環境の \\item[用語] を見出し語にする。
+        """
+        terms: Dict[str, None] = {}
+        for node in nodes:
+            if isinstance(node, TermItem):
+                terms[node.term] = None
+            elif isinstance(node, Terms):
+                if node.title:
+                    terms[node.title] = None
+                for m in _ITEM_KEY.finditer(node.content):
+                    terms[_strip_braces(m.group(1))] = None
+        return cls(t for t in terms if t.strip())
+
+    def _build(self) -> None:
+        goto: List[Dict[str, int]] = [{}]
+        depth = [0]
+        term_at = [-1]   # その状態で終わる表記の用語（無ければ -1）
+        patterns: Dict[str, int] = {}
+        for index, entry in enumerate(self.entries):
+            for surface in entry.surfaces:
+                key = _fold_with_offsets(surface.strip())[0]
+                if key and key not in patterns:
+                    patterns[key] = index
+        for key, index in patterns.items():
+            s = 0
+            for ch in key:
+                nxt = goto[s].get(ch)
+                if nxt is None:
+                    nxt = goto[s][ch] = len(goto)
+                    goto.append({})
+                    depth.append(depth[s] + 1)
+                    term_at.append(-1)
+                s = nxt
+            term_at[s] = index
+
+        # 幅優先で失敗リンクと、接尾辞のうち用語で終わる最寄りの状態（出力リンク）を張る
+        fail = [0] * len(goto)
+        out = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, t in goto[s].items():
+                if s:
+                    f = fail[s]
+                    while f and ch not in goto[f]:
+                        f = fail[f]
+                    fail[t] = goto[f].get(ch, 0)
+                out[t] = fail[t] if term_at[fail[t]] >= 0 else out[fail[t]]
+                queue.append(t)
+
+        self._goto, self._fail, self._out, self._depth, self._term_at = goto, fail, out, depth, term_at
+        # 状態 → 表記の先頭・末尾の字種（境界の判定用）
+        edge: Dict[int, Tuple[int, int]] = {}
+        for key in patterns:
+            s = 0
+            for ch in key:
+                s = goto[s][ch]
+            edge[s] = (_char_class(key[0]), _char_class(key[-1]))
+        self._edge_of_state = edge
+        self._compile_skip()
+
+    def _compile_skip(self) -> None:
+        # 根からの遷移がある文字までは正規表現で読み飛ばす（用語に使われない文字が大半の本文で速い）
+        firsts = "".join(sorted(self._goto[0]))
+        self._skip = re.compile(f"[{re.escape(firsts)}]").search if firsts else None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # --- 照合 ---
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """text 中の出現を (開始, 終了, 用語の位置) の列で返す（重ならない・左から・長い方優先）"""
+        if self._skip is None or not text:
+            return []
+        starts: Optional[List[int]] = None
+        if _VOICING(text):
+            folded, starts = _fold_with_offsets(text)
+        else:
+            folded = fold(text)
+        goto, fail, out, depth, term_at = self._goto, self._fail, self._out, self._depth, self._term_at
+        edge, skip = self._edge_of_state, self._skip
+        n = len(folded)
+        found: List[Tuple[int, int, int]] = []
+        s = 0
+        i = 0
+        while i < n:
+            if not s:
+                m = skip(folded, i)
+                if m is None:
+                    break
+                i = m.start()
+            ch = folded[i]
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            i += 1
+            # i で終わる表記を長い順にたどり、境界の条件を満たす最長のものを候補にする
+            t = s if term_at[s] >= 0 else out[s]
+            while t:
+                start = i - depth[t]
+                head, tail = edge[t]
+                if (not head or start == 0 or _char_class(folded[start - 1]) != head) and (
+                    not tail or i == n or _char_class(folded[i]) != tail
+                ):
+                    found.append((start, i, term_at[t]))
+                    break
+                t = out[t]
+        if len(found) > 1:
+            # 終了位置ごとの最長の候補から、左から重ならないように選ぶ
+            found.sort(key=lambda f: (f[0], -f[1]))
+            chosen: List[Tuple[int, int, int]] = []
+            last = 0
+            for f in found:
+                if f[0] >= last:
+                    chosen.append(f)
+                    last = f[1]
+            found = chosen
+        if starts is not None:
+            found = [(starts[a], starts[b], e) for a, b, e in found]
+        return found
+
+    # --- 文書への適用 ---
+
+    def annotate(
+        self,
+        doc: Document,
+        *,
+        first_only: bool = True,
+        mark: Marker = bold,
+        labels: bool = True,
+        label_prefix: str = "gl",
+    ) -> "AnnotatedDocument":
+        """
+        doc の本文に用語の出現を書き込んだ新しい Document を返す（doc は変えない）。
+        - first_only: 各用語の最初の出現だけを mark で強調する（False なら全部）
+        - labels: 索引のために \\label を入れる（用語ごとに、Section で区切った範囲で最初の出現だけ）
+        出現のあった Paragraph / ListBlock は raw=True の新しいノードに置き換わり、他のノードは共有する。
+        """
+        marked: set = set()
+        labelled: set = set()
+        counter = [0]
+        occurrences: List[Occurrence] = []
+        nodes: List[Node] = []
+
+        def rewrite(index: int, item: Optional[int], text: str) -> Optional[str]:
+            hits = self.find(text)
+            if not hits:
+                return None
+            parts: List[str] = []
+            pos = 0
+            for start, end, entry in hits:
+                parts.append(latex_escape(text[pos:start]))
+                surface = latex_escape(text[start:end])
+                if not first_only or entry not in marked:
+                    marked.add(entry)
+                    surface = mark(surface, self.entries[entry])
+                label = None
+                if labels and entry not in labelled:
+                    labelled.add(entry)
+                    counter[0] += 1
+                    label = f"{label_prefix}:{entry}:{counter[0]}"
+                    surface += f"\\label{{{label}}}"
+                parts.append(surface)
+                occurrences.append(Occurrence(index, item, start, end, entry, label))
+                pos = end
+            parts.append(latex_escape(text[pos:]))
+            return "".join(parts)
+
+        for index, node in enumerate(doc.nodes):
+            if isinstance(node, Section):
+                labelled.clear()
+            elif isinstance(node, Paragraph) and not node.raw:
+                text = rewrite(index, None, node.text)
+                if text is not None:
+                    node = Paragraph(text, raw=True)
+            elif isinstance(node, ListBlock) and not node.raw:
+                items = [rewrite(index, i, it) for i, it in enumerate(node.items)]
+                if any(it is not None for it in items):
+                    escaped = tuple(
+                        latex_escape(it) if new is None else new for it, new in zip(node.items, items)
+                    )
+                    node = replace(node, items=escaped, raw=True)
+            nodes.append(node)
+        return AnnotatedDocument(Document(nodes=nodes), self, occurrences)
+
+    # --- 保存 ---
+
+    def fingerprint(self) -> str:
+        h = hashlib.sha256()
+        for entry in self.entries:
+            for surface in entry.surfaces:
+                h.update(surface.encode("utf-8"))
+                h.update(b"\0")
+            h.update(b"\1")
+        return h.hexdigest()
+
+    def save(self, path: Union[str, Path]) -> None:
+        """オートマトンごと保存する（信頼できる自分のキャッシュとしてのみ読むこと）"""
+        state = (
+            _FORMAT, self.fingerprint(), self.entries,
+            self._goto, self._fail, self._out, self._depth, self._term_at, self._edge_of_state,
+        )
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Glossary":
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state[0] != _FORMAT:
+            raise ValueError(f"{path}: unsupported glossary cache format {state[0]}")
+        self = cls.__new__(cls)
+        _, _, self.entries, self._goto, self._fail, self._out, self._depth, self._term_at, self._edge_of_state = state
+        self._compile_skip()
+        return self
+
+    @classmethod
+    def cached(cls, entries: Iterable[Union[GlossaryEntry, str]], path: Union[str, Path]) -> "Glossary":
+        """path に同じ用語集のオートマトンがあれば読み込み、無ければ作って保存する"""
+        entries = list(entries)
+        path = Path(path)
+        if path.exists():
+            try:
+                glossary = cls.load(path)
+            except Exception:   # 壊れた・古いキャッシュは作り直す
+                glossary = None
+            if glossary is not None and glossary.entries == [
+                e if isinstance(e, GlossaryEntry) else GlossaryEntry(e) for e in entries
+            ]:
+                return glossary
+        glossary = cls(entries)
+        glossary.save(path)
+        return glossary
+
+
+@dataclass
+class AnnotatedDocument:
+    document: Document                 # 強調と \\label を入れた文書
+    glossary: Glossary
+    occurrences: List[Occurrence] = field(default_factory=list)
+
+    def back_index(self) -> Dict[int, List[Occurrence]]:
+        """用語の位置 → 出現の一覧（文書の順）"""
+        index: Dict[int, List[Occurrence]] = {}
+        for occ in self.occurrences:
+            index.setdefault(occ.entry, []).append(occ)
+        return index
+
+    def index_node(self, *, title: Optional[str] = "用語索引", sort: bool = False) -> Terms:
+        """
+        用語 → 出現したページの索引（description 環境の Terms）。ページは \\pageref なので2回目のコンパイルで埋まる。
+        並びは用語集の順（sort=True なら見出し語の文字コード順）。
+        """
+        entries = self.back_index()
+        order: Sequence[int] = sorted(entries)
+        if sort:
+            order = sorted(order, key=lambda i: fold(self.glossary.entries[i].term))
+        lines = []
+        for i in order:
+            pages = ", ".join(f"\\pageref{{{o.label}}}" for o in entries[i] if o.label)
+            if pages:
+                lines.append(f"  \\item[{latex_escape(self.glossary.entries[i].term)}] p.~{pages}")
+        # 項目の無い description 環境はエラーになる
+        content = "\\begin{description}\n" + "\n".join(lines) + "\n\\end{description}" if lines else ""
+        return Terms(content=content, title=title)
+
+
+_ITEM_KEY = re.compile(r"\\item\s*\[([^\]]+)\]")
+
+
+def _strip_braces(key: str) -> str:
+    return key.replace("{", "").replace("}", "").strip()
@@ -0,0 +1,165 @@
+"""
+CSV / JSON Lines / YAML から行を1つずつ読み、宣言的な列の対応表でノードに変換する。
+どのローダーもジェネレータなので、Document.extend（NodeArray と組み合わせる）や
+Document.streaming + LatexRenderer.render_to に渡せば、巨大な表でもメモリ使用量は一定。
+
+    terms = ColumnMapping(Terms, {"title": "用語", "content": "説明"}, defaults={"boxed": True})
+    doc.extend(read_csv("glossary.csv", terms))
+"""
+from __future__ import annotations
+import csv
+import json
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Union
+
+from .nodes import Node
+
+PathLike = Union[str, Path]
+Row = Mapping[str, Any]
+
+_TRUE = {"1", "true", "yes", "y", "on", "t"}
+_FALSE = {"0", "false", "no", "n", "off", "f", ""}
+
+
+@dataclass(frozen=True)
+class ColumnMapping:
+    """
+    1行 → 1ノードの対応表。
+    - node_type: 作るノードの型（Terms, ListBlock, Section, Paragraph など）
+    - columns: ノードのフィールド名 → 列名
+    - defaults: 列に無いフィールドの固定値（無ければノード側の既定値）
+    - separator: ListBlock.items のような複数値フィールドを1セルに入れるときの区切り
+    値は各フィールドの型に合わせて変換する（"true"/"1" → True、"3" → 3、空欄 → None）。
+    """
+    node_type: type
+    columns: Mapping[str, str] = field(default_factory=dict)
+    defaults: Mapping[str, Any] = field(default_factory=dict)
+    separator: str = "|"
+
+    def __post_init__(self) -> None:
+        names = {f.name for f in fields(self.node_type)}
+        unknown = (set(self.columns) | set(self.defaults)) - names
+        if unknown:
+            raise ValueError(f"{self.node_type.__name__} has no field(s): {', '.join(sorted(unknown))}")
+
+    def __call__(self, row: Row) -> Node:
+        kwargs: Dict[str, Any] = dict(self.defaults)
+        for f in fields(self.node_type):
+            column = self.columns.get(f.name)
+            if column is None:
+                continue
+            try:
+                value = row[column]
+            except KeyError:
+                raise ValueError(f"missing column {column!r}") from None
+            kwargs[f.name] = _convert(value, f, self.separator)
+        return self.node_type(**kwargs)
+
+
+def _convert(value: Any, f: Any, separator: str) -> Any:
+    # from __future__ annotations なのでフィールドの型は文字列（"bool", "str | None" など）
+    kind = str(f.type)
+    if value is None:
+        return None
+    if kind.startswith("Tuple"):
+        if isinstance(value, str):
+            return tuple(s.strip() for s in value.split(separator)) if value else ()
+        return tuple(str(v) for v in value)
+    if kind == "bool":
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if text in _TRUE:
+                return True
+            if text in _FALSE:
+                return False
+            raise ValueError(f"{f.name}: not a boolean: {value!r}")
+        return bool(value)
+    if kind == "int":
+        return int(value)
+    if value == "" and f.default is None:
+        return None  # CSV の空欄は省略可能なフィールドでは None
+    return value if isinstance(value, str) else str(value)
+
+
+Mapper = Union[ColumnMapping, Mapping[str, ColumnMapping]]
+
+
+def map_rows(rows: Iterable[Row], mapping: Mapper, *, kind_column: Optional[str] = None) -> Iterator[Node]:
+    """
+    行を順にノードへ変換するジェネレータ。
+    kind_column を指定すると、その列の値で mapping（辞書）から対応表を選ぶ
+    （例: type 列が "section" の行は Section、"terms" の行は Terms）。
+    変換できない行は何行目かを添えて ValueError にする。
+    """
+    if kind_column is None and not isinstance(mapping, ColumnMapping):
+        raise TypeError("kind_column is required when mapping is a dict of ColumnMapping")
+    for lineno, row in enumerate(rows, start=1):
+        try:
+            if kind_column is None:
+                yield mapping(row)  # type: ignore[operator]
+            else:
+                kind = row.get(kind_column)
+                try:
+                    m = mapping[kind] if not isinstance(mapping, ColumnMapping) else mapping
+                except KeyError:
+                    raise ValueError(f"unknown kind {kind!r}") from None
+                yield m(row)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"row {lineno}: {e}") from e
+
+
+def read_csv(
+    path: PathLike,
+    mapping: Mapper,
+    *,
+    kind_column: Optional[str] = None,
+    encoding: str = "utf-8-sig",  # Excel が付ける BOM を読み飛ばす
+    **csv_options: Any,
+) -> Iterator[Node]:
+    """CSV（1行目が見出し）を1行ずつノードにする"""
+    with open(path, newline="", encoding=encoding) as f:
+        yield from map_rows(csv.DictReader(f, **csv_options), mapping, kind_column=kind_column)
+
+
+def read_jsonl(
+    path: PathLike,
+    mapping: Mapper,
+    *,
+    kind_column: Optional[str] = None,
+    encoding: str = "utf-8",
+) -> Iterator[Node]:
+    """JSON Lines（1行に1オブジェクト、空行は無視）を1行ずつノードにする"""
+    with open(path, encoding=encoding) as f:
+        rows = (json.loads(line) for line in f if line.strip())
+        yield from map_rows(rows, mapping, kind_column=kind_column)
+
+
+def read_yaml(
+    path: PathLike,
+    mapping: Mapper,
+    *,
+    kind_column: Optional[str] = None,
+    encoding: str = "utf-8",
+) -> Iterator[Node]:
+    """
+    YAML を読みノードにする（PyYAML が必要）。
+    "---" で区切った複数ドキュメントは1つずつ読むので、大きなデータはこの形で書くとよい。
+    ドキュメントがリストならその要素を行として扱う（そのドキュメント分は一度に読み込まれる）。
+    """
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("read_yaml requires PyYAML (pip install pyyaml)") from None
+
+    def rows() -> Iterator[Row]:
+        with open(path, encoding=encoding) as f:
+            for document in yaml.safe_load_all(f):
+                if document is None:
+                    continue
+                if isinstance(document, list):
+                    yield from document
+                else:
+                    yield document
+
+    yield from map_rows(rows(), mapping, kind_column=kind_column)
@@ -0,0 +1,626 @@
+"""
+コンパイルせずにページの埋まり具合を見積もる（図の空き箱の高さや改ページの位置を決める用）。
+
+    estimator = LayoutEstimator.for_renderer(renderer)
+    estimate = estimator.estimate(doc)       # ページごとの使用量・はみ出しの警告
+    print(estimate.summary())
+    doc2, estimate2 = estimator.paginate(doc)  # 収まらない箱と、ページ末に残る見出しの前に PageBreak を入れる
+
+ページの寸法・文字の大きさ・行送りは出力される \\documentclass とプリアンブル（geometry, \\linespread,
+\\setlength）から求める（PageGeometry.from_renderer）。各ノードの高さは LatexRenderer の出力
+（tcolorbox の余白、見出しの大きさ、箇条書きの間隔）に合わせた近似で、文字幅は
+全角 1zw・半角 0.5em として行数を数える。実際の組版とは数行ずれることがあるので、
+ぎりぎりのページはコンパイルして確かめること。
+
+独自ノードの高さは register(型, 関数) で追加できる（未登録の型は高さ 0 として警告する）。
+"""
+from __future__ import annotations
+import math
+import re
+import warnings
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .document import Document
+from .nodes import FigureSpace, ListBlock, Node, PageBreak, Paragraph, Section, Terms, Title
+from .renderers.latex import LatexRenderer
+from .utils.length import LengthError, to_pt
+
+_MM = 72.27 / 25.4
+_IN = 72.27
+
+# 用紙（幅, 高さ）pt
+PAPER_SIZES: Dict[str, Tuple[float, float]] = {
+    "a4paper": (210 * _MM, 297 * _MM),
+    "a5paper": (148 * _MM, 210 * _MM),
+    "a3paper": (297 * _MM, 420 * _MM),
+    "b5paper": (176 * _MM, 250 * _MM),
+    "b5j": (182 * _MM, 257 * _MM),
+    "b4j": (257 * _MM, 364 * _MM),
+    "letterpaper": (8.5 * _IN, 11 * _IN),
+    "legalpaper": (8.5 * _IN, 14 * _IN),
+    "executivepaper": (7.25 * _IN, 10.5 * _IN),
+}
+
+# 標準クラス（article 等）の文字の大きさ → (行送り, 本文幅の上限, 段落の字下げ)
+_STANDARD_SIZES = {10.0: (12.0, 345.0, 15.0), 11.0: (13.6, 360.0, 17.0), 12.0: (14.5, 390.0, 18.0)}
+# \large \Large \LARGE の行送り（本文の行送りとの比。標準クラスの 10pt で 14/12, 18/12, 22/12）
+_LARGE, _LARGE2, _LARGE3 = 14 / 12, 18 / 12, 22 / 12
+# tcolorbox の既定（上下の内側余白 2mm、前後の間隔 4.1pt）
+_TCB_PAD = 2 * _MM
+_TCB_SKIP = 4.1
+
+OVERFLOW = "overflow"       # 1ページに収まらない（はみ出す）
+MOVED = "moved"             # 収まらない箱を次のページに送った（前のページに空きが残る）
+STRANDED = "stranded"       # 見出しがページ末に残り、本文が次のページから始まる
+UNKNOWN = "unknown"         # 高さを見積もれないノード
+
+_GEOMETRY = re.compile(r"\\(?:usepackage\s*\[(?P<opts>[^\]]*)\]\s*\{geometry\}|geometry\s*\{(?P<args>[^{}]*(?:\{[^{}]*\}[^{}]*)*)\})")
+_SETLENGTH = re.compile(r"\\setlength\s*\{?\\(parskip|parindent|baselineskip|textwidth|textheight)\}?\s*\{([^{}]*)\}")
+_DOCUMENTCLASS = re.compile(r"\\documentclass\s*(?:\[(?P<opts>[^\]]*)\])?\s*\{(?P<cls>[^{}]*)\}")
+_LINESPREAD = re.compile(r"\\linespread\s*\{([\d.]+)\}")
+_FONT_SIZE_OPTION = re.compile(r"(\d+(?:\.\d+)?)pt")
+_COMMAND = re.compile(r"\\[a-zA-Z@]+\*?|[{}$&~^_]")
+_ITEM = re.compile(r"\\item\b")
+
+
+@dataclass(frozen=True)
+class PageGeometry:
+    paper_width: float
+    paper_height: float
+    text_width: float
+    text_height: float
+    font_size: float = 10.0
+    baselineskip: float = 12.0
+    parskip: float = 0.0
+    parindent: float = 15.0
+    columns: int = 1
+    column_sep: float = 10.0
+
+    @property
+    def column_width(self) -> float:
+        return (self.text_width - (self.columns - 1) * self.column_sep) / self.columns
+
+    def env(self) -> Dict[str, float]:
+        """長さの式（\\linewidth など）を評価するための文脈"""
+        return {
+            "em": self.font_size,
+            "\\linewidth": self.column_width,
+            "\\columnwidth": self.column_width,
+            "\\hsize": self.column_width,
+            "\\textwidth": self.text_width,
+            "\\textheight": self.text_height,
+            "\\vsize": self.text_height,
+            "\\paperwidth": self.paper_width,
+            "\\paperheight": self.paper_height,
+            "\\baselineskip": self.baselineskip,
+            "\\parskip": self.parskip,
+            "\\parindent": self.parindent,
+            "\\topskip": self.font_size,
+            "\\columnsep": self.column_sep,
+            "\\fill": 0.0,
+        }
+
+    @classmethod
+    def from_renderer(cls, renderer: LatexRenderer) -> "PageGeometry":
+        """
+        実際に出力される文書の頭（\\documentclass[オプション]{クラス} とプリアンブル）からページの寸法を求める。
+        出力に現れない設定（今の LatexRenderer では docclass_options）は見ない。
+        """
+        head = renderer._document_head()
+        m = _DOCUMENTCLASS.search(head)
+        docclass = m.group("cls").strip() if m else renderer.docclass
+        options = [o.strip() for o in (m.group("opts") or "").split(",") if o.strip()] if m else []
+        japanese = re.match(r"(?:lt|bx|u)?js|ltj[ts]|j(?:article|report|book)|tarticle", docclass) is not None
+        paper = "a4paper" if japanese else "letterpaper"
+        font_size = 10.0
+        landscape = columns = False
+        for o in options:
+            if o in PAPER_SIZES or o in ("b5paper", "a4j", "b5j"):
+                paper = {"a4j": "a4paper"}.get(o, o)
+                if japanese and o == "b5paper":
+                    paper = "b5j"   # 和文クラスの B5 は JIS
+            elif o == "landscape":
+                landscape = True
+            elif o == "twocolumn":
+                columns = True
+            else:
+                m = _FONT_SIZE_OPTION.fullmatch(o)
+                if m:
+                    font_size = float(m.group(1))
+        width, height = PAPER_SIZES[paper]
+        if landscape:
+            width, height = height, width
+
+        if japanese:
+            # js 系クラスの近似：行送り 1.6 倍、本文幅は用紙幅の 76%、本文高さは行送りの整数倍
+            baselineskip = 1.6 * font_size
+            text_width = 0.76 * width
+            text_height = math.floor((0.83 * height - font_size) / baselineskip) * baselineskip + font_size
+            parindent = font_size
+        else:
+            baselineskip, width_cap, parindent = _STANDARD_SIZES.get(
+                font_size, (1.2 * font_size, 34.5 * font_size, 1.5 * font_size)
+            )
+            # size10.clo などと同じ計算（本文高さは行送りの整数倍 + \topskip）
+            text_width = min(width - 2 * _IN, width_cap) if not columns else width - 2 * _IN
+            lines = math.floor((height - 3.5 * _IN) / baselineskip)
+            text_height = lines * baselineskip + font_size
+
+        geometry = cls(
+            paper_width=width, paper_height=height, text_width=text_width, text_height=text_height,
+            font_size=font_size, baselineskip=baselineskip, parskip=0.0, parindent=parindent,
+            columns=2 if columns else 1,
+        )
+        return geometry._apply_preamble(head[m.end():] if m else head)
+
+    def _apply_preamble(self, preamble: str) -> "PageGeometry":
+        g = self
+        m = _LINESPREAD.search(preamble)
+        if m:
+            g = replace(g, baselineskip=g.baselineskip * float(m.group(1)))
+        for m in _GEOMETRY.finditer(preamble):
+            g = g._apply_geometry(_split_keyvals(m.group("opts") if m.group("opts") is not None else m.group("args")))
+        for m in _SETLENGTH.finditer(preamble):
+            name, value = m.groups()
+            try:
+                g = replace(g, **{_SETLENGTH_FIELDS[name]: to_pt(value, g.env())})
+            except LengthError as e:
+                _warn_option(f"\\{name}", value, e)
+        return g
+
+    def _apply_geometry(self, opts: Dict[str, str]) -> "PageGeometry":
+        """geometry パッケージのオプション（主なものだけ）を反映する"""
+        width, height = self.paper_width, self.paper_height
+        for key in opts:
+            if key in PAPER_SIZES:
+                width, height = PAPER_SIZES[key]
+        if "paper" in opts and opts["paper"] in PAPER_SIZES:
+            width, height = PAPER_SIZES[opts["paper"]]
+        if "landscape" in opts:
+            width, height = max(width, height), min(width, height)
+        g = replace(self, paper_width=width, paper_height=height)
+        env = g.env()
+
+        # 読めない値（未知の長さ変数など）は指定が無いものとして扱い、警告だけ出す
+        def parse(key: str, value: str) -> Optional[float]:
+            try:
+                return to_pt(value, env)
+            except LengthError as e:
+                _warn_option(key, value, e)
+                return None
+
+        def length(key: str) -> Optional[float]:
+            value = opts.get(key)
+            return None if value is None else parse(key, value)
+
+        def pair(key: str) -> Tuple[Optional[float], Optional[float]]:
+            value = opts.get(key)
+            if value is None:
+                return None, None
+            parts = _split_pair(value)
+            first = parse(key, parts[0])
+            return first, parse(key, parts[1]) if len(parts) > 1 else first
+
+        def number(key: str) -> Optional[float]:
+            value = opts.get(key)
+            if value is None:
+                return None
+            try:
+                return float(value.strip().strip("{}"))
+            except ValueError as e:
+                _warn_option(key, value, e)
+                return None
+
+        margin = length("margin")
+        hmargin = pair("hmargin")
+        vmargin = pair("vmargin")
+        left = _first(length("left"), length("inner"), length("lmargin"), hmargin[0], margin)
+        right = _first(length("right"), length("outer"), length("rmargin"), hmargin[1], margin)
+        top = _first(length("top"), length("tmargin"), vmargin[0], margin)
+        bottom = _first(length("bottom"), length("bmargin"), vmargin[1], margin)
+        text = pair("text") if "text" in opts else pair("body")
+
+        text_width = _first(length("textwidth"), length("width"), text[0])
+        if text_width is None:
+            if left is not None or right is not None:
+                text_width = width - (left if left is not None else right) - (right if right is not None else left)
+            elif _first(number("hscale"), number("scale")) is not None:
+                text_width = width * _first(number("hscale"), number("scale"))
+            else:
+                text_width = g.text_width if not _PAPER_ONLY.issuperset(opts) else width * 0.7
+        text_height = _first(length("textheight"), length("height"), text[1])
+        lines = number("lines")
+        if text_height is None and lines is not None:
+            text_height = (int(lines) - 1) * g.baselineskip + g.font_size
+        if text_height is None:
+            if top is not None or bottom is not None:
+                text_height = height - (top if top is not None else bottom) - (bottom if bottom is not None else top)
+            elif _first(number("vscale"), number("scale")) is not None:
+                text_height = height * _first(number("vscale"), number("scale"))
+            else:
+                text_height = g.text_height if not _PAPER_ONLY.issuperset(opts) else height * 0.7
+        return replace(g, text_width=text_width, text_height=text_height)
+
+
+_SETLENGTH_FIELDS = {
+    "parskip": "parskip", "parindent": "parindent", "baselineskip": "baselineskip",
+    "textwidth": "text_width", "textheight": "text_height",
+}
+# これだけなら geometry の既定（scale=0.7）になるオプション
+_PAPER_ONLY = frozenset(PAPER_SIZES) | {"paper", "landscape", "portrait", "includehead", "includefoot", "showframe"}
+
+
+def _warn_option(key: str, value: str, error: Exception) -> None:
+    warnings.warn(f"cannot read {key}={value} for the layout estimate ({error}); ignored", stacklevel=4)
+
+
+def _first(*values: Optional[float]) -> Optional[float]:
+    for v in values:
+        if v is not None:
+            return v
+    return None
+
+
+def _split_keyvals(text: str) -> Dict[str, str]:
+    opts: Dict[str, str] = {}
+    depth = 0
+    part: List[str] = []
+    for ch in text + ",":
+        if ch == "," and depth == 0:
+            key, _, value = "".join(part).partition("=")
+            if key.strip():
+                opts[key.strip()] = value.strip()
+            part = []
+            continue
+        depth += (ch == "{") - (ch == "}")
+        part.append(ch)
+    return opts
+
+
+def _split_pair(value: str) -> List[str]:
+    return [v.strip() for v in value.strip().strip("{}").split(",")]
+
+
+@dataclass(frozen=True)
+class Block:
+    """ノード1つ分の縦の大きさ"""
+    height: float
+    breakable: bool = False      # 行の途中でページを分けられる（段落・枠なしの箇条書き）
+    line: float = 0.0            # 分けるときの1行の高さ
+    keep_with_next: bool = False  # 次のノードと同じページに置きたい（見出し）
+
+
+@dataclass(frozen=True)
+class Placement:
+    node: int
+    first_page: int      # 1 始まり
+    last_page: int
+    top: float           # 最初のページで置かれた位置（本文の上端から pt）
+    height: float
+
+
+@dataclass(frozen=True)
+class PageFill:
+    page: int
+    used: float
+    capacity: float      # 本文の高さ（段組ならその段数倍）
+    nodes: Tuple[int, ...]
+
+    @property
+    def ratio(self) -> float:
+        return self.used / self.capacity if self.capacity else 0.0
+
+
+@dataclass(frozen=True)
+class LayoutWarning:
+    node: int
+    page: int
+    kind: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"page {self.page}, node {self.node}: {self.message}"
+
+
+@dataclass
+class LayoutEstimate:
+    geometry: PageGeometry
+    pages: List[PageFill] = field(default_factory=list)
+    placements: List[Placement] = field(default_factory=list)
+    warnings: List[LayoutWarning] = field(default_factory=list)
+    breaks: List[int] = field(default_factory=list)   # paginate が PageBreak を入れた位置（元の doc.nodes の添字）
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    def summary(self, width: int = 30) -> str:
+        """ページごとの埋まり具合と警告の一覧（端末表示用）"""
+        lines = []
+        for p in self.pages:
+            filled = min(width, round(p.ratio * width))
+            bar = "#" * filled + "." * (width - filled)
+            over = " OVERFULL" if p.used > p.capacity + 0.5 else ""
+            lines.append(f"page {p.page:4d} [{bar}] {p.ratio:6.1%}  {p.used:7.1f}/{p.capacity:.1f}pt{over}")
+        lines.extend(f"warning: {w}" for w in self.warnings)
+        return "\n".join(lines)
+
+
+Estimator = Callable[[Node], Block]
+
+
+class LayoutEstimator:
+    """
+    PageGeometry と LatexRenderer の見た目の設定から、ノードの高さとページへの割り付けを見積もる。
+    同じ値のノード（frozen なもの）の高さは一度だけ計算する。
+    """
+
+    def __init__(self, geometry: PageGeometry, renderer: Optional[LatexRenderer] = None) -> None:
+        self.geometry = geometry
+        self.renderer = renderer if renderer is not None else LatexRenderer()
+        self._env = geometry.env()
+        self._estimators: Dict[type, Estimator] = {
+            Title: self._title,
+            Section: self._section,
+            Paragraph: self._paragraph,
+            Terms: self._terms,
+            FigureSpace: self._figure_space,
+            ListBlock: self._listblock,
+        }
+        self._lengths: Dict[str, float] = {}
+        self._blocks: Dict[Node, Block] = {}
+        self._warned: Dict[type, bool] = {}
+
+    @classmethod
+    def for_renderer(cls, renderer: LatexRenderer) -> "LayoutEstimator":
+        return cls(PageGeometry.from_renderer(renderer), renderer)
+
+    def register(self, node_type: type, estimator: Estimator) -> None:
+        """独自ノードの高さの見積もりを登録する"""
+        self._estimators[node_type] = estimator
+        self._blocks.clear()
+
+    # --- 割り付け ---
+
+    def estimate(self, doc: Document) -> LayoutEstimate:
+        return self._layout(list(doc.nodes), insert_breaks=False)[1]
+
+    def paginate(self, doc: Document, *, keep_headings: bool = True) -> Tuple[Document, LayoutEstimate]:
+        """
+        収まらない箱（tcolorbox・図の空き箱）の前と、keep_headings なら本文と離れてページ末に
+        残る見出しの前に PageBreak を入れた新しい Document を返す。既存の PageBreak はそのまま。
+        """
+        nodes, estimate = self._layout(list(doc.nodes), insert_breaks=True, keep_headings=keep_headings)
+        return Document(nodes=nodes), estimate
+
+    def _layout(
+        self, nodes: List[Node], *, insert_breaks: bool, keep_headings: bool = True,
+    ) -> Tuple[List[Node], LayoutEstimate]:
+        g = self.geometry
+        capacity = g.text_height
+        estimate = LayoutEstimate(geometry=g)
+        out: List[Node] = []
+        blocks = [None if isinstance(n, PageBreak) else self.block(n) for n in nodes]
+        frame = 0          # 段（1段組ならページ）の通し番号
+        used = 0.0
+        members: List[int] = []
+        fills: Dict[int, float] = {}
+
+        def page_of(f: int) -> int:
+            return f // g.columns + 1
+
+        def close_frame(new_page: bool) -> None:
+            nonlocal frame, used, members
+            fills[frame] = used
+            page = page_of(frame)
+            if new_page:
+                frame = (page_of(frame)) * g.columns   # 次のページの最初の段
+            else:
+                frame += 1
+            if page_of(frame) != page:
+                self._finish_page(estimate, page, fills, members, g)
+                members = []
+            used = 0.0
+
+        def warn(index: int, kind: str, message: str) -> None:
+            estimate.warnings.append(LayoutWarning(index, page_of(frame), kind, message))
+
+        for index, (node, blk) in enumerate(zip(nodes, blocks)):
+            if blk is None:   # PageBreak（\clearpage は段組でも次のページへ）
+                out.append(node)
+                if used or members:
+                    close_frame(new_page=True)
+                continue
+            remaining = capacity - used
+            need = blk.height
+            if keep_headings and blk.keep_with_next:
+                nxt = _next_block(blocks, index)
+                if nxt is not None:
+                    need += nxt.line if nxt.breakable and nxt.line else nxt.height
+            if need > remaining + 0.01 and used > 0 and (not blk.breakable or blk.keep_with_next):
+                if blk.keep_with_next and blk.height <= remaining:
+                    warn(index, STRANDED, "heading would be left at the bottom of the page")
+                else:
+                    warn(index, MOVED, f"does not fit in the remaining {remaining:.1f}pt; moved to the next "
+                                       f"{'column' if g.columns > 1 else 'page'}")
+                if insert_breaks and (frame + 1) % g.columns == 0:
+                    out.append(PageBreak())
+                    estimate.breaks.append(index)
+                close_frame(new_page=False)
+                remaining = capacity
+            out.append(node)
+            first_frame, top = frame, used
+            members.append(index)
+            height = blk.height
+            if height <= remaining + 0.01 or not blk.breakable:
+                if height > capacity + 0.01:
+                    warn(index, OVERFLOW, f"{height:.1f}pt is taller than the page ({capacity:.1f}pt)")
+                used += height
+            else:
+                # 行の単位で次の段・ページに送る
+                line = blk.line or g.baselineskip
+                left = height
+                while left > remaining + 0.01:
+                    fit = math.floor(remaining / line) * line
+                    left -= fit
+                    used += fit
+                    close_frame(new_page=False)
+                    members.append(index)
+                    remaining = capacity
+                used += left
+            estimate.placements.append(Placement(index, page_of(first_frame), page_of(frame), top, height))
+        fills[frame] = used
+        if members or not estimate.pages:
+            self._finish_page(estimate, page_of(frame), fills, members, g)
+        return out, estimate
+
+    @staticmethod
+    def _finish_page(estimate: LayoutEstimate, page: int, fills: Dict[int, float], members: List[int],
+                     g: PageGeometry) -> None:
+        first = (page - 1) * g.columns
+        used = sum(fills.get(f, 0.0) for f in range(first, first + g.columns))
+        nodes = tuple(dict.fromkeys(members))
+        estimate.pages.append(PageFill(page, used, g.text_height * g.columns, nodes))
+
+    # --- ノードの高さ ---
+
+    def block(self, node: Node) -> Block:
+        try:
+            cached = self._blocks.get(node)
+        except TypeError:   # ハッシュできないノード
+            return self._estimate_block(node)
+        if cached is None:
+            cached = self._estimate_block(node)
+            if not isinstance(node, Paragraph):   # 段落は値がほぼ重複しないので覚えない
+                self._blocks[node] = cached
+        return cached
+
+    def _estimate_block(self, node: Node) -> Block:
+        fn = self._estimators.get(type(node))
+        if fn is None:
+            for base in type(node).__mro__[1:]:
+                fn = self._estimators.get(base)
+                if fn is not None:
+                    break
+        if fn is None:
+            if not self._warned.get(type(node)):
+                self._warned[type(node)] = True
+                warnings.warn(f"no layout estimate for {type(node).__name__}; counted as 0pt", stacklevel=3)
+            return Block(0.0)
+        return fn(node)
+
+    def length(self, text: str, default: float = 0.0) -> float:
+        value = self._lengths.get(text)
+        if value is None:
+            try:
+                value = to_pt(text, self._env)
+            except LengthError:
+                value = default
+            self._lengths[text] = value
+        return value
+
+    def text_lines(self, text: str, width: float, size: float = 1.0, *, indent: float = 0.0) -> int:
+        """text を幅 width に組んだときの行数（全角 1zw・半角 0.5em の近似）"""
+        if not text:
+            return 0
+        em = self.geometry.font_size * size
+        n = len(text)
+        if text.isascii():
+            natural = n * 0.5 * em
+        else:
+            wide = (len(text.encode("utf-8")) - n) // 2   # 3 バイトの文字（かな・漢字）を全角とみなす
+            natural = wide * em + (n - wide) * 0.5 * em
+        return max(1, math.ceil((natural + indent) / max(width, em)))
+
+    def _raw_lines(self, text: str, width: float, size: float = 1.0) -> int:
+        # LaTeX のソース：命令を除いた文字で数え、空行と \\ を改行とみなす
+        lines = 0
+        for para in re.split(r"\n\s*\n|\\\\(?:\[[^\]]*\])?|\\par\b", text):
+            visible = _COMMAND.sub("", para).strip()
+            if visible:
+                lines += self.text_lines(visible, width, size)
+        return lines
+
+    def _title(self, t: Title) -> Block:
+        g = self.geometry
+        inner = g.column_width - 2 * (4 * _MM + 6.0 + 0.4) - 3.0
+        count = self._raw_lines if t.raw else self.text_lines
+        lines = count(t.title, inner, 1.728) or 1
+        height = lines * g.baselineskip * _LARGE3
+        if t.subtitle:
+            height += count(t.subtitle, inner) * g.baselineskip
+        return Block(2 * _TCB_SKIP + 2 * 0.4 + 2 * _TCB_PAD + 2 * 6.0 + height)
+
+    def _section(self, s: Section) -> Block:
+        g = self.geometry
+        lines = (self._raw_lines if s.raw else self.text_lines)(s.title, g.column_width, 1.44) or 1
+        height = (
+            self.length(s.margin_before) + 10.0 + 2.0 + 0.9
+            + lines * g.baselineskip * _LARGE2 + self.length(s.margin_after)
+        )
+        return Block(height, keep_with_next=True)
+
+    def _paragraph(self, p: Paragraph) -> Block:
+        g = self.geometry
+        if p.raw:
+            lines = self._raw_lines(p.text, g.column_width)
+        else:
+            lines = self.text_lines(p.text, g.column_width, indent=g.parindent)
+        if not lines:
+            return Block(0.0)
+        return Block(lines * g.baselineskip + g.parskip, breakable=True, line=g.baselineskip)
+
+    def _box(self, content: float, *, rule: str, sep: str, before: float = _TCB_SKIP, after: float = _TCB_SKIP) -> float:
+        return before + after + 2 * self.length(rule, 0.4) + 2 * self.length(sep, 6.0) + 2 * _TCB_PAD + content
+
+    def _box_inner_width(self, rule: str, sep: str) -> float:
+        return self.geometry.column_width - 2 * (4 * _MM + self.length(sep, 6.0) + self.length(rule, 0.4))
+
+    def _terms(self, ts: Terms) -> Block:
+        g, r = self.geometry, self.renderer
+        inner = self._box_inner_width(r.terms_box_rule, r.terms_box_sep)
+        items = _ITEM.split(ts.content)
+        lines = sum(max(1, self._raw_lines(chunk, inner - 1.5 * g.font_size)) for chunk in items[1:])
+        lines += self._raw_lines(items[0], inner)
+        content = lines * g.baselineskip + (2 * 4.0 if len(items) > 1 else 0.0)   # description の上下 \topsep
+        if ts.title:
+            content += g.baselineskip * _LARGE + 2 * _TCB_PAD
+        height = self._box(
+            content, rule=r.terms_box_rule, sep=r.terms_box_sep,
+            before=self.length(r.terms_box_before_skip), after=self.length(r.terms_box_after_skip),
+        )
+        return Block(height)
+
+    def _figure_space(self, fs: FigureSpace) -> Block:
+        height = self.length(fs.margin_top) + self.length(fs.height, 50.0) + self.length(fs.margin_bottom)
+        return Block(height + self.geometry.parskip)
+
+    def _listblock(self, lb: ListBlock) -> Block:
+        g = self.geometry
+        width = g.column_width - 2.5 * g.font_size   # \leftmargini
+        if lb.boxed:
+            width -= 2 * (4 * _MM + 6.0 + 0.4)
+        count = self._raw_lines if lb.raw else self.text_lines
+        lines = sum(max(1, count(item, width)) for item in lb.items)
+        height = lines * g.baselineskip + 2.0 * max(0, len(lb.items) - 1) + 2 * 2.0   # \itemsep と \topsep
+        # 見出しの行は title が無くても出力される（その後の \\[-24pt] で詰める）
+        height += self.length(lb.margin_before) + g.baselineskip - 24.0
+        height += self.length(lb.margin_after)
+        if lb.boxed:
+            return Block(self._box(height, rule="0.4pt", sep="6pt"))
+        return Block(height, breakable=True, line=g.baselineskip)
+
+
+def _next_block(blocks: List[Optional[Block]], index: int) -> Optional[Block]:
+    for blk in blocks[index + 1:index + 8]:
+        if blk is None:
+            return None
+        if blk.height:
+            return blk
+    return None
+
+
+def estimate_layout(doc: Document, renderer: LatexRenderer) -> LayoutEstimate:
+    """LayoutEstimator.for_renderer(renderer).estimate(doc) の省略形"""
+    return LayoutEstimator.for_renderer(renderer).estimate(doc)
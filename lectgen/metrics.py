@@ -0,0 +1,196 @@
+"""
+描画・コンパイルの計測。
+
+- RenderMetrics: LatexRenderer(metrics=RenderMetrics()) で有効になる、ノード型ごとの
+  件数・描画時間・出力バイト数。metrics が None のときは計測用の処理を一切通らない。
+- BuildReport: build(..., metrics=True) の結果に付く、描画時間・コンパイル各回の時間と
+  エンジンの .log に出るメモリ・ページ数の統計。
+どちらも to_dict() で構造化データに、to_prometheus() で Prometheus のテキスト形式にできる。
+"""
+from __future__ import annotations
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# (メトリクス名, 値, ラベル)
+_Sample = Tuple[str, float, Dict[str, str]]
+
+
+@dataclass
+class NodeTypeStats:
+    count: int = 0
+    seconds: float = 0.0
+    bytes: int = 0   # UTF-8 での出力バイト数
+
+
+@dataclass
+class RenderMetrics:
+    """ノード型ごとの描画統計（複数回の render にまたがって積算する）"""
+    by_type: Dict[str, NodeTypeStats] = field(default_factory=dict)
+    documents: int = 0
+
+    def instrument(self, render_node: Callable[[object], str]) -> Callable[[object], str]:
+        """描画関数を計測付きで包む（LatexRenderer.iter_render が使う）"""
+        self.documents += 1
+        by_type = self.by_type
+        clock = time.perf_counter
+
+        def timed(n: object) -> str:
+            t0 = clock()
+            fragment = render_node(n)
+            elapsed = clock() - t0
+            name = type(n).__name__
+            stats = by_type.get(name)
+            if stats is None:
+                stats = by_type[name] = NodeTypeStats()
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.bytes += len(fragment.encode("utf-8"))
+            return fragment
+
+        return timed
+
+    @property
+    def nodes(self) -> int:
+        return sum(s.count for s in self.by_type.values())
+
+    @property
+    def seconds(self) -> float:
+        return sum(s.seconds for s in self.by_type.values())
+
+    @property
+    def bytes(self) -> int:
+        return sum(s.bytes for s in self.by_type.values())
+
+    def reset(self) -> None:
+        self.by_type.clear()
+        self.documents = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def samples(self) -> List[_Sample]:
+        out: List[_Sample] = [("render_documents_total", self.documents, {})]
+        # 同じメトリクスの行はまとめて並べる（Prometheus の形式上の決まり）
+        for metric, attr in (("render_nodes_total", "count"), ("render_seconds_total", "seconds"),
+                             ("render_bytes_total", "bytes")):
+            for name, s in sorted(self.by_type.items()):
+                out.append((metric, getattr(s, attr), {"node_type": name}))
+        return out
+
+    def to_prometheus(self, prefix: str = "lectgen") -> str:
+        return format_prometheus(self.samples(), prefix)
+
+
+@dataclass(frozen=True)
+class TexLogStats:
+    """エンジンの .log の末尾に出る統計（見つからない項目は None）"""
+    pages: Optional[int] = None
+    output_bytes: Optional[int] = None
+    strings_used: Optional[int] = None
+    strings_max: Optional[int] = None
+    node_memory_words: Optional[int] = None
+    token_memory_words: Optional[int] = None
+    control_sequences: Optional[int] = None
+    fonts: Optional[int] = None
+    font_bytes: Optional[int] = None
+    pdf_objects: Optional[int] = None
+
+
+_LOG_PATTERNS = {
+    "output": re.compile(r"Output written on .+? \((\d+) pages?, (\d+) bytes\)", re.S),
+    "strings": re.compile(r"^ ?(\d+) strings out of (\d+)", re.M),
+    "memory": re.compile(r"^ ?(\d+),(\d+) words of node,token memory allocated", re.M),
+    "cs": re.compile(r"^ ?(\d+) multiletter control sequences", re.M),
+    "fonts": re.compile(r"^ ?(\d+) fonts using (\d+) bytes", re.M),
+    "objects": re.compile(r"^PDF statistics: (\d+) PDF objects", re.M),
+}
+
+
+def parse_log_stats(log: str) -> TexLogStats:
+    """lualatex の .log の本文から統計を取り出す"""
+    found = {k: p.search(log) for k, p in _LOG_PATTERNS.items()}
+
+    def num(key: str, group: int) -> Optional[int]:
+        m = found[key]
+        return int(m.group(group)) if m else None
+
+    return TexLogStats(
+        pages=num("output", 1),
+        output_bytes=num("output", 2),
+        strings_used=num("strings", 1),
+        strings_max=num("strings", 2),
+        node_memory_words=num("memory", 1),
+        token_memory_words=num("memory", 2),
+        control_sequences=num("cs", 1),
+        fonts=num("fonts", 1),
+        font_bytes=num("fonts", 2),
+        pdf_objects=num("objects", 1),
+    )
+
+
+@dataclass(frozen=True)
+class CompilePass:
+    seconds: float
+    returncode: int
+
+
+@dataclass
+class BuildReport:
+    """1文書のビルドの計測結果"""
+    document: str
+    render_seconds: float = 0.0
+    passes: List[CompilePass] = field(default_factory=list)
+    log: Optional[TexLogStats] = None
+    skipped: bool = False   # 変更なしでコンパイルを省略した
+
+    @property
+    def compile_seconds(self) -> float:
+        return sum(p.seconds for p in self.passes)
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["compile_seconds"] = self.compile_seconds
+        return d
+
+    def samples(self) -> List[_Sample]:
+        doc = {"document": self.document}
+        out: List[_Sample] = [
+            ("build_render_seconds", self.render_seconds, doc),
+            ("build_compile_seconds", self.compile_seconds, doc),
+            ("build_passes", len(self.passes), doc),
+            ("build_skipped", int(self.skipped), doc),
+        ]
+        for i, p in enumerate(self.passes, start=1):
+            out.append(("build_pass_seconds", p.seconds, {**doc, "pass": str(i)}))
+        if self.log is not None:
+            for name, value in asdict(self.log).items():
+                if value is not None:
+                    out.append((f"tex_{name}", value, doc))
+        return out
+
+    def to_prometheus(self, prefix: str = "lectgen") -> str:
+        return format_prometheus(self.samples(), prefix)
+
+
+def format_prometheus(samples: Iterable[_Sample], prefix: str = "lectgen") -> str:
+    """(名前, 値, ラベル) の並びを Prometheus のテキスト形式にする"""
+    lines: List[str] = []
+    typed = set()
+    for name, value, labels in samples:
+        metric = f"{prefix}_{name}"
+        if metric not in typed:
+            typed.add(metric)
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {metric} {kind}")
+        if labels:
+            body = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+            lines.append(f"{metric}{{{body}}} {value}")
+        else:
+            lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
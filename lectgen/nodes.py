@@ -1,24 +1,39 @@
 # path: lectgen/nodes.py
 from __future__ import annotations
+import sys
 from dataclasses import dataclass
-from typing import Protocol, List
+from typing import Protocol, Tuple
 
 # 表示はレンダラに委譲（DIP）。Nodeはデータのみを持つ。
+# 大量のノードを持つ文書向けに __slots__ 付きで定義し、__dict__ を持たせない。
 class Node(Protocol):
     pass
 
-@dataclass(frozen=True)
+_intern = sys.intern
+
+
+def _intern_fields(node, names: Tuple[str, ...]) -> None:
+    """
+    長さ・スタイル指定の文字列（"0pt" "6pt" など）を intern し、同じ値を共有させる。
+    ローダー経由で作ったノードは値が同じでも別々の文字列オブジェクトを持つため。
+    """
+    for name in names:
+        value = getattr(node, name)
+        if type(value) is str:
+            object.__setattr__(node, name, _intern(value))
+
+@dataclass(frozen=True, slots=True)
 class PageBreak:
     """ページを明示的に改ページするためのノード"""
     pass
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Title:
     title: str
     subtitle: str | None = None
     raw: bool = False  # TrueならそのままLaTeXに流す
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Section:
     """セクション見出し"""
     title: str
@@ -26,25 +41,32 @@ class Section:
     margin_before: str = "6pt"  # 追加：見出しの前の余白
     margin_after: str = "2pt"   # 追加：見出しの後の余白
 
-@dataclass(frozen=True)
+    def __post_init__(self) -> None:
+        _intern_fields(self, ("margin_before", "margin_after"))
+
+@dataclass(frozen=True, slots=True)
 class Paragraph:
     text: str
     raw: bool = False
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TermItem:
     term: str
     definition: str
     raw_key: bool = False
     raw_value: bool = True
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Terms:
     content: str
     title: str | None = None
     boxed: bool = False
     
-@dataclass(frozen=True)
+_FIGURE_SPACE_LENGTHS = (
+    "height", "margin_top", "margin_bottom", "margin_left", "margin_right", "gap", "arc", "rule",
+)
+
+@dataclass(frozen=True, slots=True)
 class FigureSpace:
     """
     PDF化後に図を貼るための“空き箱”を並べるためのノード。
@@ -60,21 +82,30 @@ class FigureSpace:
     gap: str = "6pt"          # ボックス間ギャップ（横）
     arc: str = "4pt"          # 角丸
     rule: str = "0.4pt"       # 枠線の太さ
+
+    def __post_init__(self) -> None:
+        _intern_fields(self, _FIGURE_SPACE_LENGTHS)
     
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ListBlock:
     """
     箇条書きリスト。
-    - items: 箇条書き項目（文字列のリスト）
+    - items: 箇条書き項目（リストを渡してもタプルとして保持し、ハッシュ可能にする）
     - title: 見出し（任意）
     - style: 'itemize' または 'enumerate'
     - boxed: 枠で囲むかどうか
+    - raw: True なら項目をエスケープせずそのまま LaTeX に流す
     """
-    items: List[str]
+    items: Tuple[str, ...]
     title: str | None = None
     title_marker: str = "●"
     style: str = "itemize"
     boxed: bool = False
     margin_before: str = "6pt"  # タイトルの上余白
     margin_after: str = "6pt"   # 箇条書き全体の下余白
-    
+    raw: bool = False
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.items, tuple):
+            object.__setattr__(self, "items", tuple(self.items))
+        _intern_fields(self, ("title_marker", "style", "margin_before", "margin_after"))
@@ -0,0 +1,69 @@
+"""
+PDF の結合・分割（シャード分割コンパイルや一括コンパイルの後処理用）。
+pypdf があればそれを使い、無ければ qpdf コマンドを使う。どちらも無ければ RuntimeError。
+"""
+from __future__ import annotations
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Iterable, Sequence, Tuple, Union
+
+PathLike = Union[str, Path]
+
+
+def _pypdf():
+    try:
+        import pypdf
+    except ImportError:
+        return None
+    return pypdf
+
+
+def _qpdf() -> str:
+    exe = shutil.which("qpdf")
+    if exe is None:
+        raise RuntimeError("PDF merge/split requires pypdf (pip install pypdf) or the qpdf command")
+    return exe
+
+
+def page_count(path: PathLike) -> int:
+    pypdf = _pypdf()
+    if pypdf is not None:
+        return len(pypdf.PdfReader(str(path)).pages)
+    out = subprocess.run([_qpdf(), "--show-npages", str(path)], capture_output=True, text=True, check=True)
+    return int(out.stdout.strip())
+
+
+def merge_pdfs(paths: Iterable[PathLike], out: PathLike) -> None:
+    """paths の PDF を順に連結して out に書く"""
+    paths = [str(p) for p in paths]
+    pypdf = _pypdf()
+    if pypdf is not None:
+        writer = pypdf.PdfWriter()
+        for p in paths:
+            writer.append(p)
+        with open(out, "wb") as f:
+            writer.write(f)
+        return
+    subprocess.run([_qpdf(), "--empty", "--pages", *paths, "--", str(out)], check=True)
+
+
+def split_pdf(path: PathLike, ranges: Sequence[Tuple[int, int]], outs: Sequence[PathLike]) -> None:
+    """
+    ranges[i] = (先頭ページ, 末尾ページ)（1 始まり・両端を含む）のページを outs[i] に書き出す。
+    """
+    if len(ranges) != len(outs):
+        raise ValueError("ranges and outs must have the same length")
+    pypdf = _pypdf()
+    if pypdf is not None:
+        reader = pypdf.PdfReader(str(path))
+        for (first, last), out in zip(ranges, outs):
+            writer = pypdf.PdfWriter()
+            for i in range(first - 1, last):
+                writer.add_page(reader.pages[i])
+            with open(out, "wb") as f:
+                writer.write(f)
+        return
+    exe = _qpdf()
+    for (first, last), out in zip(ranges, outs):
+        subprocess.run([exe, "--empty", "--pages", str(path), f"{first}-{last}", "--", str(out)], check=True)
@@ -1,9 +1,72 @@
 # path: lectgen/renderers/base.py
 from __future__ import annotations
-from typing import Protocol
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Protocol
 from ..document import Document
 
+# ノードを受け取り出力の断片を返す描画関数
+NodeHandler = Callable[[object], str]
+
 class Renderer(Protocol):
     def render(self, doc: Document) -> str:
         """ドキュメント全体を文字列にレンダリング"""
-        ...
\ No newline at end of file
+        ...
+
+
+@dataclass
+class NodeDispatch:
+    """
+    ノード型 → 描画関数 の表（各レンダラで共通）。
+    register で追加し、未登録の型は MRO をたどって親クラスの描画関数を使う。
+    """
+    # 登録された描画関数と、サブクラスも含めた解決済みテーブル
+    _handlers: Dict[type, NodeHandler] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _dispatch: Dict[type, NodeHandler] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def _set_handlers(self, handlers: Dict[type, NodeHandler]) -> None:
+        """組み込みの描画関数を登録する（__post_init__ から呼ぶ）"""
+        self._handlers.update(handlers)
+        self._dispatch = dict(self._handlers)
+
+    def register(self, node_type: type, handler: NodeHandler | None = None, **options):
+        """
+        ノード型とその描画関数を登録する（独自ノードの追加用）。デコレータとしても使える。
+        options はレンダラごとの追加の指定で、_registered に渡る。
+        """
+        if handler is None:
+            def decorator(fn: NodeHandler) -> NodeHandler:
+                self.register(node_type, fn, **options)
+                return fn
+            return decorator
+        # 先に呼んで、知らないオプションなら何も登録せずに TypeError にする
+        self._registered(node_type, **options)
+        self._handlers[node_type] = handler
+        # サブクラスの解決結果は登録内容に依存するので作り直す
+        self._dispatch = dict(self._handlers)
+        return handler
+
+    def _registered(self, node_type: type, **options) -> None:
+        """
+        register の際の処理（オプションの反映やキャッシュの破棄。サブクラスで上書きし、
+        自分で扱わないオプションは super() に渡す）。ここまで残ったオプションは TypeError にする。
+        """
+        if options:
+            raise TypeError(
+                f"{type(self).__name__}.register() got unexpected option(s): {', '.join(sorted(options))}"
+            )
+
+    def _render_node(self, n) -> str:
+        try:
+            handler = self._dispatch[type(n)]
+        except KeyError:
+            handler = self._resolve_handler(type(n))
+        return handler(n)
+
+    def _resolve_handler(self, node_type: type) -> NodeHandler:
+        # 未登録の型は MRO をたどって親クラスの描画関数を探し、結果をキャッシュ
+        for base in node_type.__mro__[1:]:
+            handler = self._handlers.get(base)
+            if handler is not None:
+                self._dispatch[node_type] = handler
+                return handler
+        raise TypeError(f"Unsupported node: {node_type.__name__}")
@@ -0,0 +1,191 @@
+"""
+HTML のプレビュー用レンダラ。TeX なしで LaTeX 版に似た見た目をすぐに確認するためのもの。
+
+- Title / Section は見出し、Terms と boxed の ListBlock は枠付きのカード
+- FigureSpace は指定の高さ・間隔で横に並ぶ空き箱（flex）
+- PageBreak はページの区切り（ページごとに紙面風の枠で囲む）
+raw=True の文字列や Terms の本文は LaTeX のソースなので、そのまま（エスケープして）表示する。
+"""
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from html import escape
+from typing import Iterator, TextIO
+
+from .base import NodeDispatch, Renderer
+from ..document import Document
+from ..nodes import Title, Section, Paragraph, Terms, FigureSpace, ListBlock, PageBreak
+
+DEFAULT_CSS = """\
+body { margin: 0; background: #e8e8e8; font-family: "Hiragino Mincho ProN", "Yu Mincho", serif; }
+main { padding: 24px 0; }
+.page { box-sizing: border-box; width: 210mm; min-height: 297mm; margin: 0 auto 24px; padding: 25mm;
+        background: #fff; box-shadow: 0 1px 4px rgba(0,0,0,.3); }
+.title { border: 0.4pt solid #ccc; border-left: 3pt solid #6680cc; border-radius: 4pt; padding: 6pt 10pt; }
+.title h1 { margin: 0; font-size: 1.7em; }
+.title .subtitle { margin: 4pt 0 0; color: #999; font-size: 1em; }
+h2.section { display: inline-block; font-size: 1.4em; margin: 0; padding: 10pt 0 2pt;
+             border-bottom: 0.9pt solid #6680cc; }
+p { margin: 0 0 0.6em; line-height: 1.7; }
+.card { border: 0.4pt solid #000; border-radius: 5pt; overflow: hidden; }
+.card-title { background: #f0f3fb; padding: 4pt 6pt; font-weight: bold; font-size: 1.15em; }
+.card-body { padding: 6pt; }
+.list-title { font-weight: bold; margin: 0 0 2pt; }
+ul, ol { margin: 2pt 0; padding-left: 1.6em; }
+li { margin: 2pt 0; }
+.figure-space { display: flex; }
+.figure-box { flex: 1; box-sizing: border-box; border: 0.4pt solid #000; }
+.raw { font-family: monospace; white-space: pre-wrap; color: #555; }
+"""
+
+# CSS でもそのまま使える TeX の長さ（pt は TeX と CSS でわずかに違うが、プレビューには十分）
+_CSS_LENGTH = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:pt|mm|cm|in|pc|em|ex)")
+_TEX_ONLY_UNITS = {"bp": "pt", "dd": "pt", "cc": "pc"}
+_TEX_LENGTH = re.compile(r"(-?(?:\d+\.?\d*|\.\d+))\s*(\w+)")
+
+
+@lru_cache(maxsize=256)
+def css_length(tex: str, default: str = "0") -> str:
+    """
+    TeX の長さを CSS の長さにする（"50pt" → "50pt"、"1bp" → "1pt" など）。
+    \\linewidth などを使った式は変換できないので default を返す。
+    """
+    tex = tex.strip()
+    if _CSS_LENGTH.fullmatch(tex):
+        return tex
+    m = _TEX_LENGTH.fullmatch(tex)
+    if m and m.group(2) in _TEX_ONLY_UNITS:
+        return m.group(1) + _TEX_ONLY_UNITS[m.group(2)]
+    return default
+
+
+def html_escape(text: str) -> str:
+    return escape(text, quote=False)
+
+
+@lru_cache(maxsize=256)
+def _figure_row(count: int, height: str, gap: str, rule: str, arc: str,
+                top: str, right: str, bottom: str, left: str) -> str:
+    box = (
+        f'<div class="figure-box" style="height:{css_length(height, "50pt")};'
+        f'border-width:{css_length(rule, "0.4pt")};border-radius:{css_length(arc)}"></div>'
+    )
+    return (
+        f'<div class="figure-space" style="gap:{css_length(gap)};margin:{css_length(top)} '
+        f'{css_length(right)} {css_length(bottom)} {css_length(left)}">'
+        + box * count
+        + "</div>\n"
+    )
+
+
+@lru_cache(maxsize=256)
+def _margins(before: str, after: str) -> str:
+    return f' style="margin-top:{css_length(before)};margin-bottom:{css_length(after)}"'
+
+
+@dataclass
+class HtmlRenderer(NodeDispatch, Renderer):
+    title: str = "lectgen preview"   # <title> に入れる文字列
+    lang: str = "ja"
+    css: str = DEFAULT_CSS
+    head_extra: str = ""             # <head> に追加する HTML（独自の CSS/JS 等）
+
+    # Terms の見た目（LatexRenderer の同名の設定に相当）
+    terms_title_marker: str = "●"
+    terms_box_before_skip: str = "20pt"
+    terms_box_after_skip: str = "6pt"
+
+    def __post_init__(self) -> None:
+        self._set_handlers({
+            Title: self._render_title,
+            Section: self._render_section,
+            Paragraph: self._render_paragraph,
+            Terms: self._render_terms,
+            FigureSpace: self._render_figure_space,
+            ListBlock: self._render_listblock,
+            PageBreak: self._render_pagebreak,
+        })
+
+    def render(self, doc: Document) -> str:
+        return "".join(self.iter_render(doc))
+
+    def iter_render(self, doc: Document) -> Iterator[str]:
+        """断片ごとに順に返すジェネレータ（連結すると render() と同一）"""
+        yield self._document_head()
+        render_node = self._render_node
+        for n in doc.nodes:
+            fragment = render_node(n)
+            if fragment:
+                yield fragment
+        yield self._document_tail()
+
+    def render_to(self, doc: Document, fp: TextIO) -> None:
+        """テキストストリーム（ファイル・HTTP レスポンス等）へ逐次書き出す"""
+        write = fp.write
+        for chunk in self.iter_render(doc):
+            write(chunk)
+
+    def _document_head(self) -> str:
+        return (
+            "<!DOCTYPE html>\n"
+            f'<html lang="{escape(self.lang)}">\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{html_escape(self.title)}</title>\n"
+            f"<style>\n{self.css}</style>\n{self.head_extra}</head>\n"
+            '<body>\n<main>\n<div class="page">\n'
+        )
+
+    def _document_tail(self) -> str:
+        return "</div>\n</main>\n</body>\n</html>\n"
+
+    @staticmethod
+    def _text(text: str, raw: bool) -> str:
+        # raw は LaTeX のソースなので、解釈せずにそれと分かる形で見せる
+        if raw:
+            return f'<span class="raw">{html_escape(text)}</span>'
+        return html_escape(text)
+
+    def _render_title(self, t: Title) -> str:
+        subtitle = f'<p class="subtitle">{self._text(t.subtitle, t.raw)}</p>' if t.subtitle else ""
+        return f'<header class="title"><h1>{self._text(t.title, t.raw)}</h1>{subtitle}</header>\n'
+
+    def _render_section(self, s: Section) -> str:
+        return (
+            f"<div{_margins(s.margin_before, s.margin_after)}>"
+            f'<h2 class="section">{self._text(s.title, s.raw)}</h2></div>\n'
+        )
+
+    def _render_paragraph(self, p: Paragraph) -> str:
+        return f"<p>{self._text(p.text, p.raw)}</p>\n"
+
+    def _render_terms(self, ts: Terms) -> str:
+        title = ""
+        if ts.title:
+            title = (
+                f'<div class="card-title">{html_escape(self.terms_title_marker)} '
+                f"{html_escape(ts.title)}</div>"
+            )
+        # 本文は LaTeX（description 環境など）のまま
+        body = f'<div class="card-body raw">{html_escape(ts.content)}</div>'
+        margins = _margins(self.terms_box_before_skip, self.terms_box_after_skip)
+        return f'<div class="card terms"{margins}>{title}{body}</div>\n'
+
+    def _render_figure_space(self, fs: FigureSpace) -> str:
+        return _figure_row(
+            max(1, int(fs.count)), fs.height, fs.gap, fs.rule, fs.arc,
+            fs.margin_top, fs.margin_right, fs.margin_bottom, fs.margin_left,
+        )
+
+    def _render_listblock(self, lb: ListBlock) -> str:
+        tag = "ol" if lb.style == "enumerate" else "ul"
+        heading = ""
+        if lb.title:
+            heading = f'<p class="list-title">{html_escape(lb.title_marker)} {html_escape(lb.title)}</p>'
+        items = "".join(f"<li>{self._text(it, lb.raw)}</li>" for it in lb.items)
+        content = f"{heading}<{tag}>{items}</{tag}>"
+        if lb.boxed:
+            content = f'<div class="card"><div class="card-body">{content}</div></div>'
+        return f"<div{_margins(lb.margin_before, lb.margin_after)}>{content}</div>\n"
+
+    def _render_pagebreak(self, _: PageBreak) -> str:
+        return '</div>\n<div class="page">\n'
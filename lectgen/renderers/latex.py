@@ -1,13 +1,126 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from typing import Iterator, Optional, Set, TextIO, Tuple
 
-from .base import Renderer
+from .base import NodeDispatch, NodeHandler, Renderer
+from .cache import FragmentCache
+from ..metrics import RenderMetrics
 from ..document import Document
 from ..nodes import Title, Section, Paragraph, Terms, TermItem, FigureSpace, ListBlock, PageBreak
-from ..utils.text import latex_escape
+from ..utils.text import latex_escape, latex_escape_cached, latex_escape_many
+
+# 断片の見た目に影響するレンダラ側の設定（断片キャッシュのキーに含める）
+_STYLE_FIELDS = (
+    "terms_title_marker",
+    "terms_title_bg",
+    "terms_title_fg",
+    "terms_box_arc",
+    "terms_box_rule",
+    "terms_box_sep",
+    "terms_box_before_skip",
+    "terms_box_after_skip",
+    "shared_styles",
+)
+_STYLE_FIELD_SET = frozenset(_STYLE_FIELDS)
+
+# --- ノードの内容によらない定型部分（モジュール読み込み時に一度だけ組み立てる） ---
+# tcolorbox で左帯＋角丸＋余白多め
+_TITLE_OPTIONS = (
+    "enhanced, sharp corners=southwest, arc=4pt, "
+    "colback=white, colframe=gray!30, boxrule=0.4pt, boxsep=6pt, "
+    "borderline west={3pt}{0pt}{blue!60}"
+)
+_TITLE_BEGIN = "\\begin{tcolorbox}[" + _TITLE_OPTIONS + "]\n{\\LARGE\\bfseries "
+_TITLE_END = "\n\\end{tcolorbox}\n"
+# tcbox はインライン箱。内容幅=タイトル幅になる
+_SECTION_OPTIONS = (
+    "enhanced, colback=white, colframe=white, "
+    "boxrule=0pt, left=0pt, right=0pt, top=10pt, bottom=2pt, "
+    "borderline south={0.9pt}{0pt}{blue!60}"
+)
+_SECTION_BOX = "\\noindent\\tcbox[" + _SECTION_OPTIONS + "]{\\Large\\bfseries "
+# ★ 角括弧を使わず、内部で余白を設定
+_LIST_SPACING = (
+    "\\setlength{\\topsep}{2pt}%\n"
+    "\\setlength{\\itemsep}{2pt}%\n"
+    "\\setlength{\\parsep}{0pt}%\n"
+    "\\setlength{\\partopsep}{0pt}%\n"
+)
+_LIST_BOX_OPTIONS = "enhanced, colback=white, colframe=black, boxrule=0.4pt, arc=4pt, boxsep=6pt"
+_LIST_BOX_BEGIN = "\\begin{tcolorbox}[" + _LIST_BOX_OPTIONS + "]\n"
+# 図の空き箱と tcbraster（{0} 以降は箱ごと・ノードごとの値）
+_FIGURE_BOX_OPTIONS = (
+    "enhanced, colback=white, colframe=black, "
+    "boxrule={0}, arc={1}, "
+    "boxsep=0pt, left=0pt, right=0pt, top=0pt, bottom=0pt, "
+    "height={2}"
+)
+_RASTER_OPTIONS = (
+    "raster columns={0}, "
+    "raster column skip={1}, "
+    "raster left skip=0pt, raster right skip=0pt, "
+    "raster before skip=0pt, raster after skip=0pt"
+)
+
+# shared_styles=True のときプリアンブルに一度だけ定義する tcolorbox のスタイル名。
+# 本文ではオプションを並べる代わりにこの名前で参照する（組版結果は同じ）
+_STYLE_TITLE = "lectgen title"
+_STYLE_SECTION = "lectgen section"
+_STYLE_LIST_BOX = "lectgen list"
+_STYLE_TERMS = "lectgen terms"
+_STYLE_TERMS_TITLE = "lectgen terms title"
+_STYLE_FIGURE_BOX = "lectgen figure"
+_STYLE_RASTER = "lectgen raster"
+_SHARED_TITLE_BEGIN = f"\\begin{{tcolorbox}}[{_STYLE_TITLE}]\n{{\\LARGE\\bfseries "
+_SHARED_SECTION_BOX = f"\\noindent\\tcbox[{_STYLE_SECTION}]{{\\Large\\bfseries "
+_SHARED_LIST_BOX_BEGIN = f"\\begin{{tcolorbox}}[{_STYLE_LIST_BOX}]\n"
+# ノードの値によらないスタイル（引数つきのものは #1 #2 … で値を受け取る）
+_SHARED_STYLES_FIXED = (
+    f"  {_STYLE_TITLE}/.style={{{_TITLE_OPTIONS}}},\n"
+    f"  {_STYLE_SECTION}/.style={{{_SECTION_OPTIONS}}},\n"
+    f"  {_STYLE_LIST_BOX}/.style={{{_LIST_BOX_OPTIONS}}},\n"
+    f"  {_STYLE_FIGURE_BOX}/.style n args={{3}}{{{_FIGURE_BOX_OPTIONS.format('#1', '#2', '#3')}}},\n"
+    f"  {_STYLE_RASTER}/.style 2 args={{{_RASTER_OPTIONS.format('#1', '#2')}}},\n"
+)
+
+
+@dataclass(frozen=True)
+class _StyleTemplates:
+    """レンダラの見た目の設定から組み立てた定型部分（設定を変えるまで使い回す）"""
+    terms_begin: str         # タイトルなし Terms の開始行
+    terms_title_begin: str   # タイトルあり Terms の開始（この後にタイトル文字列）
+    terms_title_end: str     # タイトルの後ろ（残りのオプションと開始行の終わり）
+    title_begin: str = _TITLE_BEGIN
+    section_box: str = _SECTION_BOX
+    list_box_begin: str = _LIST_BOX_BEGIN
+    styles: str = ""         # プリアンブルの後ろに足すスタイル定義（shared_styles のとき）
+
+
+@lru_cache(maxsize=256)
+def _figure_box(rule: str, arc: str, height: str) -> str:
+    # 中の空ボックス（枠あり・角丸・指定の高さ）
+    # boxsep=0pt, left/right/top/bottom=0pt で“純粋な空き領域”に近づける
+    return "\\begin{tcolorbox}[" + _FIGURE_BOX_OPTIONS.format(rule, arc, height) + "]\\end{tcolorbox}\n"
+
+
+@lru_cache(maxsize=256)
+def _shared_figure_box(rule: str, arc: str, height: str) -> str:
+    return f"\\begin{{tcolorbox}}[{_STYLE_FIGURE_BOX}={{{rule}}}{{{arc}}}{{{height}}}]\\end{{tcolorbox}}\n"
+
+
+@lru_cache(maxsize=256)
+def _raster_begin(cols: int, colskip: str) -> str:
+    # tcbraster（columns=cols, raster column skip = gap）
+    return "\\begin{tcbraster}[" + _RASTER_OPTIONS.format(cols, colskip) + "]\n"
+
+
+@lru_cache(maxsize=256)
+def _shared_raster_begin(cols: int, colskip: str) -> str:
+    return f"\\begin{{tcbraster}}[{_STYLE_RASTER}={{{cols}}}{{{colskip}}}]\n"
 
 @dataclass
-class LatexRenderer(Renderer):
+class LatexRenderer(NodeDispatch, Renderer):
     docclass: str = "article"
     docclass_options: str = ""
     preamble: str = r"\usepackage{amsmath, amssymb}\n"
@@ -26,63 +139,195 @@ class LatexRenderer(Renderer):
 
     # 既存の terms_box/terms_box_options があっても無視してOK（後方互換のため残してもよい）
 
+    # True なら tcolorbox のオプションをプリアンブルで名前つきスタイル（\tcbset）として一度だけ定義し、
+    # 本文では名前で参照する（.tex が小さくなり、TeX がオプションを読む回数も減る。組版結果は同じ）
+    shared_styles: bool = False
+
+    # 断片キャッシュ（0 なら無効）。同じノードを描画し直さず LRU で使い回す
+    fragment_cache_size: int = 0
+    fragment_cache: Optional[FragmentCache] = field(default=None, init=False, repr=False, compare=False)
+
+    # 計測（ノード型ごとの件数・時間・出力量）。None なら計測の処理は一切通らない
+    metrics: Optional[RenderMetrics] = field(default=None, repr=False, compare=False)
+
+    # キャッシュしてよいノード型（frozen で値として比較できるもの）
+    _cacheable: Set[type] = field(default_factory=set, init=False, repr=False, compare=False)
+    # 見た目の設定から組み立てた定型部分とキャッシュ用の指紋（設定を変えると作り直す）
+    _templates: Optional[_StyleTemplates] = field(default=None, init=False, repr=False, compare=False)
+    _fingerprint: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._set_handlers({
+            Title: self._render_title,
+            Section: self._render_section,
+            Paragraph: self._render_paragraph,
+            Terms: self._render_terms,
+            FigureSpace: self._render_figure_space,
+            ListBlock: self._render_listblock,
+            PageBreak: self._render_pagebreak,
+        })
+        self._cacheable.update((Title, Section, Terms, FigureSpace, ListBlock))
+        if self.fragment_cache_size > 0:
+            self.fragment_cache = FragmentCache(self.fragment_cache_size)
+
+    def __setattr__(self, name: str, value) -> None:
+        object.__setattr__(self, name, value)
+        if name in _STYLE_FIELD_SET:
+            object.__setattr__(self, "_templates", None)
+            object.__setattr__(self, "_fingerprint", None)
+
     def render(self, doc: Document) -> str:
-        body_parts: list[str] = []
+        return "".join(self.iter_render(doc))
+
+    def iter_render(self, doc: Document) -> Iterator[str]:
+        """
+        ドキュメントを断片ごとに順に返すジェネレータ。
+        プリアンブル → 各ノード → 終端 の順に yield し、連結すると render() と同一になる。
+        全体を一つの文字列に組み立てないので、巨大な文書でもメモリ使用量は一定。
+        """
+        yield self._document_head()
+        render_node = self._node_renderer()
+        first = True
         for n in doc.nodes:
-            body_parts.append(self._render_node(n))
-        body = "\n\n".join(bp for bp in body_parts if bp)
-        return self._wrap_document(body)
-
-    def _render_node(self, n) -> str:
-        if isinstance(n, Title):
-            return self._render_title(n)
-        if isinstance(n, Section):
-            return self._render_section(n)
-        if isinstance(n, Paragraph):
-            return self._render_paragraph(n)
-        if isinstance(n, Terms):
-            return self._render_terms(n)
-        if isinstance(n, FigureSpace):
-            return self._render_figure_space(n)
-        if isinstance(n, ListBlock):
-            return self._render_listblock(n)
-        if isinstance(n, PageBreak):                  # ★ 追加
-            return self._render_pagebreak(n)
-        raise TypeError(f"Unsupported node: {type(n).__name__}")
+            fragment = render_node(n)
+            if not fragment:
+                continue  # 空の断片は render() と同じく区切りごと飛ばす
+            if not first:
+                yield "\n\n"
+            first = False
+            yield fragment
+        yield self._document_tail()
+
+    def iter_render_indexed(self, doc: Document) -> Iterator[Tuple[Optional[int], str]]:
+        """
+        iter_render と同じ断片を (ノードの位置, 断片) の組で返す。
+        プリアンブル・区切り・終端の位置は None（.tex の行とノードの対応づけに使う）。
+        """
+        yield None, self._document_head()
+        render_node = self._node_renderer()
+        first = True
+        for i, n in enumerate(doc.nodes):
+            fragment = render_node(n)
+            if not fragment:
+                continue
+            if not first:
+                yield None, "\n\n"
+            first = False
+            yield i, fragment
+        yield None, self._document_tail()
+
+    def _node_renderer(self) -> NodeHandler:
+        if self.fragment_cache is None:
+            render_node = self._render_node
+        else:
+            render_node = partial(self._render_node_cached, self.fragment_cache, self._style_fingerprint())
+        if self.metrics is not None:
+            render_node = self.metrics.instrument(render_node)
+        return render_node
+
+    def render_to(self, doc: Document, fp: TextIO) -> None:
+        """テキストストリーム（ファイル等）へ逐次書き出す"""
+        write = fp.write
+        for chunk in self.iter_render(doc):
+            write(chunk)
+
+    def register(self, node_type: type, handler: NodeHandler | None = None, *, cacheable: bool = False):
+        """
+        ノード型とその描画関数を登録する（独自ノードの追加用）。
+        handler はノードを受け取り LaTeX 断片を返す。デコレータとしても使える:
+
+            @renderer.register(Question)
+            def render_question(q): ...
+
+        cacheable=True なら断片キャッシュの対象にする（ノードが frozen でハッシュ可能なこと）。
+        """
+        return super().register(node_type, handler, cacheable=cacheable)
+
+    def _registered(self, node_type: type, *, cacheable: bool = False, **options) -> None:
+        super()._registered(node_type, **options)
+        if cacheable:
+            self._cacheable.add(node_type)
+        else:
+            self._cacheable.discard(node_type)
+        if self.fragment_cache is not None:
+            self.fragment_cache.clear()  # 描画関数が変わったので古い断片は使えない
+
+    def _render_node_cached(self, cache: FragmentCache, style: tuple, n) -> str:
+        if type(n) not in self._cacheable:
+            return self._render_node(n)
+        key = (n, style)
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = self._render_node(n)
+            cache.put(key, fragment)
+        return fragment
+
+    def _style_fingerprint(self) -> tuple:
+        fp = self._fingerprint
+        if fp is None:
+            fp = self._fingerprint = tuple(getattr(self, name) for name in _STYLE_FIELDS)
+        return fp
+
+    def _style_templates(self) -> _StyleTemplates:
+        t = self._templates
+        if t is None:
+            t = self._templates = self._compile_templates()
+        return t
+
+    def _compile_templates(self) -> _StyleTemplates:
+        # --- tcolorbox で全体を出力 ---
+        # タイトルがあるときは title オプション付き、ないときは通常ボックス
+        options_common = (
+            f"enhanced, boxrule={self.terms_box_rule}, arc={self.terms_box_arc}, "
+            f"boxsep={self.terms_box_sep}, colback=white, colframe=black, "
+            f"before skip={self.terms_box_before_skip}, after skip={self.terms_box_after_skip}"
+        )
+        title_options = f"fonttitle=\\bfseries, coltitle={self.terms_title_fg}, colbacktitle={self.terms_title_bg}"
+        # 見出しだけ大きくするが、サイズは見出しの中だけに閉じ込める
+        title_open = "title={{\\large\\bfseries " + f"{latex_escape(self.terms_title_marker)}\\;"
+        if not self.shared_styles:
+            return _StyleTemplates(
+                terms_begin=f"\\begin{{tcolorbox}}[{options_common}]\n",
+                terms_title_begin=f"\\begin{{tcolorbox}}[{options_common}, {title_open}",
+                terms_title_end=f"}}}}, {title_options}]\n",
+            )
+        return _StyleTemplates(
+            terms_begin=f"\\begin{{tcolorbox}}[{_STYLE_TERMS}]\n",
+            terms_title_begin=f"\\begin{{tcolorbox}}[{_STYLE_TERMS}, {title_open}",
+            terms_title_end=f"}}}}, {_STYLE_TERMS_TITLE}]\n",
+            title_begin=_SHARED_TITLE_BEGIN,
+            section_box=_SHARED_SECTION_BOX,
+            list_box_begin=_SHARED_LIST_BOX_BEGIN,
+            styles=(
+                "\\tcbset{%\n"
+                + _SHARED_STYLES_FIXED
+                + f"  {_STYLE_TERMS}/.style={{{options_common}}},\n"
+                + f"  {_STYLE_TERMS_TITLE}/.style={{{title_options}}},\n"
+                + "}\n"
+            ),
+        )
 
     # path: lectgen/renderers/latex.py
     def _render_title(self, t: Title) -> str:
-        title = t.title if t.raw else latex_escape(t.title)
+        title = t.title if t.raw else latex_escape_cached(t.title)
         subtitle = ""
         if t.subtitle:
-            subtitle_text = t.subtitle if t.raw else latex_escape(t.subtitle)
+            subtitle_text = t.subtitle if t.raw else latex_escape_cached(t.subtitle)
             # サブタイトルは小さめ・灰色
             subtitle = f"\\\\{{\\normalsize\\color{{gray!60}} {subtitle_text}}}"
-        # tcolorbox で左帯＋角丸＋余白多め
-        return (
-            "\\begin{tcolorbox}[enhanced, sharp corners=southwest, arc=4pt, "
-            "colback=white, colframe=gray!30, boxrule=0.4pt, boxsep=6pt, "
-            "borderline west={3pt}{0pt}{blue!60}]\n"
-            f"{{\\LARGE\\bfseries {title}}}{subtitle}\n"
-            "\\end{tcolorbox}\n"
-        )
+        return self._style_templates().title_begin + title + "}" + subtitle + _TITLE_END
     
     def _render_pagebreak(self, _: PageBreak) -> str:
     # \newpage でも良いが、未処理の浮動体を流したい時は \clearpage が堅い
         return "\\clearpage\n"
  # path: lectgen/renderers/latex.py
     def _render_section(self, s: Section) -> str:
-        title = s.title if s.raw else latex_escape(s.title)
+        title = s.title if s.raw else latex_escape_cached(s.title)
         margin_before = getattr(s, "margin_before", "-4pt")
         margin_after = getattr(s, "margin_after", "-4pt")
         return (
             f"\\vspace*{{{margin_before}}}\n"
-            # tcbox はインライン箱。内容幅=タイトル幅になる
-            "\\noindent\\tcbox[enhanced, colback=white, colframe=white, "
-            "boxrule=0pt, left=0pt, right=0pt, top=10pt, bottom=2pt, "
-            "borderline south={0.9pt}{0pt}{blue!60}]{"
-            f"\\Large\\bfseries {title}"
-            "}%\n"
+            + self._style_templates().section_box + title + "}%\n"
             "\\par\n"
             f"\\vspace*{{{margin_after}}}\n"
         )
@@ -110,35 +355,15 @@ class LatexRenderer(Renderer):
             except Exception:
                 body = ""
 
-        # --- タイトル（目印付き）の作成 ---
-        title_opt = ""
+        # --- タイトル（目印付き）と開始行（定型部分は _style_templates で組み立て済み） ---
+        tpl = self._style_templates()
         if getattr(ts, "title", None):
-            title_text = ts.title if getattr(ts, "raw", False) else latex_escape(ts.title)  # type: ignore[arg-type]
-            # 見出しだけ大きくするが、サイズは見出しの中だけに閉じ込める
-            title_latex = (
-                "{\\large\\bfseries "
-                f"{latex_escape(self.terms_title_marker)}\\;{title_text}"
-                "}"
-            )
-            title_opt = f"title={{{title_latex}}}, fonttitle=\\bfseries, coltitle={self.terms_title_fg}, colbacktitle={self.terms_title_bg}"
-
-        # --- tcolorbox で全体を出力 ---
-        # タイトルがあるときは title オプション付き、ないときは通常ボックス
-        options_common = (
-            f"enhanced, boxrule={self.terms_box_rule}, arc={self.terms_box_arc}, "
-            f"boxsep={self.terms_box_sep}, colback=white, colframe=black, "
-            f"before skip={self.terms_box_before_skip}, after skip={self.terms_box_after_skip}"
-        )
-        if title_opt:
-            options = options_common + (", " + title_opt if title_opt else "")
+            title_text = ts.title if getattr(ts, "raw", False) else latex_escape_cached(ts.title)  # type: ignore[arg-type]
+            begin = tpl.terms_title_begin + title_text + tpl.terms_title_end
         else:
-            options = options_common
+            begin = tpl.terms_begin
 
-        return (
-            f"\\begin{{tcolorbox}}[{options}]\n"
-            f"{body}\n"
-            "\\end{tcolorbox}\n"
-        )
+        return begin + body + "\n\\end{tcolorbox}\n"
 
     def _render_term_item(self, item: TermItem) -> str:
         key = item.term if item.raw_key else latex_escape(item.term)
@@ -146,12 +371,20 @@ class LatexRenderer(Renderer):
         return f"  \\item[{key}] {val}"
 
     def _wrap_document(self, body: str) -> str:
+        return self._document_head() + body + self._document_tail()
+
+    def _document_head(self) -> str:
         return (
             f"\\documentclass{{{self.docclass}}}\n"
             f"{self.preamble}\n"
+            f"{self._style_templates().styles}"
             "\\begin{document}\n"
             f"{self.begin_document}\n"
-            f"{body}\n"
+        )
+
+    def _document_tail(self) -> str:
+        return (
+            "\n"
             f"{self.end_document}\n"
             "\\end{document}\n"
         )
@@ -179,48 +412,32 @@ class LatexRenderer(Renderer):
             f"\\hspace*{{{fs.margin_right}}}\\par\\vspace*{{{fs.margin_bottom}}}\n"
         )
 
-        # 中の空ボックス（枠あり・角丸・指定の高さ）
-        # boxsep=0pt, left/right/top/bottom=0pt で“純粋な空き領域”に近づける
-        box_opts = (
-            f"enhanced, colback=white, colframe=black, "
-            f"boxrule={fs.rule}, arc={fs.arc}, "
-            "boxsep=0pt, left=0pt, right=0pt, top=0pt, bottom=0pt, "
-            f"height={fs.height}"
-        )
-
-        # tcbraster（columns=cols, raster column skip = gap）
-        raster_begin = (
-            "\\begin{tcbraster}["
-            f"raster columns={cols}, "
-            f"raster column skip={colskip}, "
-            "raster left skip=0pt, raster right skip=0pt, "
-            "raster before skip=0pt, raster after skip=0pt"
-            "]\n"
-        )
+        # 空ボックスを columns 個生成（中身は空）。箱と tcbraster の開始は値ごとに組み立て済み
+        if self.shared_styles:
+            boxes = _shared_figure_box(fs.rule, fs.arc, fs.height) * cols
+            raster_begin = _shared_raster_begin(cols, colskip)
+        else:
+            boxes = _figure_box(fs.rule, fs.arc, fs.height) * cols
+            raster_begin = _raster_begin(cols, colskip)
         raster_end = "\\end{tcbraster}\n"
 
-        # 空ボックスを columns 個生成（中身は空）
-        boxes = "".join(f"\\begin{{tcolorbox}}[{box_opts}]\\end{{tcolorbox}}\n" for _ in range(cols))
-
         return wrap_begin + raster_begin + boxes + raster_end + wrap_end
     
     def _render_listblock(self, lb: ListBlock) -> str:
-        marker = latex_escape(getattr(lb, "title_marker", "●"))
+        marker = latex_escape_cached(getattr(lb, "title_marker", "●"))
         heading = (
             f"\\vspace*{{{lb.margin_before}}}\\noindent"
-            f"\\textbf{{{marker}\\;{latex_escape(lb.title)}}}\\\\[-24pt]\n"
+            f"\\textbf{{{marker}\\;{latex_escape_cached(lb.title)}}}\\\\[-24pt]\n"
         )
         
-        body = [f"  \\item {latex_escape(it)}" for it in lb.items]
+        items = lb.items if lb.raw else latex_escape_many(lb.items)
+        body = [f"  \\item {it}" for it in items]
         env = lb.style if lb.style in ("itemize", "enumerate") else "itemize"
 
-        # ★ 角括弧を使わず、内部で余白を設定
+        # 余白の設定（_LIST_SPACING）は組み立て済みの定型部分
         list_env = (
             f"\\begin{{{env}}}\n"
-            "\\setlength{\\topsep}{2pt}%\n"
-            "\\setlength{\\itemsep}{2pt}%\n"
-            "\\setlength{\\parsep}{0pt}%\n"
-            "\\setlength{\\partopsep}{0pt}%\n"
+            + _LIST_SPACING
             + "\n".join(body)
             + f"\n\\end{{{env}}}"
         )
@@ -228,10 +445,5 @@ class LatexRenderer(Renderer):
         content = heading + list_env + f"\\vspace*{{{lb.margin_after}}}\n"
 
         if lb.boxed:
-            return (
-                "\\begin{tcolorbox}[enhanced, colback=white, colframe=black, "
-                "boxrule=0.4pt, arc=4pt, boxsep=6pt]\n"
-                f"{content}\n"
-                "\\end{tcolorbox}\n"
-            )
+            return self._style_templates().list_box_begin + content + "\n\\end{tcolorbox}\n"
         return content
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""
+Document のバイナリ形式（version 2。version 1 のファイルも読める）
+
+    header  : MAGIC(8) version(u16) reserved(u16)
+    records : ノードごとに tag(u8) + フィールド
+    index   : 各レコードの先頭オフセット（u64 × count）
+    footer  : index のオフセット(u64) count(u64) FOOTER_MAGIC(8)
+
+フィールドは型ごとに固定の順で並ぶ（_SCHEMA）。
+  str   : 長さ(u32) + UTF-8
+  str?  : None は長さ 0xFFFFFFFF
+  bool  : u8 / int : i64
+  strs  : 個数(u32) + str の並び
+末尾の index により、任意のノードをファイル全体を読まずに取り出せる。
+整数はすべてリトルエンディアン。
+version 2 で ListBlock の末尾に raw(bool) を追加した。
+"""
+from __future__ import annotations
+import io
+import mmap
+import os
+import struct
+import sys
+from array import array
+from dataclasses import fields
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+
+from .nodes import Node, Title, Section, Paragraph, TermItem, Terms, FigureSpace, ListBlock, PageBreak
+
+MAGIC = b"LECTGEN\x00"
+FOOTER_MAGIC = b"LGENIDX\x00"
+VERSION = 2
+
+_HEADER = struct.Struct("<8sHH")
+_FOOTER = struct.Struct("<QQ8s")
+_U8 = struct.Struct("<B")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_U64 = struct.Struct("<Q")
+_NONE = 0xFFFFFFFF
+
+# フィールド種別
+_STR, _OPT_STR, _BOOL, _INT, _STRS = range(5)
+
+# tag とフィールドの並びはファイル形式の一部。変えるときは VERSION を上げること
+_SCHEMA: Dict[type, Tuple[int, Tuple[Tuple[str, int], ...]]] = {
+    PageBreak: (1, ()),
+    Title: (2, (("title", _STR), ("subtitle", _OPT_STR), ("raw", _BOOL))),
+    Section: (3, (("title", _STR), ("raw", _BOOL), ("margin_before", _STR), ("margin_after", _STR))),
+    Paragraph: (4, (("text", _STR), ("raw", _BOOL))),
+    TermItem: (5, (("term", _STR), ("definition", _STR), ("raw_key", _BOOL), ("raw_value", _BOOL))),
+    Terms: (6, (("content", _STR), ("title", _OPT_STR), ("boxed", _BOOL))),
+    FigureSpace: (7, (
+        ("height", _STR), ("count", _INT), ("margin_top", _STR), ("margin_bottom", _STR),
+        ("margin_left", _STR), ("margin_right", _STR), ("gap", _STR), ("arc", _STR), ("rule", _STR),
+    )),
+    ListBlock: (8, (
+        ("items", _STRS), ("title", _OPT_STR), ("title_marker", _STR), ("style", _STR),
+        ("boxed", _BOOL), ("margin_before", _STR), ("margin_after", _STR), ("raw", _BOOL),
+    )),
+}
+_BY_TAG = {tag: (cls, spec) for cls, (tag, spec) in _SCHEMA.items()}
+# 古い版のファイルの読み方（足りないフィールドはノードの既定値になる）
+_BY_TAG_OF_VERSION = {
+    1: {**_BY_TAG, 8: (ListBlock, _SCHEMA[ListBlock][1][:-1])},
+    VERSION: _BY_TAG,
+}
+
+
+
+class FormatError(ValueError):
+    """lectgen のバイナリ形式として読めない"""
+
+
+# スキーマとノード定義のずれを import 時に検出する（-O でも消えないよう assert は使わない）
+for _cls, (_tag, _spec) in _SCHEMA.items():
+    if tuple(f.name for f in fields(_cls)) != tuple(name for name, _ in _spec):
+        raise TypeError(f"serialize schema does not match the fields of {_cls.__name__}")
+
+
+# --- 書き出し ---
+
+def _pack_str(out: List[bytes], s: str) -> None:
+    data = s.encode("utf-8")
+    out.append(_U32.pack(len(data)))
+    out.append(data)
+
+
+def encode_node(node: Node) -> bytes:
+    try:
+        tag, spec = _SCHEMA[type(node)]
+    except KeyError:
+        raise TypeError(f"Unsupported node: {type(node).__name__}") from None
+    out: List[bytes] = [_U8.pack(tag)]
+    for name, kind in spec:
+        value = getattr(node, name)
+        if kind == _STR:
+            _pack_str(out, value)
+        elif kind == _OPT_STR:
+            if value is None:
+                out.append(_U32.pack(_NONE))
+            else:
+                _pack_str(out, value)
+        elif kind == _BOOL:
+            out.append(_U8.pack(1 if value else 0))
+        elif kind == _INT:
+            out.append(_I64.pack(value))
+        else:
+            out.append(_U32.pack(len(value)))
+            for s in value:
+                _pack_str(out, s)
+    return b"".join(out)
+
+
+def dump(nodes: Iterable[Node], fp: IO[bytes]) -> int:
+    """ノード列を fp（バイナリ、書き込み位置は先頭）へ書き出し、ノード数を返す"""
+    fp.write(_HEADER.pack(MAGIC, VERSION, 0))
+    offset = _HEADER.size
+    offsets = array("Q")
+    for node in nodes:
+        record = encode_node(node)
+        offsets.append(offset)
+        fp.write(record)
+        offset += len(record)
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    fp.write(offsets.tobytes())
+    fp.write(_FOOTER.pack(offset, len(offsets), FOOTER_MAGIC))
+    return len(offsets)
+
+
+def dumps(nodes: Iterable[Node]) -> bytes:
+    buf = io.BytesIO()
+    dump(nodes, buf)
+    return buf.getvalue()
+
+
+def save(nodes: Iterable[Node], path: Union[str, Path]) -> int:
+    with open(path, "wb") as fp:
+        return dump(nodes, fp)
+
+
+# --- 読み込み ---
+
+def _decode(buf: Any, pos: int, by_tag: Dict[int, Any] = _BY_TAG) -> Tuple[Node, int]:
+    """buf[pos:] のレコードを1つ読み、(ノード, 次の位置) を返す"""
+    start = pos
+    try:
+        tag = buf[pos]
+    except IndexError:
+        raise FormatError(f"truncated record at offset {start}") from None
+    pos += 1
+    try:
+        cls, spec = by_tag[tag]
+    except KeyError:
+        raise FormatError(f"unknown node tag {tag} at offset {start}") from None
+    try:
+        values, pos = _decode_fields(buf, pos, spec)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise FormatError(f"corrupt {cls.__name__} record at offset {start}: {e}") from None
+    return cls(*values), pos
+
+
+def _decode_fields(buf: Any, pos: int, spec: Tuple[Tuple[str, int], ...]) -> Tuple[List[Any], int]:
+    """フィールドの値を読み (値, 次の位置) を返す（範囲外なら struct.error / IndexError）"""
+    values: List[Any] = []
+    for _, kind in spec:
+        if kind == _BOOL:
+            values.append(buf[pos] != 0)
+            pos += 1
+        elif kind == _INT:
+            values.append(_I64.unpack_from(buf, pos)[0])
+            pos += 8
+        elif kind == _STRS:
+            (n,) = _U32.unpack_from(buf, pos)
+            pos += 4
+            items = []
+            for _ in range(n):
+                (size,) = _U32.unpack_from(buf, pos)
+                pos += 4
+                items.append(str(buf[pos:pos + size], "utf-8"))
+                pos += size
+            values.append(tuple(items))
+        else:
+            (size,) = _U32.unpack_from(buf, pos)
+            pos += 4
+            if size == _NONE and kind == _OPT_STR:
+                values.append(None)
+            else:
+                values.append(str(buf[pos:pos + size], "utf-8"))
+                pos += size
+    if pos > len(buf):
+        raise IndexError("record runs past the end of the data")
+    return values, pos
+
+
+def _read_layout(buf: Any) -> Tuple[int, int, Dict[int, Any]]:
+    """ヘッダとフッタを検証し (index のオフセット, ノード数, その版の tag の対応) を返す"""
+    if len(buf) < _HEADER.size + _FOOTER.size:
+        raise FormatError("file is too short")
+    magic, version, _ = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise FormatError("not a lectgen document")
+    if version not in _BY_TAG_OF_VERSION:
+        raise FormatError(f"unsupported format version {version} (expected {VERSION})")
+    index_offset, count, footer = _FOOTER.unpack_from(buf, len(buf) - _FOOTER.size)
+    if footer != FOOTER_MAGIC or index_offset + 8 * count + _FOOTER.size != len(buf):
+        raise FormatError("corrupt index")
+    return index_offset, count, _BY_TAG_OF_VERSION[version]
+
+
+class LazyNodes(Sequence):
+    """
+    保存済みの文書を mmap し、アクセスされたノードだけをその場で復元する読み取り専用の列。
+    先頭から順に読む（レンダラの描画）ときは index を使わず連続して復元する。
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self._file = open(path, "rb")
+        try:
+            if os.fstat(self._file.fileno()).st_size == 0:
+                raise FormatError("file is too short")   # 空のファイルは mmap できない
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._index_offset, self._count, self._by_tag = _read_layout(self._buf)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("node index out of range")
+        (offset,) = _U64.unpack_from(self._buf, self._index_offset + 8 * i)
+        return _decode(self._buf, offset, self._by_tag)[0]
+
+    def __iter__(self) -> Iterator[Node]:
+        buf, pos, by_tag = self._buf, _HEADER.size, self._by_tag
+        for _ in range(self._count):
+            node, pos = _decode(buf, pos, by_tag)
+            yield node
+
+    def close(self) -> None:
+        self._buf.close()
+        self._file.close()
+
+    def __enter__(self) -> "LazyNodes":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def loads(data: bytes) -> List[Node]:
+    """bytes から全ノードを復元する"""
+    _, count, by_tag = _read_layout(data)
+    nodes: List[Node] = []
+    pos = _HEADER.size
+    for _ in range(count):
+        node, pos = _decode(data, pos, by_tag)
+        nodes.append(node)
+    return nodes
+
+
+def load(path: Union[str, Path]) -> List[Node]:
+    with open(path, "rb") as fp:
+        return loads(fp.read())
@@ -0,0 +1,462 @@
+"""
+常駐するレンダリング・コンパイルサーバ（python -m lectgen serve）。
+
+配布資料ごとに Python を起動すると、毎回 lectgen の import・レンダラの構築・エンジンの
+コールドスタートがかかる。サーバはレンダラを作ったまま保持し（プリアンブルのフォーマットも
+起動時に用意する）、Document.to_bytes() の形式で送られた文書を PDF にして返す。
+
+    POST /compile?renderer=名前   本文: Document.to_bytes()   → application/pdf
+    GET  /stats                   要求数・キャッシュの状況（JSON）
+    GET  /health                  "ok"
+
+- 同じ内容（レンダラ＋本文のハッシュ）の要求が同時に来たら、コンパイルは1回だけ行い結果を共有する
+- PDF はハッシュをキーにディスクへ保存し、max_bytes を超えたら古いものから消す
+- ビルドは tmpfs（/dev/shm があればその下）の一時ディレクトリで行い、PDF をそのまま返す
+- compiler に StubCompiler を渡せば TeX なしで動かせる（--stub）
+
+応答の X-Lectgen-Cache ヘッダは hit（キャッシュ）・miss（コンパイルした）・shared（同時の要求と共有）。
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import runpy
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from .aio import AsyncCompiler, CompileTimeout, render_lock
+from .build import BuildError, validated
+from .document import Document
+from .renderers.latex import LatexRenderer
+from .validate import RawLatexError
+
+HIT, MISS, SHARED = "hit", "miss", "shared"
+DEFAULT_MAX_BODY = 64 << 20          # 受け付ける文書の大きさの上限（バイト）
+DEFAULT_CACHE_BYTES = 512 << 20      # PDF キャッシュの上限（バイト）
+
+logger = logging.getLogger(__name__)
+
+
+def default_tmp_root() -> Optional[Path]:
+    """ビルドに使う tmpfs（無ければ None = OS の一時ディレクトリ）"""
+    shm = Path("/dev/shm")
+    return shm if shm.is_dir() and os.access(shm, os.W_OK) else None
+
+
+def load_renderers(path: Union[str, Path]) -> Dict[str, LatexRenderer]:
+    """
+    スクリプトを実行し、モジュール変数 renderers（名前 → LatexRenderer の dict）を返す。
+    renderer だけを定義していれば {"default": renderer}。
+    """
+    namespace = runpy.run_path(str(path), run_name="__lectgen__")
+    if "renderers" in namespace:
+        return dict(namespace["renderers"])
+    if "renderer" in namespace:
+        return {"default": namespace["renderer"]}
+    raise ValueError(f"{path} defines neither 'renderers' nor 'renderer'")
+
+
+class PdfCache:
+    """
+    ハッシュをキーにした PDF のディスクキャッシュ（合計 max_bytes まで、最近使っていないものから消す）。
+    使った順は mtime に残すので、再起動しても引き継がれる。スレッドから呼んでよい。
+    """
+
+    def __init__(self, directory: Union[str, Path], max_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()   # キー → サイズ（古い順）
+        self.total = 0
+        files = sorted(self.directory.glob("*.pdf"), key=lambda p: p.stat().st_mtime_ns)
+        for path in files:
+            self._entries[path.stem] = size = path.stat().st_size
+            self.total += size
+        with self._lock:
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:   # 外から消された
+            with self._lock:
+                self.total -= self._entries.pop(key, 0)
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = path.with_name(f".{key}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self.total += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.total > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+
+class StubCompiler:
+    """
+    TeX なしで試すためのコンパイラ。ソースまでは本当に描画し、そのハッシュを埋めた小さな PDF を返す。
+    delay 秒待つので、要求の共有やタイムアウトの確認にも使える。
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.compiles = 0
+
+    async def compile(self, doc: Document, renderer: LatexRenderer) -> bytes:
+        self.compiles += 1
+        source = await asyncio.to_thread(_render, doc, renderer)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return stub_pdf(hashlib.sha256(source.encode("utf-8")).hexdigest())
+
+    async def warm(self, renderer: LatexRenderer) -> None:
+        pass
+
+
+def stub_pdf(tag: str) -> bytes:
+    """白紙1ページの最小の PDF（tag はコメントとして入る）"""
+    return (
+        f"%PDF-1.4\n% lectgen-stub {tag}\n"
+        "1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+        "2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+        "3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n"
+        "trailer<</Root 1 0 R>>\n%%EOF\n"
+    ).encode("ascii")
+
+
+def _render(doc: Document, renderer: LatexRenderer) -> str:
+    with render_lock:
+        return renderer.render(doc)
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    hits: int = 0        # キャッシュから返した
+    misses: int = 0      # コンパイルした
+    shared: int = 0      # 同時の同じ要求の結果を共有した
+    errors: int = 0
+
+
+class RenderServer:
+    """
+    renderers（名前 → LatexRenderer）を保持して依頼をコンパイルするサーバ。
+    compiler は compile(doc, renderer) -> bytes を持つもの（既定は AsyncCompiler）。
+    cache を None にするとディスクキャッシュを使わない（同時の要求の共有は行う）。
+    """
+
+    def __init__(
+        self,
+        renderers: Mapping[str, LatexRenderer],
+        *,
+        compiler=None,
+        cache: Optional[PdfCache] = None,
+        default_renderer: Optional[str] = None,
+        validate: bool = True,
+        max_body: int = DEFAULT_MAX_BODY,
+    ) -> None:
+        if not renderers:
+            raise ValueError("no renderers to serve")
+        self.renderers = dict(renderers)
+        self.compiler = compiler if compiler is not None else AsyncCompiler(tmp_root=default_tmp_root())
+        self.cache = cache
+        self.default_renderer = default_renderer or next(iter(self.renderers))
+        self.validate = validate
+        self.max_body = max_body
+        self.stats = ServerStats()
+        # サーバの動作中はレンダラを変えない前提で、キーの元になる設定のハッシュを先に作っておく
+        self._renderer_keys = {name: _renderer_key(r) for name, r in self.renderers.items()}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def warm(self) -> None:
+        """各レンダラのテンプレートとフォーマットを用意し、最初の依頼からすぐ描画・コンパイルできるようにする"""
+        for renderer in self.renderers.values():
+            await asyncio.to_thread(_render, Document(), renderer)
+            await self.compiler.warm(renderer)
+
+    def key(self, payload: bytes, renderer: Optional[str] = None) -> str:
+        name = renderer or self.default_renderer
+        h = hashlib.sha256(self._renderer_keys[name].encode("ascii"))
+        h.update(payload)
+        return h.hexdigest()
+
+    async def compile(self, payload: bytes, renderer: Optional[str] = None) -> Tuple[bytes, str]:
+        """
+        Document.to_bytes() の本文を PDF にし、(PDF, hit/miss/shared) を返す。
+        未知のレンダラは KeyError、読めない本文は ValueError（raw LaTeX の問題は RawLatexError）。
+        """
+        name = renderer or self.default_renderer
+        if name not in self.renderers:
+            raise KeyError(name)
+        self.stats.requests += 1
+        key = self.key(payload, name)
+        job = self._inflight.get(key)
+        if job is not None:
+            self.stats.shared += 1
+            data, _ = await asyncio.shield(job)
+            return data, SHARED
+        job = self._inflight[key] = asyncio.ensure_future(self._produce(key, payload, self.renderers[name]))
+        job.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 依頼元が切断しても、同じ要求を待つ他の依頼とキャッシュのためにコンパイルは続ける
+        return await asyncio.shield(job)
+
+    async def _produce(self, key: str, payload: bytes, renderer: LatexRenderer) -> Tuple[bytes, str]:
+        if self.cache is not None:
+            data = await asyncio.to_thread(self.cache.get, key)
+            if data is not None:
+                self.stats.hits += 1
+                return data, HIT
+        doc = await asyncio.to_thread(self._load, payload)
+        data = await self.compiler.compile(doc, renderer)
+        self.stats.misses += 1
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, data)
+        return data, MISS
+
+    def _load(self, payload: bytes) -> Document:
+        try:
+            doc = Document.from_bytes(payload)
+        except Exception as e:
+            raise ValueError(f"not a serialized document: {e}") from None
+        return validated(doc) if self.validate else doc
+
+    # --- HTTP ---
+
+    async def serve_tcp(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def serve_unix(self, path: Union[str, Path]) -> asyncio.AbstractServer:
+        return await asyncio.start_unix_server(self._handle, str(path))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, self.max_body)
+                except _HttpError as e:
+                    self.stats.errors += 1
+                    _write_response(writer, e.status, e.message.encode("utf-8"), keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                status, body, headers = await self._dispatch(request)
+                _write_response(writer, status, body, headers, keep_alive=request.keep_alive)
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, request: "_Request") -> Tuple[HTTPStatus, bytes, Dict[str, str]]:
+        url = urlsplit(request.target)
+        if request.method == "GET" and url.path == "/health":
+            return HTTPStatus.OK, b"ok", {}
+        if request.method == "GET" and url.path == "/stats":
+            return HTTPStatus.OK, json.dumps(self.stats_dict()).encode("utf-8"), {"Content-Type": "application/json"}
+        if url.path != "/compile":
+            return HTTPStatus.NOT_FOUND, b"not found", {}
+        if request.method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, b"use POST", {"Allow": "POST"}
+
+        name = parse_qs(url.query).get("renderer", [None])[0]
+        # 404 にするのはレンダラ名の引き当てだけ（描画やビルドの中の KeyError は 500 にする）
+        if (name or self.default_renderer) not in self.renderers:
+            self.stats.errors += 1
+            return HTTPStatus.NOT_FOUND, f"unknown renderer {name!r}".encode("utf-8"), {}
+        try:
+            data, state = await self.compile(request.body, name)
+        except RawLatexError as e:
+            status, message = HTTPStatus.UNPROCESSABLE_ENTITY, str(e)
+        except ValueError as e:
+            status, message = HTTPStatus.BAD_REQUEST, str(e)
+        except CompileTimeout as e:
+            status, message = HTTPStatus.GATEWAY_TIMEOUT, str(e)
+        except BuildError as e:
+            status, message = HTTPStatus.UNPROCESSABLE_ENTITY, "\n".join([str(e), *map(str, e.messages)])
+        except Exception:
+            # 想定外の失敗でも接続を切らずに 500 を返し、原因はログに残す
+            logger.exception("compile request failed (renderer=%r)", name)
+            status, message = HTTPStatus.INTERNAL_SERVER_ERROR, "internal server error"
+        else:
+            return HTTPStatus.OK, data, {"Content-Type": "application/pdf", "X-Lectgen-Cache": state}
+        self.stats.errors += 1
+        return status, message.encode("utf-8"), {}
+
+    def stats_dict(self) -> dict:
+        stats = asdict(self.stats)
+        stats["inflight"] = len(self._inflight)
+        if self.cache is not None:
+            stats["cache_entries"] = len(self.cache)
+            stats["cache_bytes"] = self.cache.total
+        return stats
+
+
+def _renderer_key(renderer: LatexRenderer) -> str:
+    """
+    .tex を左右するものすべて（文書の前後、ノードの見た目の設定、登録された描画関数）のハッシュ。
+    ディスクキャッシュはサーバを再起動しても使うので、id() のような起動ごとに変わる値は使わない。
+    """
+    h = hashlib.sha256()
+    handlers = sorted(
+        f"{_qualified_name(node_type)}={_callable_identity(handler)}"
+        for node_type, handler in renderer._handlers.items()
+    )
+    for part in (
+        renderer._document_head(),
+        renderer._document_tail(),
+        repr(renderer._style_fingerprint()),
+        *handlers,
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _qualified_name(obj) -> str:
+    return f"{getattr(obj, '__module__', '?')}.{getattr(obj, '__qualname__', type(obj).__qualname__)}"
+
+
+def _callable_identity(handler) -> str:
+    # 名前が同じでも中身の違う関数（lambda など）を区別できるよう、バイトコードも含める
+    fn = getattr(handler, "__func__", handler)
+    code = getattr(fn, "__code__", None)
+    if code is None:
+        return repr(handler)   # partial など。再起動ごとにキーが変わるが、取り違えはしない
+    digest = hashlib.sha256(code.co_code + repr(code.co_consts).encode("utf-8")).hexdigest()[:16]
+    return f"{_qualified_name(fn)}:{digest}"
+
+
+class _HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass(frozen=True)
+class _Request:
+    method: str
+    target: str
+    headers: Dict[str, str]
+    body: bytes
+    keep_alive: bool
+
+
+async def _read_request(reader: asyncio.StreamReader, max_body: int) -> Optional[_Request]:
+    """HTTP/1.x の要求を1つ読む（接続が閉じられたら None）。本文は Content-Length のみ対応"""
+    line = await _read_line(reader)
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise _HttpError(HTTPStatus.BAD_REQUEST, "malformed request line") from None
+    headers: Dict[str, str] = {}
+    while True:
+        line = await _read_line(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= 100:
+            raise _HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "too many headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise _HttpError(HTTPStatus.LENGTH_REQUIRED, "chunked bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise _HttpError(HTTPStatus.BAD_REQUEST, "bad Content-Length") from None
+    if length > max_body:
+        raise _HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"body larger than {max_body} bytes")
+    body = await reader.readexactly(length) if length else b""
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+    return _Request(method.upper(), target, headers, body, keep_alive)
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        # StreamReader の上限より長い行（readline は LimitOverrunError を ValueError にして投げる）
+        raise _HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "request line or header too long") from None
+
+
+def _write_response(
+    writer: asyncio.StreamWriter,
+    status: HTTPStatus,
+    body: bytes,
+    headers: Optional[Dict[str, str]] = None,
+    *,
+    keep_alive: bool,
+) -> None:
+    lines: List[str] = [f"HTTP/1.1 {status.value} {status.phrase}"]
+    fields = {"Content-Type": "text/plain; charset=utf-8", **(headers or {})}
+    fields["Content-Length"] = str(len(body))
+    fields["Connection"] = "keep-alive" if keep_alive else "close"
+    lines.extend(f"{k}: {v}" for k, v in fields.items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+
+async def run_server(
+    server: RenderServer,
+    *,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix: Union[str, Path, None] = None,
+    log=print,
+) -> None:
+    """warm() してから待ち受け、止められるまで動かす"""
+    await server.warm()
+    if unix is not None:
+        listener = await server.serve_unix(unix)
+        log(f"lectgen serve: listening on {unix}")
+    else:
+        listener = await server.serve_tcp(host, port)
+        log(f"lectgen serve: listening on http://{host}:{port}")
+    async with listener:
+        await listener.serve_forever()
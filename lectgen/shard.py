@@ -0,0 +1,304 @@
+"""
+大きな文書を PageBreak で分割し、シャードごとに並列コンパイルして1つの PDF に結合する。
+
+PageBreak で区切られたまとまり（例: 講義1回分）は互いに独立しているので、
+同じプリアンブルで別々にコンパイルしてから順に結合しても結果は変わらない。
+- begin_document（表紙・目次など）は最初のシャードだけ、end_document は最後のシャードだけに出す
+- 各シャードの先頭で \\setcounter によりページ番号と見出し・脚注・数式・図表の番号を前のシャードの続きに合わせる
+  （各シャードの最後の値はログに \\typeout で書き出したものを読む）
+- 開始時の状態は前回のビルドで記録したページ数と番号の増分から見積もり、実際と違ったシャードだけ作り直す
+- シャードの PDF は内容のハッシュと開始時の番号で名前をつけるので、前にまとまりを挿入・削除しても
+  開始ページや番号が変わらないシャードはそのまま再利用される
+  （ページ番号は PDF に印字されるので、開始ページが変わったシャードはコンパイルし直す）
+
+シャードごとに .aux は別なので、シャードをまたぐ \\ref/\\pageref は解決できない（ValueError にする）。
+\\tableofcontents なども最初のシャードの内容しか拾わない。
+"""
+from __future__ import annotations
+import copy
+import dataclasses
+import hashlib
+import json
+import re
+import shutil
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from .build import BUILD_DIR_NAME, BuildJob, BuildResult, _read_log, build_many, default_build_dir
+from .document import Document
+from .metrics import parse_log_stats
+from .nodes import Node, PageBreak, Paragraph
+from .pdf import merge_pdfs, page_count
+from .renderers.latex import LatexRenderer
+
+_MANIFEST = "shards.json"   # シャードの内容ハッシュ → ページ数と番号の増分
+
+# シャードをまたいで引き継ぐ番号（クラスに無いものは飛ばす）
+_COUNTERS = (
+    "part", "chapter", "section", "subsection", "subsubsection", "paragraph", "subparagraph",
+    "footnote", "equation", "figure", "table",
+)
+_COUNTER_LINE = re.compile(r"^lectgen-counter (\w+)=(-?\d+)$", re.MULTILINE)
+_LABEL = re.compile(r"\\label\s*\{([^{}]*)\}")
+_REF = re.compile(r"\\(?:ref|pageref|eqref|autoref|nameref|[cC]ref|[cC]pageref)\*?\s*\{([^{}]*)\}")
+
+# シャードの開始時の状態: (開始ページ, ((番号名, 値), ...))
+ShardState = Tuple[int, Tuple[Tuple[str, int], ...]]
+
+
+class ShardBuildError(RuntimeError):
+    """いずれかのシャードのビルドに失敗した"""
+
+    def __init__(self, message: str, errors: Dict[int, BaseException]) -> None:
+        super().__init__(message)
+        self.errors = errors
+
+
+@dataclass(frozen=True)
+class ShardedResult:
+    pdf: Path
+    shards: List[BuildResult]   # シャード順
+    pages: List[int]            # 各シャードのページ数
+    rounds: int                 # 開始ページの見直しでビルドした回数
+    converged: bool = True      # False なら max_rounds 回で開始ページが定まらず、ページ番号がずれている
+
+    @property
+    def compiled(self) -> int:
+        """実際にコンパイルしたシャード数（最後の回）"""
+        return sum(1 for r in self.shards if r.compiled)
+
+
+def split_at_pagebreaks(doc: Document, *, groups_per_shard: int = 1) -> List[List[Node]]:
+    """
+    PageBreak を境にノード列を分ける。groups_per_shard 個のまとまりを1シャードにし、
+    シャード内の PageBreak は残す（シャードの境目の PageBreak は PDF の区切りそのものになる）。
+    空のまとまり（連続した PageBreak や末尾の PageBreak）は捨てる。
+    """
+    if groups_per_shard < 1:
+        raise ValueError("groups_per_shard must be >= 1")
+    groups: List[List[Node]] = [[]]
+    for n in doc.nodes:
+        if isinstance(n, PageBreak):
+            groups.append([])
+        else:
+            groups[-1].append(n)
+    groups = [g for g in groups if g]
+    shards: List[List[Node]] = []
+    for i in range(0, len(groups), groups_per_shard):
+        shard: List[Node] = []
+        for g in groups[i:i + groups_per_shard]:
+            if shard:
+                shard.append(PageBreak())
+            shard.extend(g)
+        shards.append(shard)
+    return shards
+
+
+def build_sharded(
+    doc: Document,
+    renderer: LatexRenderer,
+    out_pdf: Union[str, Path],
+    *,
+    groups_per_shard: int = 1,
+    workers: Optional[int] = None,
+    max_rounds: int = 3,
+    **options: Any,
+) -> ShardedResult:
+    """
+    doc を PageBreak で分けて並列にコンパイルし、out_pdf に結合する。
+    options は build() に渡す（engine, precompile など）。
+    シャードは out_pdf の作業ディレクトリ（.lectgen-build/<名前>/shards/）に置き、次回のビルドで再利用する。
+    max_rounds 回で開始ページ・番号が定まらなければ RuntimeWarning を出し、result.converged を False にする。
+    """
+    out_pdf = Path(out_pdf)
+    work = default_build_dir(out_pdf) / "shards"
+    work.mkdir(parents=True, exist_ok=True)
+    shards = split_at_pagebreaks(doc, groups_per_shard=groups_per_shard)
+    if not shards:
+        raise ValueError("document has no content to build")
+    _check_cross_shard_refs(shards)
+    keys = [_shard_key(s) for s in shards]
+    renderers = _shard_renderers(renderer, len(shards))
+    known = _read_manifest(work)
+    # 前回のページ数と番号の増え方が分かっていればそれで開始時の状態を見積もる（初回は1ページ・番号は増えないと仮定）
+    pages = [known.get(k, {}).get("pages", 1) for k in keys]
+    steps = [known.get(k, {}).get("counters", {}) for k in keys]
+
+    for rounds in range(1, max_rounds + 1):
+        states = _start_states(pages, steps)
+        pdfs = [
+            work / f"shard-{_pdf_key(k, i, len(shards), state)}.pdf"
+            for i, (k, state) in enumerate(zip(keys, states))
+        ]
+        jobs = [
+            BuildJob(Document(nodes=[_shard_start(state), *nodes, _COUNTER_REPORT]), r, pdf)
+            for nodes, state, r, pdf in zip(shards, states, renderers, pdfs)
+        ]
+        outcomes = build_many(jobs, workers=workers, **options)
+        errors = {r.index: r.error for r in outcomes if not r.ok}
+        if errors:
+            first = min(errors)
+            raise ShardBuildError(f"shard {first} failed: {errors[first]}", errors)  # type: ignore[arg-type]
+        results = [r.result for r in outcomes]
+        pages = [_pages_of(r) for r in results]  # type: ignore[arg-type]
+        steps = [_counter_steps(state, r) for state, r in zip(states, results)]  # type: ignore[arg-type]
+        for k, n, c in zip(keys, pages, steps):
+            known[k] = {"pages": n, "counters": c}
+        _write_manifest(work, {k: known[k] for k in keys})
+        if _start_states(pages, steps) == states:
+            converged = True
+            break
+        # 見積もりが外れた：開始時の状態がずれたシャードだけ名前が変わり、作り直される
+    else:
+        converged = False
+        warnings.warn(
+            f"{out_pdf.name}: shard start pages and counters did not converge in {max_rounds} round(s); "
+            "page numbers in the merged PDF may be wrong",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+
+    merge_pdfs(pdfs, out_pdf)
+    _prune(work, {p.stem for p in pdfs})
+    return ShardedResult(
+        pdf=out_pdf, shards=results, pages=pages, rounds=rounds, converged=converged,  # type: ignore[arg-type]
+    )
+
+
+def _shard_renderers(renderer: LatexRenderer, count: int) -> List[LatexRenderer]:
+    """begin_document は最初のシャードだけ、end_document は最後のシャードだけに出す"""
+    def variant(first: bool, last: bool) -> LatexRenderer:
+        if first and last:
+            return renderer
+        r = copy.copy(renderer)  # 登録済みの描画関数はそのまま共有する
+        if not first:
+            r.begin_document = ""
+        if not last:
+            r.end_document = ""
+        return r
+
+    if count == 1:
+        return [renderer]
+    middle = variant(False, False)
+    return [variant(True, False), *([middle] * (count - 2)), variant(False, True)]
+
+
+def _start_states(pages: Sequence[int], steps: Sequence[Dict[str, int]]) -> List[ShardState]:
+    """
+    各シャードの開始ページと開始時の番号。番号は前のシャードの開始時の値に、そのシャードでの増分を足したもの
+    （見出しで下位の番号が 0 に戻るなど増分で表せない場合は見積もりが外れ、次の回で直る）。0 の番号は書かない。
+    """
+    states: List[ShardState] = []
+    page, carried = 1, {}  # type: ignore[var-annotated]
+    for n, step in zip(pages, steps):
+        states.append((page, tuple(sorted((k, v) for k, v in carried.items() if v))))
+        page += n
+        carried = {**carried, **{k: carried.get(k, 0) + v for k, v in step.items()}}
+    return states
+
+
+def _shard_start(state: ShardState) -> Paragraph:
+    page, counters = state
+    lines = [f"\\setcounter{{page}}{{{page}}}"]
+    lines += [f"\\setcounter{{{name}}}{{{value}}}" for name, value in counters]
+    return Paragraph("".join(lines) + "%", raw=True)
+
+
+# シャードの最後で、引き継ぐ番号の値をログに1行ずつ書き出す（長い行は TeX が折り返すので分ける）
+_COUNTER_REPORT = Paragraph(
+    "".join(
+        f"\\ifcsname c@{name}\\endcsname\\typeout{{lectgen-counter {name}=\\the\\value{{{name}}}}}\\fi"
+        for name in _COUNTERS
+    ) + "%",
+    raw=True,
+)
+
+
+def _counter_steps(state: ShardState, result: BuildResult) -> Dict[str, int]:
+    """ログに書き出した最後の番号から、シャードの中での増分を求める"""
+    start = dict(state[1])
+    return {
+        name: int(value) - start.get(name, 0)
+        for name, value in _COUNTER_LINE.findall(_read_log(result.tex))
+        if int(value) != start.get(name, 0)
+    }
+
+
+def _pdf_key(key: str, index: int, count: int, state: ShardState) -> str:
+    """シャードの PDF の名前：内容・開始時の状態・begin/end_document を出すかで決まり、位置にはよらない"""
+    h = hashlib.sha256(key.encode("ascii"))
+    h.update(repr((index == 0, index == count - 1, state)).encode("ascii"))
+    return h.hexdigest()[:20]
+
+
+def _check_cross_shard_refs(shards: Sequence[Sequence[Node]]) -> None:
+    """別のシャードの \\label を参照していれば ValueError（シャードごとに .aux が別なので解決できない）"""
+    owner: Dict[str, int] = {}
+    refs: List[Tuple[int, str]] = []
+    for i, nodes in enumerate(shards):
+        for text in _node_strings(nodes):
+            for label in _LABEL.findall(text):
+                owner.setdefault(label.strip(), i)
+            for group in _REF.findall(text):
+                refs.extend((i, label.strip()) for label in group.split(","))
+    for i, label in refs:
+        j = owner.get(label, i)
+        if j != i:
+            raise ValueError(
+                f"shard {i} refers to label {label!r} defined in shard {j}; "
+                "cross-shard references cannot be resolved (build the document without sharding)"
+            )
+
+
+def _node_strings(nodes: Sequence[Any]) -> Iterator[str]:
+    for n in nodes:
+        if isinstance(n, str):
+            yield n
+        elif isinstance(n, (tuple, list)):
+            yield from _node_strings(n)
+        elif dataclasses.is_dataclass(n):
+            yield from _node_strings([getattr(n, f.name) for f in dataclasses.fields(n)])
+
+
+def _shard_key(nodes: Sequence[Node]) -> str:
+    # ノードは frozen な dataclass なので repr が内容をそのまま表す
+    h = hashlib.sha256()
+    for n in nodes:
+        h.update(repr(n).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _pages_of(result: BuildResult) -> int:
+    """ログの "Output written on ... (N pages" から、無ければ PDF からページ数を得る"""
+    pages = parse_log_stats(_read_log(result.tex)).pages
+    return pages if pages is not None else page_count(result.pdf)
+
+
+def _read_manifest(work: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        with (work / _MANIFEST).open(encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # 以前の形式（内容ハッシュ → ページ数）も読む
+    return {k: v if isinstance(v, dict) else {"pages": v} for k, v in manifest.items()}
+
+
+def _write_manifest(work: Path, manifest: Dict[str, Dict[str, Any]]) -> None:
+    with (work / _MANIFEST).open("w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+def _prune(work: Path, keep: Set[str]) -> None:
+    """今回使わなかったシャードの PDF と作業ディレクトリを消す（見積もり違いの回や以前の構成の分）"""
+    for pdf in work.glob("shard-*.pdf"):
+        if pdf.stem not in keep:
+            pdf.unlink(missing_ok=True)
+    builds = work / BUILD_DIR_NAME
+    if builds.is_dir():
+        for d in builds.iterdir():
+            if d.name.startswith("shard-") and d.name not in keep:
+                shutil.rmtree(d, ignore_errors=True)
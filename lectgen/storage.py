@@ -0,0 +1,100 @@
+from __future__ import annotations
+from array import array
+from typing import Dict, Iterable, Iterator, List, MutableSequence, Optional, overload
+
+from .nodes import Node
+
+
+class NodeArray(MutableSequence):
+    """
+    Document.nodes の省メモリ版（Document.compact() で使う）。
+    ノードは frozen で値として比較できるので、同じ値のノードは1つだけ保持し、
+    並び順は array('I') の番号列で持つ。PageBreak や既定値の FigureSpace、
+    同じ見出しの繰り返しなどは1要素あたり 4 バイトで済む。
+    list と同じように読み書きできる（ハッシュできないノードもそのまま入る）。
+    """
+
+    __slots__ = ("_table", "_codes", "_lookup")
+
+    def __init__(self, nodes: Iterable[Node] = ()) -> None:
+        self._table: List[Node] = []          # 重複を除いたノード
+        self._codes = array("I")              # 各位置のノード番号
+        self._lookup: Dict[Node, int] = {}    # ノード → 番号
+        self.extend(nodes)
+
+    def _code(self, node: Node) -> int:
+        try:
+            return self._lookup[node]
+        except KeyError:
+            code = self._lookup[node] = len(self._table)
+        except TypeError:
+            code = len(self._table)  # ハッシュできないノードは共有しない
+        self._table.append(node)
+        return code
+
+    @overload
+    def __getitem__(self, i: int) -> Node: ...
+    @overload
+    def __getitem__(self, i: slice) -> List[Node]: ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._table[c] for c in self._codes[i]]
+        return self._table[self._codes[i]]
+
+    def __setitem__(self, i, value) -> None:
+        if isinstance(i, slice):
+            self._codes[i] = array("I", map(self._code, value))
+        else:
+            self._codes[i] = self._code(value)
+
+    def __delitem__(self, i) -> None:
+        del self._codes[i]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __iter__(self) -> Iterator[Node]:
+        return map(self._table.__getitem__, self._codes)
+
+    def insert(self, i: int, node: Node) -> None:
+        self._codes.insert(i, self._code(node))
+
+    def append(self, node: Node) -> None:
+        self._codes.append(self._code(node))
+
+    def extend(self, nodes: Iterable[Node]) -> None:
+        self._codes.extend(map(self._code, nodes))
+
+    def unique_count(self) -> int:
+        """保持している異なるノードの数"""
+        return len(self._table)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (NodeArray, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"NodeArray({list(self)!r})"
+
+
+class NodeStream:
+    """
+    一度だけ走査できるノード列（Document.streaming で使う）。
+    ローダーのジェネレータをそのままレンダラに流すためのもので、保持も巻き戻しもしない。
+    """
+
+    __slots__ = ("_nodes",)
+
+    def __init__(self, nodes: Iterable[Node]) -> None:
+        self._nodes: Optional[Iterable[Node]] = nodes
+
+    def __iter__(self) -> Iterator[Node]:
+        nodes, self._nodes = self._nodes, None
+        if nodes is None:
+            raise RuntimeError("NodeStream can only be iterated once")
+        return iter(nodes)
+
+    def __repr__(self) -> str:
+        return "NodeStream(consumed)" if self._nodes is None else "NodeStream(...)"
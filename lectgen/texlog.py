@@ -0,0 +1,265 @@
+"""
+エンジンの .log（または端末出力）の逐次解析。
+
+1行ずつ LogParser.feed に流すと、エラー・未定義の参照・再実行の指示（"Rerun to get ..."）・
+Overfull/Underfull box を LogMessage として返す。SourceMap を渡せば、.tex の行番号から
+その行を出力したノード（doc.nodes の添字）を引く。
+build() はこれを使って、ログが再実行を求める間だけコンパイルを繰り返し、
+最初の致命的なエラーでエンジンを止める。
+"""
+from __future__ import annotations
+import re
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+# TeX はログの行を max_print_line（既定 79）文字で折り返す
+MAX_PRINT_LINE = 79
+
+ERROR = "error"
+UNDEFINED = "undefined"     # 未定義の参照・引用
+RERUN = "rerun"             # もう一度コンパイルが必要
+OVERFULL = "overfull"
+UNDERFULL = "underfull"
+WARNING = "warning"         # 上記以外の LaTeX/パッケージの警告
+
+_FILE_LINE_ERROR = re.compile(r"^(.*?\.\w+):(\d+): (.*)$")
+_CONTEXT_LINE = re.compile(r"^l\.(\d+)")
+_WARNING = re.compile(r"^(?:LaTeX|(?:Package|Class|Module) (\S+)) Warning: (.*)$")
+_BOX = re.compile(
+    r"^(Overfull|Underfull) \\[hv]box \((.*?)\) "
+    r"(?:in paragraph at lines (\d+)--\d+|in alignment at lines (\d+)--\d+|detected at line (\d+))"
+)
+_INPUT_LINE = re.compile(r"on input line (\d+)")
+_UNDEFINED = re.compile(r"^(?:Reference|Citation) .* undefined")
+_RERUN = re.compile(r"\b[Rr]erun\b")
+_ERROR_CONTEXT_LINES = 8   # "! ..." の後、l.<行番号> を探す行数
+
+
+@dataclass(frozen=True)
+class LogMessage:
+    kind: str                    # ERROR / UNDEFINED / RERUN / OVERFULL / UNDERFULL / WARNING
+    text: str
+    line: Optional[int] = None   # .tex の行番号（分かれば）
+    node: Optional[int] = None   # その行を出力したノードの位置（SourceMap があれば）
+
+    def __str__(self) -> str:
+        where = f"line {self.line}" if self.line is not None else "?"
+        if self.node is not None:
+            where += f", node {self.node}"
+        return f"[{self.kind}] {where}: {self.text}"
+
+
+class SourceMap:
+    """
+    .tex の行番号 → ノードの位置。build() がソースを書き出しながら add() で作る。
+    ノードの断片ごとに開始行を持つだけなので、1ノードあたり 8 バイト程度。
+    """
+
+    __slots__ = ("_starts", "_nodes", "_line", "_body_end")
+
+    def __init__(self) -> None:
+        self._starts = array("I")   # 各断片の開始行（昇順）
+        self._nodes = array("I")    # その断片を出力したノードの位置
+        self._line = 1              # 次に書く文字の行
+        self._body_end = 0          # 最後の断片の末尾の行
+
+    def add(self, index: Optional[int], chunk: str) -> None:
+        """書き出した断片を記録する。index が None ならプリアンブル・区切り・終端"""
+        if index is not None:
+            self._starts.append(self._line)
+            self._nodes.append(index)
+            self._line += chunk.count("\n")
+            self._body_end = self._line
+        else:
+            self._line += chunk.count("\n")
+
+    def node_at(self, line: int) -> Optional[int]:
+        i = bisect_right(self._starts, line) - 1
+        if i < 0 or line > self._body_end:
+            return None
+        return self._nodes[i]
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+
+@dataclass
+class LogAnalysis:
+    """1回のコンパイルのログを解析した結果"""
+    messages: List[LogMessage] = field(default_factory=list)
+
+    def of_kind(self, kind: str) -> List[LogMessage]:
+        return [m for m in self.messages if m.kind == kind]
+
+    @property
+    def errors(self) -> List[LogMessage]:
+        return self.of_kind(ERROR)
+
+    @property
+    def undefined(self) -> List[LogMessage]:
+        return self.of_kind(UNDEFINED)
+
+    @property
+    def boxes(self) -> List[LogMessage]:
+        return [m for m in self.messages if m.kind in (OVERFULL, UNDERFULL)]
+
+    @property
+    def needs_rerun(self) -> bool:
+        return any(m.kind == RERUN for m in self.messages)
+
+
+class LogParser:
+    """
+    ログを1行ずつ受け取り、まとまった LogMessage を返す逐次パーサ。
+    折り返された行（ちょうど MAX_PRINT_LINE 文字）は次の行とつないでから解釈する。
+    .tex の行番号はメインの .tex の \\begin{document} 以降（.aux を読んだ後）だけ
+    ノードに対応づける（それより前の "input line" はパッケージの行番号のことが多い）。
+    """
+
+    def __init__(self, source_map: Optional[SourceMap] = None, *, jobname: Optional[str] = None) -> None:
+        self.source_map = source_map
+        self.jobname = jobname
+        self.fatal: Optional[LogMessage] = None   # 最初のエラー
+        self._wrapped = ""
+        self._in_body = jobname is None
+        self._error: Optional[List[str]] = None   # 組み立て中のエラー（行のリスト）
+        self._error_line: Optional[int] = None
+        self._warning: Optional[List[str]] = None
+        self._warning_prefix = ""
+
+    def feed(self, raw: str) -> List[LogMessage]:
+        raw = raw.rstrip("\r\n")
+        if len(raw) == MAX_PRINT_LINE:
+            self._wrapped += raw
+            return []
+        line, self._wrapped = self._wrapped + raw, ""
+        out: List[LogMessage] = []
+        self._handle(line, out)
+        return out
+
+    def close(self) -> List[LogMessage]:
+        out: List[LogMessage] = []
+        if self._wrapped:
+            line, self._wrapped = self._wrapped, ""
+            self._handle(line, out)
+        self._flush_error(out)
+        self._flush_warning(out)
+        return out
+
+    def _handle(self, line: str, out: List[LogMessage]) -> None:
+        if self._error is not None:
+            m = _CONTEXT_LINE.match(line)
+            if m:
+                if self._error_line is None:
+                    self._error_line = int(m.group(1))
+                self._error.append(line)
+                self._flush_error(out)
+                return
+            if len(self._error) < _ERROR_CONTEXT_LINES and not line.startswith("!"):
+                if line.strip():
+                    self._error.append(line)
+                return
+            self._flush_error(out)
+
+        if self._warning is not None:
+            if self._continues_warning(line):
+                self._warning.append(line[len(self._warning_prefix):].strip())
+                return
+            self._flush_warning(out)
+
+        if not self._in_body and self.jobname is not None and f"{self.jobname}.aux" in line:
+            self._in_body = True
+
+        if line.startswith("! "):
+            self._error, self._error_line = [line[2:]], None
+            return
+        m = _FILE_LINE_ERROR.match(line)
+        if m and self._is_main_file(m.group(1)):
+            self._error, self._error_line = [m.group(3)], int(m.group(2))
+            return
+        m = _WARNING.match(line)
+        if m:
+            package = m.group(1)
+            self._warning = [m.group(2)]
+            self._warning_prefix = f"({package})" if package else ""
+            return
+        m = _BOX.match(line)
+        if m:
+            kind = OVERFULL if m.group(1) == "Overfull" else UNDERFULL
+            number = next(g for g in m.groups()[2:] if g is not None)
+            out.append(self._message(kind, f"{m.group(1)} box ({m.group(2)})", int(number)))
+
+    def _continues_warning(self, line: str) -> bool:
+        if not line.strip():
+            return False
+        if self._warning_prefix:
+            return line.startswith(self._warning_prefix)
+        return line[0] == " "   # LaTeX 本体の警告の続きは空白で字下げされる
+
+    def _flush_warning(self, out: List[LogMessage]) -> None:
+        if self._warning is None:
+            return
+        text = " ".join(self._warning)
+        self._warning = None
+        m = _INPUT_LINE.search(text)
+        line = int(m.group(1)) if m else None
+        if _RERUN.search(text):
+            kind = RERUN
+        elif _UNDEFINED.match(text):
+            kind = UNDEFINED
+        else:
+            kind = WARNING
+        out.append(self._message(kind, text, line))
+
+    def _flush_error(self, out: List[LogMessage]) -> None:
+        if self._error is None:
+            return
+        message = self._message(ERROR, "\n".join(self._error), self._error_line, main_file=True)
+        self._error = self._error_line = None
+        if self.fatal is None:
+            self.fatal = message
+        out.append(message)
+
+    def _message(self, kind: str, text: str, line: Optional[int], *, main_file: bool = False) -> LogMessage:
+        node = None
+        if line is not None and self.source_map is not None and (main_file or self._in_body):
+            node = self.source_map.node_at(line)
+        return LogMessage(kind, text, line, node)
+
+    def _is_main_file(self, path: str) -> bool:
+        return self.jobname is None or Path(path).stem == self.jobname
+
+
+def parse_log(
+    lines: Union[str, Iterable[str]],
+    source_map: Optional[SourceMap] = None,
+    *,
+    jobname: Optional[str] = None,
+) -> LogAnalysis:
+    """ログ全体（文字列か行の並び）を解析する"""
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    parser = LogParser(source_map, jobname=jobname)
+    analysis = LogAnalysis()
+    for line in lines:
+        analysis.messages.extend(parser.feed(line))
+    analysis.messages.extend(parser.close())
+    return analysis
+
+
+def parse_log_file(
+    path: Union[str, Path],
+    source_map: Optional[SourceMap] = None,
+    *,
+    jobname: Optional[str] = None,
+) -> LogAnalysis:
+    """.log を読みながら解析する（ファイル全体は読み込まない）。無ければ空の結果"""
+    path = Path(path)
+    try:
+        with path.open(encoding="utf-8", errors="replace") as f:
+            return parse_log(f, source_map, jobname=jobname or path.stem)
+    except FileNotFoundError:
+        return LogAnalysis()
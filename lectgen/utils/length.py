@@ -0,0 +1,258 @@
+"""
+TeX の長さの計算（"6pt" "1.5em" "0.3\\textheight" "\\dimexpr\\linewidth - 2mm\\relax" など）。
+
+値は pt（TeX の pt = 1/72.27 in）の float で扱う。em/ex/zw と \\linewidth などの長さ変数は
+文脈（env: 名前 → pt）から引く。グルー（"6pt plus 2pt minus 1pt"）は自然長だけを使う。
+
+    to_pt("1in")                                  # 72.27
+    to_pt("0.5\\linewidth", {"\\linewidth": 345}) # 172.5
+    Length.parse("6pt") * 2 + Length.parse("1mm") # Length(14.845...)
+"""
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Mapping, Optional, Tuple
+
+# 1 単位あたりの pt（em/ex/zw/zh は env から）
+UNITS = {
+    "pt": 1.0,
+    "bp": 72.27 / 72,
+    "px": 72.27 / 72,          # pdfTeX/LuaTeX の既定（\pdfpxdimen = 1bp）
+    "mm": 72.27 / 25.4,
+    "cm": 72.27 / 2.54,
+    "in": 72.27,
+    "pc": 12.0,
+    "dd": 1238 / 1157,
+    "cc": 12 * 1238 / 1157,
+    "sp": 1 / 65536,
+    "Q": 72.27 / 25.4 / 4,     # 写植の級・歯（0.25mm）
+    "H": 72.27 / 25.4 / 4,
+}
+_FONT_UNITS = {"em": 1.0, "ex": 0.43, "zw": 1.0, "zh": 1.0}   # ex は Computer Modern の比率
+DEFAULT_FONT_SIZE = 10.0
+
+_TOKEN = re.compile(
+    r"\s*(?:(?P<num>(?:\d+\.?\d*|\.\d+))|(?P<cs>\\[a-zA-Z@]+)|(?P<word>[a-zA-Z]+)|(?P<op>[-+*/(){}]))"
+)
+_PLAIN = re.compile(r"\s*(-?(?:\d+\.?\d*|\.\d+))\s*([a-zA-Z]{1,2})\s*")   # "6pt" のような単純な形
+# 式の中で読み飛ばす制御綴
+_IGNORED = frozenset({"\\dimexpr", "\\glueexpr", "\\skip", "\\dimen"})
+_END = frozenset({"\\relax"})
+
+
+class LengthError(ValueError):
+    """TeX の長さとして読めない（未知の単位・変数、式の誤り）"""
+
+
+def to_pt(text: str, env: Optional[Mapping[str, float]] = None) -> float:
+    """TeX の長さを pt にする。env は "em" や "\\linewidth" → pt（無ければ 10pt の文書の既定）"""
+    m = _PLAIN.fullmatch(text)
+    if m is not None:
+        factor = UNITS.get(m.group(2))
+        if factor is not None:
+            return float(m.group(1)) * factor
+    if env is None:
+        return _to_pt_cached(text)
+    return _Parser(text, env).parse()
+
+
+@lru_cache(maxsize=1024)
+def _to_pt_cached(text: str) -> float:
+    return _Parser(text, {}).parse()
+
+
+def format_pt(pt: float, digits: int = 2) -> str:
+    """pt を TeX の長さの文字列にする（12.5 → "12.5pt"）"""
+    text = f"{pt:.{digits}f}".rstrip("0").rstrip(".")
+    return f"{'0' if text in ('', '-0') else text}pt"
+
+
+@dataclass(frozen=True, order=True)
+class Length:
+    """長さの値（pt）。足し引きと数による掛け割りができ、str() で TeX の長さに戻る"""
+    pt: float = 0.0
+
+    @classmethod
+    def parse(cls, text: str, env: Optional[Mapping[str, float]] = None) -> "Length":
+        return cls(to_pt(text, env))
+
+    def to(self, unit: str) -> float:
+        return self.pt / UNITS[unit]
+
+    def __add__(self, other: "Length") -> "Length":
+        if not isinstance(other, Length):
+            return NotImplemented
+        return Length(self.pt + other.pt)
+
+    def __sub__(self, other: "Length") -> "Length":
+        if not isinstance(other, Length):
+            return NotImplemented
+        return Length(self.pt - other.pt)
+
+    def __mul__(self, k: float) -> "Length":
+        return Length(self.pt * k)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, k: float) -> "Length":
+        return Length(self.pt / k)
+
+    def __neg__(self) -> "Length":
+        return Length(-self.pt)
+
+    def __str__(self) -> str:
+        return format_pt(self.pt)
+
+
+class _Parser:
+    """
+    式 := 項 (("+" | "-") 項)*
+    項 := 因子 (("*" | "/") 数)*
+    因子 := ("+" | "-") 因子 | "(" 式 ")" | "{" 式 "}" | 数 単位 | 数? 長さ変数
+    最上位で plus/minus が来たら（グルーの伸縮）そこで終える。
+    """
+
+    def __init__(self, text: str, env: Mapping[str, float]) -> None:
+        self.text = text
+        self.env = env
+        self.tokens: List[Tuple[str, str]] = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            m = _TOKEN.match(text, pos)
+            if m is None:
+                raise LengthError(f"cannot parse length {self.text!r} at {pos}")
+            kind = m.lastgroup or ""
+            value = m.group(kind)
+            pos = m.end()
+            if kind == "cs" and value in _IGNORED:
+                continue
+            if kind == "cs" and value in _END:
+                break
+            self.tokens.append((kind, value))
+        self.i = 0
+
+    def parse(self) -> float:
+        if not self.tokens:
+            raise LengthError(f"empty length {self.text!r}")
+        value = self._expr()
+        if self.i < len(self.tokens):
+            kind, word = self.tokens[self.i]
+            if not (kind == "word" and word in ("plus", "minus")):
+                raise LengthError(f"unexpected {word!r} in length {self.text!r}")
+        return value
+
+    def _peek(self) -> Tuple[str, str]:
+        return self.tokens[self.i] if self.i < len(self.tokens) else ("", "")
+
+    def _expr(self) -> float:
+        value = self._term()
+        while self._peek() in (("op", "+"), ("op", "-")):
+            op = self.tokens[self.i][1]
+            self.i += 1
+            rhs = self._term()
+            value = value + rhs if op == "+" else value - rhs
+        return value
+
+    def _term(self) -> float:
+        value = self._factor()
+        while self._peek() in (("op", "*"), ("op", "/")):
+            op = self.tokens[self.i][1]
+            self.i += 1
+            k = self._number()
+            if op == "*":
+                value *= k
+            elif k == 0:
+                raise LengthError(f"division by zero in {self.text!r}")
+            else:
+                value /= k
+        return value
+
+    def _number(self) -> float:
+        kind, value = self._peek()
+        sign = 1.0
+        while kind == "op" and value in "+-":
+            sign = -sign if value == "-" else sign
+            self.i += 1
+            kind, value = self._peek()
+        if kind == "op" and value == "(":   # \numexpr 相当の括弧
+            self.i += 1
+            k = self._expr_number()
+            return sign * k
+        if kind != "num":
+            raise LengthError(f"expected a number in {self.text!r}")
+        self.i += 1
+        return sign * float(value)
+
+    def _expr_number(self) -> float:
+        k = self._number()
+        while self._peek() in (("op", "*"), ("op", "/"), ("op", "+"), ("op", "-")):
+            op = self.tokens[self.i][1]
+            self.i += 1
+            rhs = self._number()
+            if op == "*":
+                k *= rhs
+            elif op == "+":
+                k += rhs
+            elif op == "-":
+                k -= rhs
+            elif rhs == 0:
+                raise LengthError(f"division by zero in {self.text!r}")
+            else:
+                k /= rhs
+        self._expect(")")
+        return k
+
+    def _expect(self, op: str) -> None:
+        if self._peek() != ("op", op):
+            raise LengthError(f"expected {op!r} in {self.text!r}")
+        self.i += 1
+
+    def _factor(self) -> float:
+        kind, value = self._peek()
+        if kind == "op" and value in "+-":
+            self.i += 1
+            inner = self._factor()
+            return -inner if value == "-" else inner
+        if kind == "op" and value in "({":
+            self.i += 1
+            inner = self._expr()
+            self._expect(")" if value == "(" else "}")
+            return inner
+        coefficient = 1.0
+        if kind == "num":
+            coefficient = float(value)
+            self.i += 1
+            kind, value = self._peek()
+        if kind == "word":
+            self.i += 1
+            return coefficient * self._unit(value)
+        if kind == "cs":
+            self.i += 1
+            return coefficient * self._variable(value)
+        raise LengthError(f"missing unit in length {self.text!r}")
+
+    def _unit(self, unit: str) -> float:
+        factor = UNITS.get(unit)
+        if factor is not None:
+            return factor
+        # "1.5em" の単位部分は単語として連続するので、"fill" などもここに来る
+        font = _FONT_UNITS.get(unit)
+        if font is not None:
+            return font * self.env.get("em", DEFAULT_FONT_SIZE)
+        if unit in ("fil", "fill", "filll"):
+            return 0.0
+        raise LengthError(f"unknown unit {unit!r} in {self.text!r}")
+
+    def _variable(self, name: str) -> float:
+        if name == "\\stretch":
+            # \stretch{n} は伸びるだけのグルーで、自然長は 0
+            self._expect("{")
+            self._number()
+            self._expect("}")
+            return 0.0
+        try:
+            return self.env[name]
+        except KeyError:
+            raise LengthError(f"unknown length {name} in {self.text!r}") from None
@@ -1,5 +1,8 @@
 # path: lectgen/utils/text.py
 from __future__ import annotations
+import re
+from functools import lru_cache
+from typing import Iterable, List
 
 _LATEX_SPECIALS = {
     "\\": r"\textbackslash{}",
@@ -14,9 +17,55 @@ _LATEX_SPECIALS = {
     "^": r"\textasciicircum{}",
 }
 
+# _LATEX_SPECIALS から一度だけ組み立てる（表を直せば両方に反映される）
+_SPECIALS_CLASS = "[" + re.escape("".join(_LATEX_SPECIALS)) + "]"
+_search_special = re.compile(_SPECIALS_CLASS).search
+_split_specials = re.compile("(" + _SPECIALS_CLASS + ")").split
+_TRANSLATE_TABLE = str.maketrans(_LATEX_SPECIALS)
+_special_for = _LATEX_SPECIALS.__getitem__
+
+# これより短い文字列は str.translate、長い文字列は split + join の方が速い
+_TRANSLATE_MAX_LEN = 32
+
+# latex_escape_cached がキャッシュする文字列の上限（長文はキャッシュを汚すだけ）
+ESCAPE_CACHE_MAX_LEN = 64
+ESCAPE_CACHE_SIZE = 1024
+
+
 def latex_escape(s: str) -> str:
     """
     LaTeX用に最小限のエスケープ。
     数式は raw=True で渡すのが前提（KISS）
+    エスケープ対象が無ければ入力をそのまま返す。
+    """
+    if _search_special(s) is None:
+        return s
+    if len(s) <= _TRANSLATE_MAX_LEN:
+        return s.translate(_TRANSLATE_TABLE)
+    parts = _split_specials(s)
+    # split はキャプチャしたので奇数番目が特殊文字
+    parts[1::2] = map(_special_for, parts[1::2])
+    return "".join(parts)
+
+
+_latex_escape_lru = lru_cache(maxsize=ESCAPE_CACHE_SIZE)(latex_escape)
+
+
+def latex_escape_cached(s: str) -> str:
     """
-    return "".join(_LATEX_SPECIALS.get(ch, ch) for ch in s)
\ No newline at end of file
+    latex_escape の LRU キャッシュ版。
+    目印・見出しのように同じ短い文字列が何度も現れるとき用。
+    ESCAPE_CACHE_MAX_LEN より長い文字列はキャッシュせずに変換する。
+    """
+    if len(s) > ESCAPE_CACHE_MAX_LEN:
+        return latex_escape(s)
+    return _latex_escape_lru(s)
+
+
+latex_escape_cached.cache_info = _latex_escape_lru.cache_info  # type: ignore[attr-defined]
+latex_escape_cached.cache_clear = _latex_escape_lru.cache_clear  # type: ignore[attr-defined]
+
+
+def latex_escape_many(items: Iterable[str], *, cached: bool = False) -> List[str]:
+    """複数の文字列をまとめてエスケープ（箇条書きの項目など）"""
+    return list(map(latex_escape_cached if cached else latex_escape, items))
@@ -0,0 +1,238 @@
+"""
+raw LaTeX の断片の事前チェック（コンパイラを起動する前に壊れた文書を弾く）。
+
+raw=True の Title / Section / Paragraph / ListBlock の項目と Terms.content はそのまま .tex に入るので、
+波括弧・数式の区切り（$ $$ \\( \\) \\[ \\]）・\\begin/\\end の対応が取れていないと、
+数秒かかるコンパイルの後で、生成した .tex の行番号つきのエラーとして初めて分かる。
+validate() は Python だけで全ノードの raw 部分を調べ、問題のあるノードの位置と型を返す。
+
+TeX を完全に解釈するわけではない（カテゴリーコードの変更や、\\newenvironment の中で
+\\begin と \\end を別々の引数に書く定義などは誤検出になる）。そうした定義はプリアンブルに置くこと。
+"""
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from .document import Document
+from .nodes import ListBlock, Node, Paragraph, Section, Terms, Title
+
+# ノード → 調べる (フィールド名, 文字列) の組
+RawFields = Callable[[object], Iterable[Tuple[str, str]]]
+
+
+def _title_fields(t: Title) -> Iterator[Tuple[str, str]]:
+    if t.raw:
+        yield "title", t.title
+        if t.subtitle:
+            yield "subtitle", t.subtitle
+
+
+def _section_fields(s: Section) -> Iterator[Tuple[str, str]]:
+    if s.raw:
+        yield "title", s.title
+
+
+def _paragraph_fields(p: Paragraph) -> Iterator[Tuple[str, str]]:
+    if p.raw:
+        yield "text", p.text
+
+
+def _listblock_fields(lb: ListBlock) -> Iterator[Tuple[str, str]]:
+    if lb.raw:
+        for i, item in enumerate(lb.items):
+            yield f"items[{i}]", item
+
+
+def _terms_fields(ts: Terms) -> Iterator[Tuple[str, str]]:
+    yield "content", ts.content
+
+
+# LatexRenderer がそのまま出力するフィールド。独自ノードは validate(raw_fields=...) で追加する
+RAW_FIELDS: Dict[type, RawFields] = {
+    Title: _title_fields,
+    Section: _section_fields,
+    Paragraph: _paragraph_fields,
+    ListBlock: _listblock_fields,
+    Terms: _terms_fields,
+}
+
+# 中身を解釈しない環境（\end{名前} まで読み飛ばす）
+VERBATIM_ENVIRONMENTS = frozenset({"verbatim", "verbatim*", "Verbatim", "lstlisting", "minted", "comment"})
+
+_TOKEN = re.compile(
+    r"\\(?P<be>begin|end)\s*\{(?P<env>[^{}]*)\}"
+    r"|\\verb\*?(?P<verb>[^a-zA-Z\s*])"
+    r"|\\[a-zA-Z@]+"
+    r"|\\[()\[\]]"
+    r"|\\."
+    r"|%[^\n]*"
+    r"|\$\$|[{}$]",
+    re.S,
+)
+_SPECIALS = re.compile(r"[{}$\\%]").search
+
+_MEMO_SIZE = 1024   # _NodeChecker が結果を覚えておく文字列の数
+
+_CLOSERS = {"}": "{", "\\)": "\\(", "\\]": "\\["}
+_NAMES = {"{": "'{'", "$": "'$'", "$$": "'$$'", "\\(": "'\\('", "\\[": "'\\['"}
+
+
+@dataclass(frozen=True)
+class RawIssue:
+    node: int          # doc.nodes での位置
+    node_type: str     # ノードの型名
+    field: str         # 問題のあったフィールド
+    offset: int        # フィールド内の文字位置
+    message: str
+
+    def __str__(self) -> str:
+        return f"node {self.node} ({self.node_type}.{self.field}, offset {self.offset}): {self.message}"
+
+
+class RawLatexError(ValueError):
+    """raw LaTeX の断片に対応の取れていない括弧・数式・環境がある"""
+
+    def __init__(self, issues: List[RawIssue], *, source: Optional[str] = None) -> None:
+        shown = "\n".join(f"  {i}" for i in issues[:10])
+        more = f"\n  ... and {len(issues) - 10} more" if len(issues) > 10 else ""
+        where = f"{source}: " if source else ""
+        super().__init__(f"{where}{len(issues)} problem(s) in raw LaTeX:\n{shown}{more}")
+        self.issues = issues
+        self.source = source
+
+
+def check_latex(text: str) -> List[Tuple[int, str]]:
+    """1つの断片を調べ、(文字位置, 内容) の一覧を返す（問題なければ空）"""
+    if not _SPECIALS(text):
+        return []
+    issues: List[Tuple[int, str]] = []
+    stack: List[Tuple[str, int]] = []   # (開いたもの, 位置)。環境は "env:名前"
+    pos = 0
+    while True:
+        m = _TOKEN.search(text, pos)
+        if m is None:
+            break
+        tok, start, pos = m.group(), m.start(), m.end()
+        if m.group("be"):
+            env = m.group("env").strip()
+            if m.group("be") == "begin":
+                if env in VERBATIM_ENVIRONMENTS:
+                    end = text.find(f"\\end{{{env}}}", pos)
+                    if end < 0:
+                        issues.append((start, f"\\begin{{{env}}} is never closed"))
+                        return issues
+                    pos = end + len(env) + 6
+                    continue
+                stack.append(("env:" + env, start))
+            else:
+                _close(stack, "env:" + env, start, f"\\end{{{env}}}", issues)
+        elif m.group("verb") is not None:
+            end = text.find(m.group("verb"), pos)
+            if end < 0:
+                issues.append((start, "\\verb is not terminated"))
+                return issues
+            pos = end + 1
+        elif tok[0] == "%" or (tok[0] == "\\" and tok not in ("\\(", "\\[", "\\)", "\\]")):
+            continue   # コメント・制御綴（\{ \$ \% などのエスケープを含む）
+        elif tok in ("{", "\\(", "\\["):
+            stack.append((tok, start))
+        elif tok in _CLOSERS:
+            _close(stack, _CLOSERS[tok], start, f"'{tok}'", issues)
+        else:   # $ / $$ は開いていれば閉じる、でなければ開く
+            if stack and stack[-1][0] == tok:
+                stack.pop()
+            elif any(opened == tok for opened, _ in stack):
+                _close(stack, tok, start, f"'{tok}'", issues)
+            else:
+                stack.append((tok, start))
+    for opened, at in stack:
+        name = f"\\begin{{{opened[4:]}}}" if opened.startswith("env:") else _NAMES[opened]
+        issues.append((at, f"{name} is never closed"))
+    return issues
+
+
+def _close(stack: List[Tuple[str, int]], opener: str, at: int, name: str, issues: List[Tuple[int, str]]) -> None:
+    if stack and stack[-1][0] == opener:
+        stack.pop()
+        return
+    if not any(opened == opener for opened, _ in stack):
+        issues.append((at, f"{name} without a matching opener"))
+        return
+    # 間に閉じられていないものがある：それを報告して対応する所まで戻す
+    while stack[-1][0] != opener:
+        opened, opened_at = stack.pop()
+        inner = f"\\begin{{{opened[4:]}}}" if opened.startswith("env:") else _NAMES[opened]
+        issues.append((opened_at, f"{inner} is not closed before {name}"))
+    stack.pop()
+
+
+def validate(
+    doc: Document,
+    *,
+    raw_fields: Optional[Mapping[type, RawFields]] = None,
+    limit: Optional[int] = None,
+) -> List[RawIssue]:
+    """
+    doc の raw 部分をすべて調べ、問題の一覧を返す。
+    raw_fields で独自ノードの調べ方を追加・上書きできる。limit 件見つけたら打ち切る。
+    """
+    check = _NodeChecker(raw_fields)
+    issues: List[RawIssue] = []
+    for index, node in enumerate(doc.nodes):
+        found = check(index, node)
+        if found:
+            issues.extend(found)
+            if limit is not None and len(issues) >= limit:
+                return issues[:limit]
+    return issues
+
+
+def ensure_valid(doc: Document, *, source: Optional[str] = None, **kwargs) -> None:
+    """問題があれば RawLatexError を投げる（source はメッセージに添える文書名）"""
+    issues = validate(doc, **kwargs)
+    if issues:
+        raise RawLatexError(issues, source=source)
+
+
+def iter_validated(
+    nodes: Iterable[Node],
+    *,
+    raw_fields: Optional[Mapping[type, RawFields]] = None,
+    source: Optional[str] = None,
+) -> Iterator[Node]:
+    """
+    ノードを調べながら流す（Document.streaming のように先読みできない列用）。
+    問題のあるノードに来たところで RawLatexError を投げる。
+    """
+    check = _NodeChecker(raw_fields)
+    for index, node in enumerate(nodes):
+        found = check(index, node)
+        if found:
+            raise RawLatexError(found, source=source)
+        yield node
+
+
+class _NodeChecker:
+    """
+    ノード1つ分を調べる。最近調べた文字列の結果は覚えておく（同じ Terms を繰り返す問題集などで速い）。
+    覚える数は _MEMO_SIZE までなので、Document.streaming を調べてもメモリは増え続けない。
+    """
+
+    def __init__(self, raw_fields: Optional[Mapping[type, RawFields]] = None) -> None:
+        self.table = dict(RAW_FIELDS)
+        if raw_fields:
+            self.table.update(raw_fields)
+        self.check = lru_cache(maxsize=_MEMO_SIZE)(check_latex)
+
+    def __call__(self, index: int, node: object) -> List[RawIssue]:
+        fields = self.table.get(type(node))
+        if fields is None:
+            return []
+        issues: List[RawIssue] = []
+        for name, text in fields(node):
+            found = self.check(text) if _SPECIALS(text) else ()
+            for offset, message in found:
+                issues.append(RawIssue(index, type(node).__name__, name, offset, message))
+        return issues
@@ -0,0 +1,308 @@
+"""
+試験の受験者別バリアント（問題順・選択肢の並べ替えと受験者ごとのヘッダ）。
+
+    exam = ExamTemplate(
+        questions=[Question([Section("..."), ListBlock(["A", "B", "C"], style="enumerate")]), ...],
+        prefix=[Paragraph("注意事項 ...")],
+        header=lambda sid: [Title("期末試験", subtitle=f"受験番号 {sid}")],
+        seed="2025-final",
+    )
+    vr = VariantRenderer(renderer, exam)
+    vr.write_each(exam.variants(student_ids), "out/")      # 受験者ごとの .tex
+    vr.render_combined_to(exam.variants(student_ids), fp)  # 1つにまとめた .tex
+
+ノードは frozen なので、バリアントは雛形のノードをコピーせずにそのまま共有する
+（新しく作るのはヘッダと、並べ替えた ListBlock の並びごとに1つずつ）。VariantRenderer は共有ノードの断片を
+一度だけ描画して使い回し、バリアントごとに違うノードだけを描画する。
+並べ替えは seed と受験者 ID から決まるので、同じ入力からは何度でも同じバリアントができる。
+"""
+from __future__ import annotations
+import random
+from bisect import bisect_right
+from dataclasses import dataclass, field, replace
+from itertools import accumulate, chain
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
+
+from .document import Document
+from .nodes import ListBlock, Node, PageBreak, Paragraph
+from .renderers.latex import LatexRenderer
+
+
+@dataclass(frozen=True)
+class Question:
+    """1問分のノード列。shuffle_choices=True ならこの中の ListBlock の項目（選択肢）を並べ替える"""
+    nodes: Tuple[Node, ...]
+    shuffle_choices: bool = True
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.nodes, tuple):
+            object.__setattr__(self, "nodes", tuple(self.nodes))
+
+
+class VariantNodes(Sequence):
+    """
+    いくつかのノード列（タプル）を連結して見せる読み取り専用の列。
+    バリアントは雛形のタプルを参照するだけで、ノードを複製しない。
+    """
+
+    __slots__ = ("_segments", "_ends")
+
+    def __init__(self, segments: Iterable[Tuple[Node, ...]]) -> None:
+        self._segments = tuple(s for s in segments if s)
+        self._ends = tuple(accumulate(len(s) for s in self._segments))
+
+    def __len__(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        k = bisect_right(self._ends, i)
+        if not 0 <= i < len(self) or k >= len(self._segments):
+            raise IndexError("VariantNodes index out of range")
+        start = self._ends[k - 1] if k else 0
+        return self._segments[k][i - start]
+
+    def __iter__(self) -> Iterator[Node]:
+        return chain.from_iterable(self._segments)
+
+    def __repr__(self) -> str:
+        return f"VariantNodes({len(self)} nodes, {len(self._segments)} segments)"
+
+
+@dataclass(frozen=True)
+class Variant:
+    """1人分のバリアント。並べ替えの結果は採点用に残す"""
+    student: Any
+    nodes: VariantNodes
+    # 出題順（雛形での問題番号の並び）
+    question_order: Tuple[int, ...]
+    # (雛形での問題番号, 問題内のノード位置) → 選択肢の並び（雛形での項目番号）
+    choice_orders: Dict[Tuple[int, int], Tuple[int, ...]] = field(default_factory=dict)
+
+    def document(self) -> Document:
+        """通常の Document として扱う（nodes は読み取り専用）"""
+        return Document(nodes=self.nodes)  # type: ignore[arg-type]
+
+    def question_position(self, question: int) -> int:
+        """雛形の question 番目の問題が何番目に出題されたか（0 始まり）"""
+        return self.question_order.index(question)
+
+    def choice_position(self, question: int, choice: int, node: Optional[int] = None) -> int:
+        """
+        雛形の選択肢 choice が何番目に並んだか（0 始まり）。
+        node は問題内の ListBlock の位置（省略時はその問題の最初の並べ替えた ListBlock）。
+        """
+        if node is None:
+            keys = sorted(k for k in self.choice_orders if k[0] == question)
+            if not keys:
+                return choice
+            order = self.choice_orders[keys[0]]
+        else:
+            order = self.choice_orders.get((question, node))
+            if order is None:
+                return choice
+        return order.index(choice)
+
+
+@dataclass
+class ExamTemplate:
+    """
+    バリアントの雛形。
+    - questions: 問題（Question かノードの列）。shuffle_questions=True なら出題順を並べ替える
+    - prefix / suffix: 全員共通の前置き・後書き
+    - header: 受験者 → その人だけのノード列（氏名欄・受験番号など）
+    - heading: 出題位置（1 始まり）→ 問題の見出しノード（"問1" など。位置ごとに共有される）
+    - seed: 並べ替えの種。受験者 ID と組み合わせて乱数を作る
+    """
+    questions: Sequence[Union[Question, Sequence[Node]]]
+    prefix: Sequence[Node] = ()
+    suffix: Sequence[Node] = ()
+    header: Optional[Callable[[Any], Sequence[Node]]] = None
+    heading: Optional[Callable[[int], Node]] = None
+    shuffle_questions: bool = True
+    seed: Union[int, str] = 0
+
+    _questions: Tuple[Question, ...] = field(default=(), init=False, repr=False)
+    _prefix: Tuple[Node, ...] = field(default=(), init=False, repr=False)
+    _suffix: Tuple[Node, ...] = field(default=(), init=False, repr=False)
+    _headings: Dict[int, Tuple[Node, ...]] = field(default_factory=dict, init=False, repr=False)
+    # id(ノード) → ノード。全バリアントで共有されうるノード（VariantRenderer が断片を使い回す対象）
+    _shared: Dict[int, Node] = field(default_factory=dict, init=False, repr=False)
+    _permutations: Dict[Tuple[int, Tuple[int, ...]], ListBlock] = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._questions = tuple(q if isinstance(q, Question) else Question(tuple(q)) for q in self.questions)
+        self._prefix = tuple(self.prefix)
+        self._suffix = tuple(self.suffix)
+        for node in chain(self._prefix, self._suffix, *(q.nodes for q in self._questions)):
+            self._shared[id(node)] = node
+
+    def rng(self, student: Any) -> random.Random:
+        # 文字列の種は sha512 で展開されるので、PYTHONHASHSEED やプロセスによらず再現できる
+        return random.Random(f"{self.seed}/{student}")
+
+    def variant(self, student: Any) -> Variant:
+        rng = self.rng(student)
+        order = list(range(len(self._questions)))
+        if self.shuffle_questions:
+            rng.shuffle(order)
+
+        segments: List[Tuple[Node, ...]] = []
+        if self.header is not None:
+            segments.append(tuple(self.header(student)))
+        segments.append(self._prefix)
+        choice_orders: Dict[Tuple[int, int], Tuple[int, ...]] = {}
+        for position, q_index in enumerate(order, start=1):
+            segments.append(self._heading(position))
+            segments.append(self._shuffled(q_index, rng, choice_orders))
+        segments.append(self._suffix)
+        return Variant(student, VariantNodes(segments), tuple(order), choice_orders)
+
+    def variants(self, students: Iterable[Any]) -> Iterator[Variant]:
+        for student in students:
+            yield self.variant(student)
+
+    def is_shared(self, node: Node) -> bool:
+        """雛形のノードそのもの（コピーではない）か"""
+        return self._shared.get(id(node)) is node
+
+    def _heading(self, position: int) -> Tuple[Node, ...]:
+        if self.heading is None:
+            return ()
+        nodes = self._headings.get(position)
+        if nodes is None:
+            nodes = self._headings[position] = (self.heading(position),)
+            self._shared[id(nodes[0])] = nodes[0]
+        return nodes
+
+    def _shuffled(self, q_index: int, rng: random.Random, choice_orders: dict) -> Tuple[Node, ...]:
+        question = self._questions[q_index]
+        if not question.shuffle_choices:
+            return question.nodes
+        nodes: Optional[List[Node]] = None   # 並べ替えたものがあるときだけ複製する
+        for i, node in enumerate(question.nodes):
+            if not isinstance(node, ListBlock) or len(node.items) < 2:
+                continue
+            perm = list(range(len(node.items)))
+            rng.shuffle(perm)
+            choice_orders[(q_index, i)] = tuple(perm)
+            if perm == sorted(perm):
+                continue   # 元の並びのままなら雛形のノードを共有
+            if nodes is None:
+                nodes = list(question.nodes)
+            nodes[i] = self._permuted(node, tuple(perm))
+        return question.nodes if nodes is None else tuple(nodes)
+
+    def _permuted(self, node: ListBlock, perm: Tuple[int, ...]) -> ListBlock:
+        # 選択肢の並びは数通りしかないので、同じ並びのノードは受験者をまたいで共有する
+        key = (id(node), perm)
+        shuffled = self._permutations.get(key)
+        if shuffled is None:
+            shuffled = self._permutations[key] = replace(node, items=tuple(node.items[p] for p in perm))
+            self._shared[id(shuffled)] = shuffled
+        return shuffled
+
+
+class VariantRenderer:
+    """
+    LatexRenderer でバリアントを描画する。雛形の共有ノードの断片は一度だけ描画して使い回す
+    （出力は renderer.render(variant.document()) と同一）。
+    """
+
+    def __init__(self, renderer: LatexRenderer, template: ExamTemplate) -> None:
+        self.renderer = renderer
+        self.template = template
+        # id(ノード) → 断片。雛形がノードを持ち続けるので id が別のオブジェクトに再利用されることはない
+        self._memo: Dict[int, str] = {}
+        # _memo を作ったときの見た目の設定と描画関数の表（どちらかが変われば作り直す）
+        self._memo_key: Optional[tuple] = None
+        self.rendered = 0   # 実際に描画したノード数（使い回した分は数えない）
+
+    def iter_render(self, variant: Variant) -> Iterator[str]:
+        r = self.renderer
+        yield r._document_head()
+        yield from self._iter_body(variant.nodes)
+        yield r._document_tail()
+
+    def render(self, variant: Variant) -> str:
+        return "".join(self.iter_render(variant))
+
+    def render_to(self, variant: Variant, fp: TextIO) -> None:
+        write = fp.write
+        for chunk in self.iter_render(variant):
+            write(chunk)
+
+    def write_each(
+        self,
+        variants: Iterable[Variant],
+        out_dir: Union[str, Path],
+        *,
+        filename: Callable[[Variant], str] = lambda v: f"{v.student}.tex",
+    ) -> List[Path]:
+        """バリアントごとに .tex を書き出す（PDF にするには build_many などに渡す）"""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for variant in variants:
+            path = out_dir / filename(variant)
+            with path.open("w", encoding="utf-8", newline="") as f:
+                self.render_to(variant, f)
+            paths.append(path)
+        return paths
+
+    def iter_render_combined(self, variants: Iterable[Variant], *, restart_page: bool = True) -> Iterator[str]:
+        """
+        全員分を改ページでつないだ1つの文書として返す。
+        restart_page=True なら各バリアントのページ番号を 1 から振り直す。
+        """
+        r = self.renderer
+        yield r._document_head()
+        yield from self._iter_body(self._combined_nodes(variants, restart_page))
+        yield r._document_tail()
+
+    def render_combined_to(self, variants: Iterable[Variant], fp: TextIO, *, restart_page: bool = True) -> None:
+        write = fp.write
+        for chunk in self.iter_render_combined(variants, restart_page=restart_page):
+            write(chunk)
+
+    @staticmethod
+    def _combined_nodes(variants: Iterable[Variant], restart_page: bool) -> Iterator[Node]:
+        restart = Paragraph("\\setcounter{page}{1}%", raw=True)
+        for i, variant in enumerate(variants):
+            if i:
+                yield PageBreak()
+                if restart_page:
+                    yield restart
+            yield from variant.nodes
+
+    def _iter_body(self, nodes: Iterable[Node]) -> Iterator[str]:
+        r = self.renderer
+        key = (r._style_fingerprint(), dict(r._handlers))
+        if key != self._memo_key:   # 見た目を変えたり register で描画関数を差し替えたら断片は使えない
+            self._memo.clear()
+            self._memo_key = key
+        # 区切りと空の断片の扱いは LatexRenderer.iter_render と同じ
+        render_node = self._render_node
+        first = True
+        for n in nodes:
+            fragment = render_node(n)
+            if not fragment:
+                continue
+            if not first:
+                yield "\n\n"
+            first = False
+            yield fragment
+
+    def _render_node(self, n: Node) -> str:
+        fragment = self._memo.get(id(n))
+        if fragment is not None:
+            return fragment
+        fragment = self.renderer._render_node(n)
+        self.rendered += 1
+        if self.template.is_shared(n):
+            self._memo[id(n)] = fragment
+        return fragment
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import os
+import sys
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Union
+
+from .build import BuildResult, build, load_script
+
+
+class Watcher:
+    """
+    教材スクリプトとその入力を監視し、変更があれば再ビルドする（執筆用）。
+    - インタプリタは起動したままなので、毎回の Python 起動と lectgen の import を省ける
+    - 保存が続いている間は debounce 秒静かになるまで待ってから1回だけ実行する
+    - スクリプトは doc/renderer を作る部分だけ実行し（load_script）、
+      .tex が変わらなければ build() がコンパイルを省略する
+    監視は mtime のポーリング（数ファイルの stat のみ）なので待機中の CPU はほぼ使わない。
+    """
+
+    def __init__(
+        self,
+        script: Union[str, Path],
+        out_pdf: Union[str, Path],
+        *,
+        inputs: Iterable[Union[str, Path]] = (),
+        interval: float = 0.5,
+        debounce: float = 0.3,
+        log: Callable[[str], None] = print,
+        **build_options: Any,
+    ) -> None:
+        self.script = Path(script).resolve()
+        self.out_pdf = Path(out_pdf)
+        self.inputs: Set[Path] = {Path(p).resolve() for p in inputs}
+        self.interval = interval
+        self.debounce = debounce
+        self.log = log
+        self.build_options = build_options
+        # スクリプトが import した同じディレクトリ配下のモジュール（編集を反映させるため毎回捨てる）
+        self._local_modules: Dict[str, Path] = {}
+        self._mtimes: Dict[Path, Optional[int]] = {}
+
+    def watched_paths(self) -> Set[Path]:
+        return {self.script, *self.inputs, *self._local_modules.values()}
+
+    def rebuild(self) -> Optional[BuildResult]:
+        """
+        スクリプトを実行してビルドする。スクリプトの例外は表示して None を返す。
+        基準の mtime は実行前に取るので、ビルド中に保存された変更は次の changed() で検知される。
+        """
+        baseline = self._snapshot()
+        for name in self._local_modules:
+            sys.modules.pop(name, None)
+        before = set(sys.modules)
+        try:
+            doc, renderer = load_script(self.script)
+            result = build(doc, renderer, self.out_pdf, **self.build_options)
+        except Exception:
+            self.log(traceback.format_exc())
+            return None
+        finally:
+            self._track_local_modules(set(sys.modules) - before)
+            # 今回新しく見つかったモジュールだけは読み込み後の mtime を基準にする
+            current = self._snapshot()
+            self._mtimes = {path: baseline.get(path, mtime) for path, mtime in current.items()}
+        self.log(f"{self.out_pdf}: built" if result.compiled else f"{self.out_pdf}: .tex unchanged, skipped")
+        return result
+
+    def changed(self) -> bool:
+        return self._snapshot() != self._mtimes
+
+    def wait_for_change(self) -> None:
+        """変更を検知し、その後 debounce 秒変化が止まるまで待つ"""
+        while not self.changed():
+            time.sleep(self.interval)
+        settled = self._snapshot()
+        while True:
+            time.sleep(self.debounce)
+            current = self._snapshot()
+            if current == settled:
+                return
+            settled = current
+
+    def run(self) -> None:
+        self.rebuild()
+        self.log(f"watching {self.script} (Ctrl-C で終了)")
+        try:
+            while True:
+                self.wait_for_change()
+                self.rebuild()
+        except KeyboardInterrupt:
+            pass
+
+    def _snapshot(self) -> Dict[Path, Optional[int]]:
+        mtimes: Dict[Path, Optional[int]] = {}
+        for path in self.watched_paths():
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None  # 消えた（保存途中の置き換えなど）も変化として扱う
+        return mtimes
+
+    def _track_local_modules(self, names: Set[str]) -> None:
+        root = self.script.parent
+        for name in names:
+            if name == "lectgen" or name.startswith("lectgen."):
+                continue  # ライブラリ自体は温めたままにする
+            path = getattr(sys.modules.get(name), "__file__", None)
+            if path is None:
+                continue
+            path = Path(path).resolve()
+            if root in path.parents:
+                self._local_modules[name] = path
+
+
+def watch(script: Union[str, Path], out_pdf: Union[str, Path], **options: Any) -> None:
+    """Watcher(script, out_pdf, **options).run() の省略形"""
+    Watcher(script, out_pdf, **options).run()